@@ -0,0 +1,147 @@
+from parser_constants import EXPECTED_SALES_CHANNELS
+from file_utils import get_output_dir, dump_to_json, read_json_to_obj, HELPER_DIR_ENV_VAR
+from log_utils import setup_logging, LOG_FNAME
+from synthetic_data import create_workspace, HELPER_FILES_DIR
+from metrics import RUN_METRICS_DIR
+from datetime import datetime
+import subprocess
+import tempfile
+import logging
+import shutil
+import time
+import glob
+import sys
+import os
+
+
+# GLOBAL VARIABLES
+BENCHMARK_SIZES = [1000, 10000, 100000]
+BENCHMARK_BASELINES_JSON = 'benchmark_baselines.json'
+# stage slower than baseline by more than this share (and by more than REGRESSION_MIN_SEC) is reported as regression
+REGRESSION_TOLERANCE = 0.25
+REGRESSION_MIN_SEC = 0.05
+VBA_OK = 'EXPORTED_SUCCESSFULLY'
+# unreachable proxy: any ECB request fails immediately instead of reaching network
+NO_NETWORK_PROXY = 'http://127.0.0.1:9'
+
+
+class PipelineBenchmark():
+    '''end-to-end benchmark of parser on synthetic data (synthetic_data.py). Each case (sales channel, orders count)
+    runs main.py in fresh workspace in separate process: no state shared between cases, same as VBA launch.
+    VBA is stubbed by captured stdout, network - by current fx.json and unreachable proxy. Per stage wall times are
+    read from run metrics json (metrics.py) and compared with baselines stored in Helper Files.
+
+    main methods:
+    run() - runs all cases, returns {case: {'stages': {stage: wall sec}, 'vba_output': [...]}}
+    save_baselines(results) - stores results as new baselines
+    export_report(results) - writes per stage times vs baselines to txt file, returns (report path, regressions count)
+
+    Args:
+    sizes: (optional) list of orders counts, defaults to BENCHMARK_SIZES
+    sales_channels: (optional) list, defaults to all expected sales channels
+    keep_workspaces: (optional) bool, workspaces with run outputs are deleted by default'''
+
+    def __init__(self, sizes:list=None, sales_channels:list=None, keep_workspaces:bool=False):
+        self.sizes = sizes if sizes else BENCHMARK_SIZES
+        self.sales_channels = sales_channels if sales_channels else EXPECTED_SALES_CHANNELS
+        self.keep_workspaces = keep_workspaces
+        self.main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+        self.baselines_path = os.path.join(get_output_dir(client_file=False), BENCHMARK_BASELINES_JSON)
+
+    def run(self) -> dict:
+        results = {}
+        for sales_channel in self.sales_channels:
+            for size in self.sizes:
+                case = f'{sales_channel} {size}'
+                results[case] = self.__run_case(sales_channel, size)
+                logging.info(f'Benchmark {case}: {results[case]["stages"].get("total", 0):.2f} sec total')
+        return results
+
+    def __run_case(self, sales_channel:str, size:int) -> dict:
+        '''generates workspace, runs parser in it, returns stage times and VBA output of run'''
+        workspace_dir = tempfile.mkdtemp(prefix=f'parser bench {sales_channel} {size} ')
+        try:
+            start_time = time.perf_counter()
+            source_fpath = create_workspace(workspace_dir, sales_channel, size)
+            generation_sec = time.perf_counter() - start_time
+            helper_dir = os.path.join(workspace_dir, HELPER_FILES_DIR)
+            env = dict(os.environ, **{HELPER_DIR_ENV_VAR: helper_dir, 'HTTP_PROXY': NO_NETWORK_PROXY, 'HTTPS_PROXY': NO_NETWORK_PROXY})
+            completed = subprocess.run([sys.executable, self.main_path, source_fpath, sales_channel, 'False'],
+                                    cwd=workspace_dir, env=env, capture_output=True, text=True, encoding='utf-8')
+            vba_output = completed.stdout.splitlines()
+            if completed.returncode != 0 or VBA_OK not in vba_output:
+                logging.warning(f'Benchmark {sales_channel} {size} run did not succeed. VBA output: {vba_output}, stderr: {completed.stderr[-2000:]}')
+            return {'stages': self.__get_stage_times(helper_dir), 'generation_sec': round(generation_sec, 2), 'vba_output': vba_output}
+        finally:
+            if self.keep_workspaces:
+                logging.info(f'Benchmark {sales_channel} {size} workspace kept: {workspace_dir}')
+            else:
+                shutil.rmtree(workspace_dir, ignore_errors=True)
+
+    @staticmethod
+    def __get_stage_times(helper_dir:str) -> dict:
+        '''returns {stage: wall sec} of run metrics json. Top level spans, export jobs; repeated spans are summed'''
+        metrics_files = glob.glob(os.path.join(helper_dir, RUN_METRICS_DIR, '*.json'))
+        if not metrics_files:
+            return {}
+        stages = {}
+        for span in read_json_to_obj(max(metrics_files, key=os.path.getmtime))['spans']:
+            if '/' not in span['name'] or span['name'].startswith('exports/'):
+                stages[span['name']] = round(stages.get(span['name'], 0.0) + span['wall_sec'], 4)
+        return stages
+
+    def get_baselines(self) -> dict:
+        '''returns stored {case: {stage: wall sec}}, {} if none stored'''
+        if not os.path.exists(self.baselines_path):
+            return {}
+        return read_json_to_obj(self.baselines_path)['cases']
+
+    def save_baselines(self, results:dict) -> str:
+        '''merges cases of results into stored baselines, returns baselines path'''
+        baselines = self.get_baselines()
+        baselines.update({case: result['stages'] for case, result in results.items()})
+        return dump_to_json({'saved_at': datetime.now().isoformat(timespec='seconds'), 'cases': baselines}, BENCHMARK_BASELINES_JSON)
+
+    def export_report(self, results:dict) -> tuple:
+        '''writes per stage times vs baselines to txt file in output dir. Returns (report path, regressions count)'''
+        baselines = self.get_baselines()
+        regressions = 0
+        date_stamp = datetime.today().strftime("%Y.%m.%d %H.%M")
+        report_path = os.path.join(get_output_dir(), f'Benchmark {date_stamp}.txt')
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write(f'Pipeline benchmark {date_stamp}. Baselines: {self.baselines_path if baselines else "not stored"}')
+            for case, result in results.items():
+                succeeded = VBA_OK in result['vba_output']
+                f.write(f'\n\n{case} ({"ok" if succeeded else "FAILED"}, data generated in {result["generation_sec"]:.2f} sec)')
+                f.write(f'\nStage\tSec\tBaseline sec\tDelta')
+                case_baselines = baselines.get(case, {})
+                for stage, wall_sec in result['stages'].items():
+                    baseline_sec = case_baselines.get(stage)
+                    if baseline_sec is None:
+                        f.write(f'\n{stage}\t{wall_sec:.3f}\t-\t-')
+                        continue
+                    regressed = wall_sec > baseline_sec * (1 + REGRESSION_TOLERANCE) and wall_sec - baseline_sec > REGRESSION_MIN_SEC
+                    regressions += regressed
+                    delta = f'{(wall_sec - baseline_sec) / baseline_sec:+.0%}' if baseline_sec else '-'
+                    f.write(f'\n{stage}\t{wall_sec:.3f}\t{baseline_sec:.3f}\t{delta}{"  REGRESSION" if regressed else ""}')
+                regressions += not succeeded
+        logging.info(f'Benchmark report written to: {report_path}. Regressions: {regressions}')
+        return report_path, regressions
+
+
+if __name__ == '__main__':
+    # usage: python benchmark.py [orders counts, e.g. 1000,10000] [sales channels, e.g. AmazonEU,Etsy] [--save-baseline] [--keep]
+    # --keep leaves generated workspaces (orders export, outputs, run metrics) in temp folder, paths are logged to loading_orders.log
+    # exits with 1 if any stage regressed against stored baselines or any run failed
+    setup_logging(os.path.join(get_output_dir(client_file=False), LOG_FNAME))
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    sizes = [int(size) for size in args[0].split(',')] if args else None
+    sales_channels = args[1].split(',') if len(args) > 1 else None
+    benchmark = PipelineBenchmark(sizes, sales_channels, keep_workspaces='--keep' in sys.argv)
+    benchmark_results = benchmark.run()
+    report_path, regressions_count = benchmark.export_report(benchmark_results)
+    with open(report_path, 'r', encoding='utf-8') as f:
+        print(f.read())
+    if '--save-baseline' in sys.argv:
+        print(f'Baselines saved to: {benchmark.save_baselines(benchmark_results)}')
+    sys.exit(1 if regressions_count else 0)
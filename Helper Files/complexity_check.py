@@ -0,0 +1,208 @@
+from file_utils import get_output_dir, HELPER_DIR_ENV_VAR
+from log_utils import setup_logging, LOG_FNAME
+from synthetic_data import SyntheticOrdersGenerator, HELPER_FILES_DIR
+from output_capture import capture_output
+from export_engine import ExportEngine, CARRIER_TEMPLATES
+from database import SQLAlchemyOrdersDB, ProgramRun, Order, DATABASE_NAME
+from same_buyer import SameBuyerDetector
+from parse_orders import ParseOrders
+from weights import OrderData
+from pricing_wb import PricingWB
+from forex import Forex
+from pipeline import get_cleaned_orders, get_raw_orders, clean_orders
+from copy import deepcopy
+import tempfile
+import cProfile
+import logging
+import pstats
+import shutil
+import math
+import time
+import sys
+import os
+
+
+# GLOBAL VARIABLES
+CHECK_SIZES = [1000, 2000, 4000, 8000]
+TIMING_REPEATS = 3
+# max growth exponents (metric ~ n ** exponent; 1.0 - linear, 2.0 - quadratic) fitted over CHECK_SIZES
+MAX_TIME_EXPONENT = 1.3
+MAX_CALLS_EXPONENT = 1.1
+# stages faster than this (sec) at largest size are judged by call count only: timer noise dominates short timings
+MIN_TIMED_SEC = 0.1
+
+
+def get_growth_exponent(sizes:list, values:list) -> float:
+    '''returns least squares slope of log(values) over log(sizes)'''
+    log_sizes = [math.log(size) for size in sizes]
+    log_values = [math.log(max(value, 1e-9)) for value in values]
+    mean_size, mean_value = sum(log_sizes) / len(log_sizes), sum(log_values) / len(log_values)
+    covariance = sum((log_size - mean_size) * (log_value - mean_value) for log_size, log_value in zip(log_sizes, log_values))
+    variance = sum((log_size - mean_size) ** 2 for log_size in log_sizes)
+    return covariance / variance
+
+
+class ComplexityCheck():
+    '''catches accidental superlinear (e.g. O(n^2)) paths: runs key pipeline stages over growing prefixes of synthetic
+    orders (synthetic_data.py) and fits growth exponent of stage wall time (best of TIMING_REPEATS) and of function
+    call count (cProfile, deterministic). Stage fails if either exponent exceeds its limit; time exponent counts only for
+    stages taking at least MIN_TIMED_SEC at largest size. Stage inputs are prepared
+    outside of measured block; fixed costs (workbook loads) stay in setup. Runs offline in temporary workspace.
+
+    main methods:
+    run() - checks all stages, returns {stage: {'times', 'calls', 'time_exponent', 'calls_exponent', 'timed', 'passed'}}
+    report(results) - returns results as text table
+
+    Args:
+    sales_channel: (optional) str, defaults to AmazonEU
+    sizes: (optional) list of orders counts, defaults to CHECK_SIZES
+    use_timings: (optional) False judges stages by call count only (deterministic, for test runs on loaded machines)'''
+
+    def __init__(self, sales_channel:str='AmazonEU', sizes:list=None, use_timings:bool=True):
+        self.sales_channel = sales_channel
+        self.sizes = sizes if sizes else CHECK_SIZES
+        self.use_timings = use_timings
+        self.stages = {
+            'clean': (self.__setup_clean, self.__run_clean),
+            'dedup': (self.__setup_dedup, self.__run_dedup),
+            'fx conversion': (self.__setup_fx, self.__run_fx),
+            'enrichment': (self.__setup_enrichment, self.__run_enrichment),
+            'pricing': (self.__setup_enriched, self.__run_pricing),
+            'same buyer': (self.__setup_enriched, self.__run_same_buyer),
+            'routing': (self.__setup_enriched, self.__run_routing),
+        }
+        for carrier in CARRIER_TEMPLATES:
+            self.stages[f'{carrier} export'] = (self.__setup_enriched, lambda orders, carrier=carrier: self.__run_export(carrier, orders))
+
+    def run(self) -> dict:
+        self.workspace_dir = tempfile.mkdtemp(prefix='parser complexity ')
+        self.helper_dir = os.path.join(self.workspace_dir, HELPER_FILES_DIR)
+        os.makedirs(self.helper_dir)
+        original_helper_dir = os.environ.get(HELPER_DIR_ENV_VAR)
+        os.environ[HELPER_DIR_ENV_VAR] = self.helper_dir
+        try:
+            self.__prepare_orders()
+            return {stage: self.__check_stage(setup, run_stage) for stage, (setup, run_stage) in self.stages.items()}
+        finally:
+            if original_helper_dir is None:
+                os.environ.pop(HELPER_DIR_ENV_VAR)
+            else:
+                os.environ[HELPER_DIR_ENV_VAR] = original_helper_dir
+            shutil.rmtree(self.workspace_dir, ignore_errors=True)
+
+    def __prepare_orders(self):
+        '''generates orders of largest size once: raw export, cleaned and enriched orders. Stages use their prefixes'''
+        generator = SyntheticOrdersGenerator(self.sales_channel, max(self.sizes))
+        generator.export_reference_workbooks(self.helper_dir)
+        self.source_fpath = generator.export_orders(os.path.join(self.workspace_dir, 'orders export'))
+        self.cleaned_orders = get_cleaned_orders(self.source_fpath, self.sales_channel)
+        with capture_output():
+            self.enriched_orders = OrderData(deepcopy(self.cleaned_orders), self.sales_channel, offline=True).add_orders_data()
+        # pricing workbook loaded once, pricing stage measures lookups only
+        self.pricing = PricingWB()
+
+    def __check_stage(self, setup, run_stage) -> dict:
+        times, calls = [], []
+        for size in self.sizes:
+            best_time = float('inf')
+            for _ in range(TIMING_REPEATS if self.use_timings else 1):
+                stage_args = setup(size)
+                start_time = time.perf_counter()
+                with capture_output():
+                    run_stage(*stage_args)
+                best_time = min(best_time, time.perf_counter() - start_time)
+            times.append(best_time)
+            calls.append(self.__count_calls(run_stage, setup(size)))
+        time_exponent, calls_exponent = get_growth_exponent(self.sizes, times), get_growth_exponent(self.sizes, calls)
+        timed = self.use_timings and times[-1] >= MIN_TIMED_SEC
+        passed = calls_exponent <= MAX_CALLS_EXPONENT and (not timed or time_exponent <= MAX_TIME_EXPONENT)
+        return {'times': times, 'calls': calls, 'time_exponent': time_exponent, 'calls_exponent': calls_exponent, 'timed': timed, 'passed': passed}
+
+    @staticmethod
+    def __count_calls(run_stage, stage_args:tuple) -> int:
+        '''returns number of function calls (python and builtin) made by stage'''
+        profiler = cProfile.Profile()
+        with capture_output():
+            profiler.runcall(run_stage, *stage_args)
+        return pstats.Stats(profiler).total_calls
+
+    def __setup_clean(self, size:int) -> tuple:
+        return (get_raw_orders(self.source_fpath, self.sales_channel)[:size],)
+
+    def __run_clean(self, raw_orders:list):
+        clean_orders(raw_orders, self.sales_channel)
+
+    def __setup_dedup(self, size:int) -> tuple:
+        '''fresh database holding size orders of earlier run, half of them in loaded orders'''
+        db_path = os.path.join(self.helper_dir, DATABASE_NAME)
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        orders = deepcopy(self.cleaned_orders[:size])
+        db_client = SQLAlchemyOrdersDB(orders, self.source_fpath, self.sales_channel, testing=True)
+        earlier_run = ProgramRun(fpath=self.source_fpath, sales_channel=self.sales_channel)
+        db_client.session.add(earlier_run)
+        db_client.session.commit()
+        order_ids = [order.order_id for order in orders[size // 2:]] + [f'earlier-{idx}' for idx in range(size // 2)]
+        db_client.session.execute(Order.__table__.insert(), [{'order_id': order_id, 'run': earlier_run.id} for order_id in order_ids])
+        db_client.session.commit()
+        return (db_client,)
+
+    def __run_dedup(self, db_client:SQLAlchemyOrdersDB):
+        db_client.get_new_orders_only()
+        db_client.session.close()
+
+    def __setup_fx(self, size:int) -> tuple:
+        orders = self.enriched_orders[:size]
+        prices = [[float(order.item_price) for order in orders]]
+        return Forex(allow_network=False), prices, [order.currency for order in orders]
+
+    def __run_fx(self, forex:Forex, prices:list, currencies:list):
+        forex.convert_columns_to_eur(prices, currencies)
+
+    def __setup_enrichment(self, size:int) -> tuple:
+        '''order data client with loaded workbooks and converted prices (fixed cost of run, not measured)'''
+        with capture_output():
+            return (OrderData(deepcopy(self.cleaned_orders[:size]), self.sales_channel, offline=True),)
+
+    def __run_enrichment(self, order_data:OrderData):
+        order_data.add_orders_data()
+
+    def __setup_enriched(self, size:int) -> tuple:
+        return (deepcopy(self.enriched_orders[:size]),)
+
+    def __run_pricing(self, orders:list):
+        for order in orders:
+            if order.weight != '' and order.vmdoption != '':
+                self.pricing.get_cheapest_service(order)
+
+    def __run_same_buyer(self, orders:list):
+        SameBuyerDetector().get_same_buyer_orders(orders)
+
+    def __run_routing(self, orders:list):
+        ParseOrders(orders, None, self.sales_channel).route_orders_to_shipping_services(skip_etonas=False)
+
+    def __run_export(self, carrier:str, orders:list):
+        export_path = os.path.join(self.workspace_dir, f'{carrier}.{CARRIER_TEMPLATES[carrier]["format"]}')
+        ExportEngine(self.sales_channel).export(carrier, orders, export_path)
+
+    def report(self, results:dict) -> str:
+        lines = [f'{self.sales_channel} stage scaling over {self.sizes} orders. Limits: time exponent {MAX_TIME_EXPONENT}, calls exponent {MAX_CALLS_EXPONENT}',
+                'Stage\tTimes (sec)\tCalls\tTime exp.\tCalls exp.\tResult']
+        for stage, result in results.items():
+            times = ' '.join(f'{stage_time:.3f}' for stage_time in result['times'])
+            calls = ' '.join(str(stage_calls) for stage_calls in result['calls'])
+            time_exponent = f'{result["time_exponent"]:.2f}' if result['timed'] else 'n/a'
+            lines.append(f'{stage}\t{times}\t{calls}\t{time_exponent}\t{result["calls_exponent"]:.2f}\t{"ok" if result["passed"] else "SUPERLINEAR"}')
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    # usage: python complexity_check.py [sales channel] [orders counts, e.g. 1000,2000,4000,8000]
+    # exits with 1 if any stage scales superlinearly
+    setup_logging(os.path.join(get_output_dir(client_file=False), LOG_FNAME))
+    check = ComplexityCheck(sys.argv[1] if len(sys.argv) > 1 else 'AmazonEU',
+                            [int(size) for size in sys.argv[2].split(',')] if len(sys.argv) > 2 else None)
+    check_results = check.run()
+    print(check.report(check_results))
+    logging.info(f'Complexity check:\n{check.report(check_results)}')
+    sys.exit(0 if all(result['passed'] for result in check_results.values()) else 1)
@@ -461,4 +461,41 @@ COUNTRY_CODES = {
     'U.S. Virgin Islands':'VI',
     'Fidschi':'FJ',
     'Französisch-Guayana':'GF',
-}
\ No newline at end of file
+}
+
+
+class CountryRegistry():
+    '''compiled, constant-time lookups over EU_COUNTRY_CODES, GIFT_COUNTRIES and COUNTRY_CODES above. Built once on import, use shared COUNTRIES instance.
+
+    Structures:
+    eu_codes, gift_codes, pricing_codes - frozensets of country codes (pricing: every code in COUNTRY_CODES)
+    name_codes - {upper-cased country name: country_code}
+
+    main methods:
+    get_code(country) - returns 2 letter code for country name (KeyError if unknown), codes are returned as is
+    is_eu / is_gift / is_pricing_supported(country_code) - membership checks'''
+
+    def __init__(self):
+        self.eu_codes = frozenset(EU_COUNTRY_CODES)
+        self.gift_codes = frozenset(GIFT_COUNTRIES)
+        self.pricing_codes = frozenset(COUNTRY_CODES.values())
+        # keys upper-cased once, so names like 'Fidschi' or 'GROßBRITANNIEN' match upper-cased lookups
+        self.name_codes = {name.upper(): code for name, code in COUNTRY_CODES.items()}
+
+    def get_code(self, country:str) -> str:
+        '''returns 2 letter country code for country name if len(country) > 2, country itself otherwise. Raises KeyError for unknown names'''
+        if len(country) > 2:
+            return self.name_codes[country.upper()]
+        return country
+
+    def is_eu(self, country_code:str) -> bool:
+        return country_code in self.eu_codes
+
+    def is_gift(self, country_code:str) -> bool:
+        return country_code in self.gift_codes
+
+    def is_pricing_supported(self, country_code:str) -> bool:
+        return country_code in self.pricing_codes
+
+
+COUNTRIES = CountryRegistry()
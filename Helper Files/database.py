@@ -1,5 +1,9 @@
 from file_utils import get_output_dir, create_src_file_backup, delete_file
-from sqlalchemy import create_engine, Column, String, Integer
+from same_buyer import get_buyer_key
+from order_record import OrderRecord
+from metrics import METRICS
+from errors import DatabaseWriteError
+from sqlalchemy import create_engine, inspect, text, Column, String, Integer, Table, MetaData
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.sql.sqltypes import TIMESTAMP
@@ -13,10 +17,10 @@ import shutil
 
 # GLOBAL VARIABLES
 ORDERS_ARCHIVE_DAYS = 60
+REPEAT_BUYER_DAYS = 14
 DATABASE_NAME = 'orders.db'
 BACKUP_DB_BEFORE_NAME = 'orders_b4lrun.db'
 BACKUP_DB_AFTER_NAME = 'orders_lrun.db'
-VBA_ERROR_ALERT = 'ERROR_CALL_DADDY'
 
 Base = declarative_base()
 
@@ -45,8 +49,8 @@ class ProgramRun(Base):
 class Order(Base):
     '''database table model representing Order
     
-    NOTE: unique primary key is: order['order-item-id'] for Amazon; order['Order ID'] for Etsy
-    order_id_secondary = order['order-id'] for Amazon; null for Etsy'''
+    NOTE: unique primary key is: order.order_id - source column 'order-item-id' for Amazon; 'Order ID' for Etsy
+    order_id_secondary = order.secondary_order_id ('order-id') for Amazon; null for Etsy'''
     __tablename__ = 'order'
 
     def __init__(self, order_id, purchase_date, buyer_name, run, **kwargs):
@@ -60,6 +64,7 @@ class Order(Base):
     order_id_secondary = Column(String)
     purchase_date = Column(String)
     buyer_name = Column(String)
+    buyer_key = Column(String, index=True)      # normalized recipient name + postal code + country, see same_buyer.get_buyer_key
     run = Column(Integer, ForeignKey('program_run.id', ondelete='CASCADE', onupdate='CASCADE'), nullable=False)
 
     def __repr__(self) -> str:
@@ -74,28 +79,27 @@ class SQLAlchemyOrdersDB:
 
     add_orders_to_db() - pushes new orders (returned list from get_new_orders_only() method)
     selected data to database, performs backups before and after each run, periodic flushing of old entries 
+
+    get_repeat_buyers(orders) - returns earlier orders (last REPEAT_BUYER_DAYS) of buyers in passed orders, single query
     
     IMPORTANT NOTE: Amazon has unique order-item-id's (same order-id for different items in buyer's cart).
-    Order model saves order['order-item-id'] for Amazon orders and for Etsy: order['Order ID']
+    Order model saves order.order_id: 'order-item-id' column for Amazon orders and for Etsy: 'Order ID'
     
     Arguments:
 
-    orders - list of dict / OrderedDict's
+    orders - list of OrderRecord (order_record.py)
 
     source_file_path - abs path to source file for orders (Amazon / Etsy)
 
     sales_channel - str identifier for db entry, backup file naming. Expected value: ['AmazonEU', 'AmazonCOM', Etsy]
 
-    proxy_keys - dict mapper of internal (based on amazon) order keys vs external sales_channel keys 
-
     testing - optional flag for testing (suspending backup, save add source_file_path to program_run table instead)
     '''
 
-    def __init__(self, orders:list, source_file_path:str, sales_channel:str, proxy_keys:dict, testing=False):
+    def __init__(self, orders:list, source_file_path:str, sales_channel:str, testing=False):
         self.orders = orders
         self.source_file_path = source_file_path
         self.sales_channel = sales_channel
-        self.proxy_keys = proxy_keys
         self.testing = testing
         self.__setup_db()
         self._backup_db(self.db_backup_b4_path)
@@ -107,6 +111,18 @@ class SQLAlchemyOrdersDB:
             self.__get_engine()
             Base.metadata.create_all(bind=self.engine)
             logging.info(f'Database has been created at {self.db_path}')
+        else:
+            self.__migrate_db()
+
+    def __migrate_db(self):
+        '''adds columns introduced after database was created'''
+        self.__get_engine()
+        order_columns = [column['name'] for column in inspect(self.engine).get_columns(Order.__tablename__)]
+        if 'buyer_key' not in order_columns:
+            with self.engine.begin() as conn:
+                conn.execute(text('ALTER TABLE "order" ADD COLUMN buyer_key VARCHAR'))
+                conn.execute(text('CREATE INDEX IF NOT EXISTS ix_order_buyer_key ON "order" (buyer_key)'))
+            logging.info(f'Database migrated: added indexed buyer_key column to order table. Existing orders have no buyer key')
 
     def __get_db_paths(self):
         output_dir = get_output_dir(client_file=False)
@@ -131,15 +147,15 @@ class SQLAlchemyOrdersDB:
         assumes get_new_orders_only was called outside of this cls before to get self.new_orders'''
         try:
             if self.new_orders:
-                self._add_new_orders_to_db(self.new_orders)
+                with METRICS.span('db write'):
+                    self._add_new_orders_to_db(self.new_orders)
                 self.flush_old_records()
                 self._backup_db(self.db_backup_after_path)
             logging.debug(f'{len(self.new_orders)} new orders added, flushing old records complete, backup after created at: {self.db_backup_after_path}')
             return len(self.new_orders)
         except Exception as e:
-            logging.critical(f'Unexpected err {e} trying to add orders to db. Alerting VBA, terminating program immediately via exit().')
-            print(VBA_ERROR_ALERT)
-            exit()
+            logging.critical(f'Unexpected err {e} trying to add orders to db. Alerting VBA, terminating program.')
+            raise DatabaseWriteError(f'Failed to add orders to db. Err: {e}')
 
     def _add_new_orders_to_db(self, new_orders:list):
         '''create new entry in program_runs table, add new orders'''
@@ -149,21 +165,22 @@ class SQLAlchemyOrdersDB:
             self._add_single_order(order)
             added_to_db_counter += 1
 
-    def _add_single_order(self, order_dict:dict):
+    def _add_single_order(self, order:OrderRecord):
         '''adds single order to database (via session.add(new_order))'''
         try:
-            new_order = Order(order_id = order_dict[self.proxy_keys['order-id']],
-                    purchase_date = order_dict[self.proxy_keys['purchase-date']],
-                    buyer_name = order_dict[self.proxy_keys['buyer-name']],
+            new_order = Order(order_id = order.order_id,
+                    purchase_date = order.purchase_date,
+                    buyer_name = order.buyer_name,
                     run = self.new_run.id)
+            new_order.buyer_key = get_buyer_key(order)
             if self.new_run.sales_channel != 'Etsy':
                 # Additionally add original order-id (may have duplicates for multiple items in shopping cart) for AmazonCOM, AmazonEU
-                new_order.order_id_secondary = order_dict['order-id']
+                new_order.order_id_secondary = order.secondary_order_id
             
             self.session.add(new_order)
             self.session.commit()
         except IntegrityError as e:
-            logging.warning(f'Order from channel: {self.sales_channel} w/ proxy order-id: {order_dict[self.proxy_keys["order-id"]]} \
+            logging.warning(f'Order from channel: {self.sales_channel} w/ proxy order-id: {order.order_id} \
                 already in database. Integrity error {e}. Skipping addition of said order, rolling back db session')
             self.session.rollback()
 
@@ -180,19 +197,47 @@ class SQLAlchemyOrdersDB:
 
     def get_new_orders_only(self) -> list:
         '''From passed orders to cls, returns only orders NOT YET in database.
-        Called from main.py to filter old, parsed orders'''
-        orders_in_db = self._get_channel_order_ids_in_db()
-        self.new_orders = [order_data for order_data in self.orders if order_data[self.proxy_keys['order-id']] not in orders_in_db]
+        Called from pipeline.py to filter old, parsed orders'''
+        with METRICS.span('dedup'):
+            orders_in_db = self._get_channel_order_ids_in_db()
+        self.new_orders = [order for order in self.orders if order.order_id not in orders_in_db]
         logging.info(f'Returning {len(self.new_orders)}/{len(self.orders)} new/loaded orders for further processing')
         return self.new_orders
 
-    def _get_channel_order_ids_in_db(self) -> list:
-        '''returns a list of order ids currently present in 'orders' database table for current run self.sales_channel'''
-        db_orders_of_sales_channel = self.session.query(Order).join(ProgramRun).filter(ProgramRun.sales_channel==self.sales_channel).all()
+    def _get_channel_order_ids_in_db(self) -> set:
+        '''returns a set of order ids currently present in 'orders' database table for current run self.sales_channel
+        (set: constant time membership checks in get_new_orders_only)'''
+        db_order_ids_of_sales_channel = self.session.query(Order.order_id).join(ProgramRun).filter(ProgramRun.sales_channel==self.sales_channel).all()
         # Unlikely conflict: Etsy / Amazon EU having same order-(item-)id as AmazonCOM or similar permutations between sales channels and id's
-        order_id_lst_in_db = [order_obj.order_id for order_obj in db_orders_of_sales_channel]
-        logging.debug(f'Before inserting new orders, orders table contains {len(order_id_lst_in_db)} entries associated with {self.sales_channel} channel')
-        return order_id_lst_in_db
+        order_ids_in_db = {order_id for order_id, in db_order_ids_of_sales_channel}
+        logging.debug(f'Before inserting new orders, orders table contains {len(order_ids_in_db)} entries associated with {self.sales_channel} channel')
+        return order_ids_in_db
+
+    def get_repeat_buyers(self, orders:list, days:int=REPEAT_BUYER_DAYS) -> dict:
+        '''returns {buyer_key: [(order_id, purchase_date, sales_channel, run timestamp), ...]} of orders in database
+        added during last days by buyers of passed orders (all sales channels). Buyer keys of passed orders are loaded
+        to temporary table, earlier orders are fetched by single join on indexed buyer_key column'''
+        buyer_keys = {get_buyer_key(order) for order in orders} - {None}
+        if not buyer_keys:
+            return {}
+        METRICS.count('repeat buyer lookup queries')
+        incoming_buyers = Table('incoming_buyer', MetaData(), Column('buyer_key', String, primary_key=True), prefixes=['TEMPORARY'])
+        connection = self.session.connection()
+        incoming_buyers.create(bind=connection)
+        try:
+            connection.execute(incoming_buyers.insert(), [{'buyer_key': buyer_key} for buyer_key in buyer_keys])
+            cutoff_timestamp = datetime.datetime.now() - datetime.timedelta(days=days)
+            earlier_orders = self.session.query(Order.buyer_key, Order.order_id, Order.order_id_secondary, Order.purchase_date, ProgramRun.sales_channel, ProgramRun.timestamp)\
+                                .join(ProgramRun).join(incoming_buyers, incoming_buyers.c.buyer_key == Order.buyer_key)\
+                                .filter(ProgramRun.timestamp >= cutoff_timestamp).order_by(ProgramRun.timestamp).all()
+        finally:
+            incoming_buyers.drop(bind=connection)
+        repeat_buyers = {}
+        for buyer_key, order_id, order_id_secondary, purchase_date, sales_channel, timestamp in earlier_orders:
+            # amazon order-id (as in same buyer export) rather than order-item-id
+            repeat_buyers.setdefault(buyer_key, []).append((order_id_secondary or order_id, purchase_date, sales_channel, timestamp))
+        logging.info(f'{len(repeat_buyers)} of {len(buyer_keys)} buyers in this batch ordered within last {days} days ({len(earlier_orders)} earlier orders)')
+        return repeat_buyers
 
     def flush_old_records(self):
         '''deletes old runs, associated backup files and orders (deleting runs delete cascade associated orders)'''
@@ -219,7 +264,8 @@ class SQLAlchemyOrdersDB:
             logging.debug(f'Backup for {os.path.basename(backup_db_path)} suspended due to testing: {self.testing}')
             return
         try:
-            shutil.copy(src=self.db_path, dst=backup_db_path)
+            with METRICS.span('db backup'):
+                shutil.copy(src=self.db_path, dst=backup_db_path)
             logging.info(f"New database backup {os.path.basename(backup_db_path)} created on: "
                         f"{datetime.datetime.today().strftime('%Y-%m-%d %H:%M')} location: {backup_db_path}")
         except Exception as e:
@@ -0,0 +1,48 @@
+from datetime import datetime, date, timedelta, timezone
+
+
+# GLOBAL VARIABLES
+# ECB publishes reference rates around 16:00 CET on TARGET business days. UTC hour covers both CET and CEST (15:00 / 14:00 UTC)
+ECB_PUBLICATION_UTC_HOUR = 15
+# fixed date TARGET closing days: (month, day)
+TARGET_FIXED_HOLIDAYS = [(1, 1), (5, 1), (12, 25), (12, 26)]
+
+
+def get_easter_sunday(year:int) -> date:
+    '''returns Western Easter Sunday date of year (anonymous Gregorian algorithm)'''
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def is_target_business_day(day:date) -> bool:
+    '''returns True if ECB publishes reference rates on day: weekdays except TARGET holidays
+    (New Year, Good Friday, Easter Monday, Labour Day, Christmas Day, 26 December)'''
+    if day.weekday() >= 5 or (day.month, day.day) in TARGET_FIXED_HOLIDAYS:
+        return False
+    easter_sunday = get_easter_sunday(day.year)
+    return day not in (easter_sunday - timedelta(days=2), easter_sunday + timedelta(days=1))
+
+def get_latest_publication_date(now:datetime=None) -> date:
+    '''returns date of latest ECB reference rates publication expected to be available at now (UTC aware datetime, defaults to now)'''
+    now = now if now else datetime.now(timezone.utc)
+    now = now.astimezone(timezone.utc)
+    day = now.date() if now.hour >= ECB_PUBLICATION_UTC_HOUR else now.date() - timedelta(days=1)
+    while not is_target_business_day(day):
+        day -= timedelta(days=1)
+    return day
+
+def new_rates_expected(last_updated:date, now:datetime=None) -> bool:
+    '''returns True if ECB should have published rates newer than last_updated by now'''
+    return get_latest_publication_date(now) > last_updated
+
+
+if __name__ == '__main__':
+    pass
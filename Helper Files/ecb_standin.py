@@ -0,0 +1,162 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import threading
+import hashlib
+import logging
+import time
+import sys
+
+
+# GLOBAL VARIABLES
+STANDIN_HOST = '127.0.0.1'
+STANDIN_DEFAULT_PORT = 8099
+SAMPLE_LAST_MODIFIED = 'Fri, 30 Sep 2022 14:15:03 GMT'
+SAMPLE_ECB_XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<gesmes:Envelope xmlns:gesmes="http://www.gesmes.org/xml/2002-08-01" xmlns="http://www.ecb.int/vocabulary/2002-08-01/eurofxref">
+	<gesmes:subject>Reference rates</gesmes:subject>
+	<gesmes:Sender>
+		<gesmes:name>European Central Bank</gesmes:name>
+	</gesmes:Sender>
+	<Cube>
+		<Cube time='2022-09-30'>
+			<Cube currency='USD' rate='0.9748'/>
+			<Cube currency='JPY' rate='141.01'/>
+			<Cube currency='BGN' rate='1.9558'/>
+			<Cube currency='CZK' rate='24.549'/>
+			<Cube currency='DKK' rate='7.4365'/>
+			<Cube currency='GBP' rate='0.88300'/>
+			<Cube currency='HUF' rate='424.18'/>
+			<Cube currency='PLN' rate='4.8483'/>
+			<Cube currency='RON' rate='4.9490'/>
+			<Cube currency='SEK' rate='10.9335'/>
+			<Cube currency='CHF' rate='0.9561'/>
+			<Cube currency='ISK' rate='141.70'/>
+			<Cube currency='NOK' rate='10.5838'/>
+			<Cube currency='TRY' rate='18.0841'/>
+			<Cube currency='AUD' rate='1.5076'/>
+			<Cube currency='BRL' rate='5.2584'/>
+			<Cube currency='CAD' rate='1.3401'/>
+			<Cube currency='CNY' rate='6.9368'/>
+			<Cube currency='HKD' rate='7.6522'/>
+			<Cube currency='IDR' rate='14851.44'/>
+			<Cube currency='ILS' rate='3.4773'/>
+			<Cube currency='INR' rate='79.4180'/>
+			<Cube currency='KRW' rate='1408.76'/>
+			<Cube currency='MXN' rate='19.6393'/>
+			<Cube currency='MYR' rate='4.5171'/>
+			<Cube currency='NZD' rate='1.7241'/>
+			<Cube currency='PHP' rate='57.277'/>
+			<Cube currency='SGD' rate='1.3996'/>
+			<Cube currency='THB' rate='36.913'/>
+			<Cube currency='ZAR' rate='17.5561'/>
+		</Cube>
+	</Cube>
+</gesmes:Envelope>'''
+
+
+class ECBStandIn():
+    '''local HTTP stand-in for ECB daily reference rates endpoint. Serves xml payload on any path
+    from background thread, allowing Forex to be exercised offline.
+
+    Like ECB, responds with ETag and Last-Modified headers and answers conditional requests
+    (If-None-Match / If-Modified-Since matching current payload) with 304 Not Modified.
+
+    Usage:
+        with ECBStandIn(delay=3) as ecb:
+            fx = Forex(ecb_url=ecb.url)
+
+    Args:
+    payload: xml text to serve (defaults to saved ECB daily payload)
+    delay: seconds to wait before responding (simulates slow / unreachable endpoint)
+    status: HTTP status code of responses
+    port: port to listen on, 0 picks free port
+    last_modified: Last-Modified header value of payload
+
+    Attributes:
+    url - endpoint url, available after start()
+    requests_served - list of (path, request headers dict) received
+    not_modified_served - number of 304 responses sent'''
+
+    def __init__(self, payload:str=SAMPLE_ECB_XML, delay:float=0, status:int=200, port:int=0, last_modified:str=SAMPLE_LAST_MODIFIED):
+        self.payload = payload
+        self.delay = delay
+        self.status = status
+        self.port = port
+        self.last_modified = last_modified
+        self.requests_served = []
+        self.not_modified_served = 0
+        self.server = None
+        self.url = None
+
+    def start(self) -> str:
+        '''starts serving in daemon thread, returns endpoint url'''
+        self.server = ThreadingHTTPServer((STANDIN_HOST, self.port), self._get_handler())
+        self.server.daemon_threads = True
+        self.url = f'http://{STANDIN_HOST}:{self.server.server_port}/stats/eurofxref/eurofxref-daily.xml'
+        threading.Thread(target=self.server.serve_forever, name='ecb-standin', daemon=True).start()
+        logging.debug(f'ECB stand-in serving at {self.url}')
+        return self.url
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def etag(self) -> str:
+        '''returns ETag header value of current payload'''
+        return f'"{hashlib.md5(self.payload.encode("utf-8")).hexdigest()}"'
+
+    def is_not_modified(self, request_headers:dict) -> bool:
+        '''returns True if request validators match current payload. If-None-Match takes precedence over If-Modified-Since'''
+        if 'If-None-Match' in request_headers:
+            return request_headers['If-None-Match'] == self.etag
+        return request_headers.get('If-Modified-Since') == self.last_modified
+
+    def _get_handler(self):
+        '''returns request handler class bound to this stand-in'''
+        standin = self
+
+        class StandInHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                standin.requests_served.append((self.path, dict(self.headers)))
+                if standin.delay:
+                    time.sleep(standin.delay)
+                if standin.status == 200 and standin.is_not_modified(self.headers):
+                    standin.not_modified_served += 1
+                    self.send_response(304)
+                    self.send_header('ETag', standin.etag)
+                    self.end_headers()
+                    return
+                body = standin.payload.encode('utf-8')
+                self.send_response(standin.status)
+                self.send_header('ETag', standin.etag)
+                self.send_header('Last-Modified', standin.last_modified)
+                self.send_header('Content-Type', 'text/xml')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug(f'ECB stand-in: {format % args}')
+
+        return StandInHandler
+
+
+if __name__ == '__main__':
+    # usage: python ecb_standin.py [port]. Serves until interrupted
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else STANDIN_DEFAULT_PORT
+    standin = ECBStandIn(port=port)
+    print(f'ECB stand-in serving at: {standin.start()}')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        standin.stop()
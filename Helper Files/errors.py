@@ -0,0 +1,41 @@
+# GLOBAL VARIABLES
+VBA_ERROR_ALERT = 'ERROR_CALL_DADDY'
+VBA_KEYERROR_ALERT = 'ERROR_IN_SOURCE_HEADERS'
+VBA_NO_FX_RATES = 'NO FOREX DATA IN PYTHON SIDE'
+
+
+class ParserError(Exception):
+    '''error terminating run. Raised (after logging details) where VBA used to be alerted and program terminated;
+    CLI (main.py) prints alerts collected before error and vba_token. Export jobs catching it alert vba_token and fail.
+
+    Attributes:
+    vba_token - alert token for VBA, None if no extra token is due (failure already alerted)
+    alerts - VBA alerts collected during run before error, set by pipeline.process_orders'''
+    vba_token = VBA_ERROR_ALERT
+
+    def __init__(self, message:str):
+        super().__init__(message)
+        self.alerts = []
+
+
+class SourceHeadersError(ParserError):
+    '''expected column missing in loaded orders file'''
+    vba_token = VBA_KEYERROR_ALERT
+
+
+class NoFxRatesError(ParserError):
+    '''no cached fx rates and initial download failed'''
+    vba_token = VBA_NO_FX_RATES
+
+
+class ExportStageError(ParserError):
+    '''one or more export jobs failed, orders not added to database. Jobs alerted their own tokens'''
+    vba_token = None
+
+
+class DatabaseWriteError(ParserError):
+    '''new orders could not be added to database after exports'''
+
+
+if __name__ == '__main__':
+    pass
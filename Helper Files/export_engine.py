@@ -0,0 +1,405 @@
+from parser_utils import get_dpost_product_header_val, get_origin_country, shorten_word_sequence, enter_LP_address
+from parser_utils import get_lp_priority, get_LP_siuntos_rusis_header, get_hs_code, get_sales_channel_hs_code
+from parser_constants import DPOST_HEADERS, DPOST_HEADERS_MAPPING, DPOST_FIXED_VALUES
+from parser_constants import LP_HEADERS, LP_HEADERS_MAPPING, LP_FIXED_VALUES
+from parser_constants import NLPOST_HEADERS, NLPOST_HEADERS_MAPPING, NLPOST_FIXED_VALUES
+from parser_constants import ETONAS_HEADERS, ETONAS_HEADERS_MAPPING
+from parser_constants import DPDUPS_HEADERS, DPDUPS_HEADERS_MAPPING
+from xlsx_exporter import XlsxExporter, FILL_HIGHLIGHT, YELLOW_HIGHLIGHT
+from order_record import OrderRecord, get_field_name
+from output_capture import vba_alert
+from errors import ParserError
+from countries import COUNTRIES
+from operator import attrgetter
+import logging
+import csv
+import os
+
+
+# GLOBAL VARIABLES
+VBA_DPOST_CHARLIMIT_ALERT = 'DPOST_CHARLIMIT_WARNING'
+VBA_ETONAS_CHARTLIMIT_ALERT = 'ETONAS_CHARLIMIT_WARNING'
+VBA_NLPOST_CHARTLIMIT_ALERT = 'NLPOST_CHARLIMIT_WARNING'
+VBA_MISSING_WEIGHT_DATA_ALERT = 'ETONAS/NLPOST MISSING_WEIGHT_WARNING'
+DPOST_NAME_CHARLIMIT = 30
+DPOST_ADDRESS_CHARLIMIT = 40
+ETONAS_CHARLIMIT_PER_CELL = 32
+NLPOST_CHARLIMIT_PER_CELL = 90
+CSV_DELIMITER = ';'
+PACKAGE_DIMENSIONS = {
+    'DKS': {'X': '20', 'Y': '15', 'Z': '10'},
+    'MKS': {'X': '15', 'Y': '10', 'Z': '2'}}
+
+
+# Computed fields: {header: field factory}. Factory receives compiled CarrierTemplate and header, returns
+# extractor(order, derived) -> header value. 'derived' holds per order values of template 'derive' function
+
+def origin_country_field(template, header:str):
+    '''origin country by item title. Etsy - title from weights workbook, in case weight workbook missing title still: CN'''
+    return lambda order, derived: get_origin_country(order.title)
+
+def hs_code_by_title_field(template, header:str):
+    return lambda order, derived: get_sales_channel_hs_code(order)
+
+def order_field(field:str):
+    '''returns factory of field taking value of order record field'''
+    return lambda template, header: lambda order, derived: getattr(order, field)
+
+def get_weight_in_kg(order:OrderRecord):
+    '''returns order weight in kg if possible, empty str if not'''
+    try:
+        return round(order.weight / 1000, 3)
+    except:
+        vba_alert(VBA_MISSING_WEIGHT_DATA_ALERT)
+        return ''
+
+def get_package_dimension(vmdoption:str, header:str) -> str:
+    '''returns package dimension in cm, formatted for NLPost'''
+    if vmdoption not in ['VKS', 'MKS', 'DKS']:
+        vba_alert(VBA_MISSING_WEIGHT_DATA_ALERT)
+        return ''
+    package_category = 'DKS' if vmdoption == 'DKS' else 'MKS'
+    return PACKAGE_DIMENSIONS[package_category][header]
+
+def get_fname_lname(order:OrderRecord, sales_channel:str):
+    '''returns first and last name based on sales channel'''
+    try:
+        if sales_channel == 'Etsy':
+            return order.buyer_fname, order.buyer_lname
+        else:
+            f_name, l_name = order.recipient_name.split(' ', 1)
+            return f_name, l_name
+    except ValueError as e:
+        logging.debug('Failed to unpack f_name, l_name for sales ch: %s etonas xlsx. Err: %s. Returning recipient_name order val: %s and empty l_name', sales_channel, e, order.recipient_name)
+        return order.recipient_name, ''
+
+
+CSV_COMPUTED_FIELDS = {
+    # DP specific headers
+    'PRODUCT' : lambda template, header: lambda order, derived: get_dpost_product_header_val(order),
+    'CUST_REF' : lambda template, header: lambda order, derived: order.recipient_name[:20],
+    # LP specific headers
+    'Siuntos rūšis' : lambda template, header: lambda order, derived: get_LP_siuntos_rusis_header(order.vmdoption, order.tracked),
+    'Gavėjo gatvė' : lambda template, header: lambda order, derived: enter_LP_address(header, order),
+    'Adreso eilutė 1' : lambda template, header: lambda order, derived: enter_LP_address(header, order),
+    'Adreso eilutė 2' : lambda template, header: lambda order, derived: enter_LP_address(header, order),
+    'Pirmenybinis siuntimas' : lambda template, header: lambda order, derived: get_lp_priority(order),
+    'HS kodas' : lambda template, header: lambda order, derived: get_hs_code(order.brand, order.category),
+    # etsy has no service level ('')
+    'Delivery Method' : lambda template, header: lambda order, derived: order.ship_service_level + (' EXPEDITED' if order.ship_service_level == 'Expedited' else ''),
+    # Common headers
+    'DETAILED_CONTENT_DESCRIPTIONS_1' : order_field('category'),
+    'Siuntos turinio aprašymas anglų kalba' : order_field('category'),
+    'DECLARED_VALUE_1' : order_field('total_engineered'),
+    'TOTAL_VALUE' : order_field('total_engineered'),
+    'Deklaruojama vertė (eur)' : order_field('total_engineered'),
+    'DECLARED_ORIGIN_COUNTRY_1' : origin_country_field,
+    'Prekių kilmės šalis' : origin_country_field,
+}
+
+ETONAS_COMPUTED_FIELDS = {
+    # etsy has no address3 field ('')
+    'Address line 3' : order_field('ship_address_3'),
+    'First name' : lambda template, header: lambda order, derived: derived['first_name'],
+    'Last name' : lambda template, header: lambda order, derived: derived['last_name'],
+    'HS code' : hs_code_by_title_field,
+    'Origin Country' : origin_country_field,
+    'Unit price' : order_field('total_engineered'),
+    'Weight' : lambda template, header: lambda order, derived: derived['weight_kg'],
+    'Unit weight' : lambda template, header: lambda order, derived: round(derived['weight_kg'] / int(order.quantity_purchased), 3) if isinstance(derived['weight_kg'], float) else '',
+    'Service provider' : lambda template, header: lambda order, derived: 'Evri' if order.ship_country in ['UK', 'GB'] else 'Postnl',
+    # untracked, non-UK (Postnl) -> 'non' 2022.07.27 update
+    'Service type' : lambda template, header: lambda order, derived: 'track' if order.tracked else ('non' if not order.ship_country in ['UK', 'GB'] else ''),
+}
+
+NLPOST_COMPUTED_FIELDS = {
+    'Receiver street' : lambda template, header: lambda order, derived: derived['address'],
+    'X' : lambda template, header: lambda order, derived: get_package_dimension(order.vmdoption, header),
+    'Y' : lambda template, header: lambda order, derived: get_package_dimension(order.vmdoption, header),
+    'Z' : lambda template, header: lambda order, derived: get_package_dimension(order.vmdoption, header),
+    'Service name' : lambda template, header: lambda order, derived: 'No Data' if order.vmdoption == '' else ('PEC1' if order.tracked else 'PEC0'),
+    'Weight' : lambda template, header: lambda order, derived: get_weight_in_kg(order),
+    'HS code' : hs_code_by_title_field,
+    'Unit price' : order_field('total_engineered'),
+}
+
+DPDUPS_COMPUTED_FIELDS = {
+    'Service Picked' : order_field('shipping_service'),
+    'Tracked' : order_field('tracked'),
+    'Sales Channel' : lambda template, header: lambda order, derived: template.sales_channel,
+}
+
+
+# Derive functions: called once per order before header extraction, return values shared by several headers
+
+def derive_etonas_values(order:OrderRecord, template) -> dict:
+    '''returns first, last name and weight in kg of order. Changes GB to UK for Etonas (mutates order)'''
+    first_name, last_name = get_fname_lname(order, template.sales_channel)
+    weight_kg = get_weight_in_kg(order)
+    if order.ship_country == 'GB':
+        order.ship_country = 'UK'
+    return {'first_name': first_name, 'last_name': last_name, 'weight_kg': weight_kg}
+
+def derive_nlpost_values(order:OrderRecord, template) -> dict:
+    '''returns receiver street combined of two (three for amazon) address fields'''
+    if template.sales_channel != 'Etsy':
+        return {'address': f'{order.ship_address_1} {order.ship_address_2} {order.ship_address_3}'}
+    return {'address': f'{order.ship_address_1} {order.ship_address_2}'}
+
+
+# Highlight rules: order -> bool
+
+def is_nlpost_row_highlighted(order:OrderRecord) -> bool:
+    '''returns True if order row should be highlighted when writing to xlsx'''
+    weight, vmdoption = order.weight, order.vmdoption
+    if weight != '':
+        if weight > 2000:
+            return True
+        elif vmdoption in ['VKS', 'MKS', 'DKS']:
+            if vmdoption == 'VKS' and weight > 50:
+                return True
+            elif vmdoption == 'MKS' and weight > 500:
+                return True
+    return False
+
+
+# Row validators: called with export ready row, return row to export
+
+def validate_dpost_row(row:dict) -> dict:
+    '''rearranges /shortens data fields on demand (charlimit for fields)
+    Takes care of: address1,2,3 , name, postcode fields'''
+    name = row['NAME']
+    row['POSTAL_CODE'] = row['POSTAL_CODE'].upper()
+
+    if len(name) > DPOST_NAME_CHARLIMIT:
+        logging.debug('Order enters name shortening functions')
+        row['NAME'] = shorten_word_sequence(name)
+
+    if len(row['ADDRESS_LINE_1']) > DPOST_ADDRESS_CHARLIMIT or \
+        len(row['ADDRESS_LINE_2']) > DPOST_ADDRESS_CHARLIMIT or \
+        len(row['ADDRESS_LINE_3']) > DPOST_ADDRESS_CHARLIMIT:
+        logging.debug('Order enters address reorganisation')
+        row = reorg_dpost_row_addr(row)
+    return row
+
+def reorg_dpost_row_addr(row:dict) -> dict:
+    '''reoganizes address fields, returns original row dict, if reorganization still exceeds fields' limits'''
+    original_row = row.copy()
+    logging.debug('Before address reorg:\nf1: %s\nf2: %s\nf3:%s', row['ADDRESS_LINE_1'], row['ADDRESS_LINE_2'], row['ADDRESS_LINE_3'])
+    total_address_seq = row['ADDRESS_LINE_1'] + ' ' + row['ADDRESS_LINE_2'] + ' ' + row['ADDRESS_LINE_3']
+    address_seq = total_address_seq.split()
+    # Reset fields, declare availability flags
+    row['ADDRESS_LINE_1'] = row['ADDRESS_LINE_2'] = row['ADDRESS_LINE_3'] = ''
+    f1_not_filled = f2_not_filled = True
+    # Reorganizing fields
+    for addr_item in address_seq:
+        if len(row['ADDRESS_LINE_1']) + len(addr_item) < DPOST_ADDRESS_CHARLIMIT and f1_not_filled:
+            row['ADDRESS_LINE_1'] = row['ADDRESS_LINE_1'] + addr_item + ' '
+        elif len(row['ADDRESS_LINE_2']) + len(addr_item) < DPOST_ADDRESS_CHARLIMIT and f2_not_filled:
+            row['ADDRESS_LINE_2'] = row['ADDRESS_LINE_2'] + addr_item + ' '
+            f1_not_filled = False
+        elif len(row['ADDRESS_LINE_3']) + len(addr_item) < DPOST_ADDRESS_CHARLIMIT:
+            row['ADDRESS_LINE_3'] = row['ADDRESS_LINE_3'] + addr_item + ' '
+            f2_not_filled = False
+        else:
+            logging.warning('Address reorganization failed. Total address char count: %s could not fit into 3x%s',
+                len(row['ADDRESS_LINE_1']) + len(row['ADDRESS_LINE_2']) + len(row['ADDRESS_LINE_3']), DPOST_ADDRESS_CHARLIMIT)
+            logging.warning('Warning VBA, returning original row: %s', original_row)
+            vba_alert(VBA_DPOST_CHARLIMIT_ALERT)
+            return original_row
+    logging.debug('After reorg:\nf1: %s\nf2: %s\nf3:%s', row['ADDRESS_LINE_1'], row['ADDRESS_LINE_2'], row['ADDRESS_LINE_3'])
+    return row
+
+def validate_lp_row(row:dict) -> dict:
+    '''conditionally deletes some of the fields before export. Most of LP valiation is made on VBA side'''
+    if COUNTRIES.is_eu(row['Gavėjo šalies kodas'].upper()):
+        row['Siuntos turinio kategorija'] = ''
+        row['HS kodas'] = ''
+        row['Prekių kilmės šalis'] = ''
+        row['Siuntos turinio aprašymas anglų kalba'] = ''
+        row['Kiekis (vnt)'] = ''
+        row['Deklaruojamas siuntos svoris (g)'] = ''
+        row['Deklaruojama vertė (eur)'] = ''
+    return row
+
+
+# Carrier templates registry. Header value resolution order: fixed > mapping (+ optional mapped transform) > computed > ''
+# Mapping values are internal order keys (proxy keys), read from order record fields (order_record.get_field_name)
+CARRIER_TEMPLATES = {
+    'dp': {
+        'format': 'csv',
+        'headers': DPOST_HEADERS,
+        'fixed': DPOST_FIXED_VALUES,
+        'mapping': DPOST_HEADERS_MAPPING,
+        'computed': CSV_COMPUTED_FIELDS,
+        'validate': validate_dpost_row,
+    },
+    'lp': {
+        'format': 'csv',
+        'headers': LP_HEADERS,
+        'fixed': LP_FIXED_VALUES,
+        'mapping': LP_HEADERS_MAPPING,
+        'computed': CSV_COMPUTED_FIELDS,
+        'validate': validate_lp_row,
+    },
+    'etonas': {
+        'format': 'xlsx',
+        'headers': ETONAS_HEADERS,
+        'mapping': ETONAS_HEADERS_MAPPING,
+        'computed': ETONAS_COMPUTED_FIELDS,
+        'derive': derive_etonas_values,
+        # warn in VBA if char limit per cell is exceeded in Etonas address lines 1/2/3
+        'charlimit': (ETONAS_CHARLIMIT_PER_CELL, VBA_ETONAS_CHARTLIMIT_ALERT, [header for header in ETONAS_HEADERS if 'address' in header.lower()]),
+        'cell_highlights': {'Service type': (lambda order: order.tracked, YELLOW_HIGHLIGHT)},
+    },
+    'nlpost': {
+        'format': 'xlsx',
+        'headers': NLPOST_HEADERS,
+        'fixed': NLPOST_FIXED_VALUES,
+        'mapping': NLPOST_HEADERS_MAPPING,
+        'mapped_transforms': {
+            # strip special chars from phone number, not allowed in nlpost system
+            'Receiver phone': lambda text: text.replace('(', '').replace(')', '').replace('+', '').replace(';', '').replace(':', '').replace(' ', '').replace('-', ''),
+            'Description': lambda contents: contents.replace('BATTERIES', 'ALKALINE BATTERIES'),
+        },
+        'computed': NLPOST_COMPUTED_FIELDS,
+        'derive': derive_nlpost_values,
+        'charlimit': (NLPOST_CHARLIMIT_PER_CELL, VBA_NLPOST_CHARTLIMIT_ALERT, ['Receiver street']),
+        'row_highlight': (is_nlpost_row_highlighted, FILL_HIGHLIGHT),
+        # first row is left empty in NLPost workbook
+        'row_offset': 1,
+    },
+    'dpdups': {
+        'format': 'xlsx',
+        'headers': DPDUPS_HEADERS,
+        'mapping': DPDUPS_HEADERS_MAPPING,
+        'computed': DPDUPS_COMPUTED_FIELDS,
+    },
+}
+
+
+class CarrierTemplate():
+    '''carrier template from CARRIER_TEMPLATES compiled for sales channel: header dispatch, fixed values and mapped
+    order fields are resolved once into list of extractors, producing export row is single pass over them.
+
+    main method:
+    prepare_rows(orders) - returns (rows, styles): export ready row dicts and per row style intents
+
+    Args:
+    carrier: key in CARRIER_TEMPLATES
+    sales_channel: str'''
+
+    def __init__(self, carrier:str, sales_channel:str):
+        spec = CARRIER_TEMPLATES[carrier]
+        self.carrier = carrier
+        self.sales_channel = sales_channel
+        self.file_format = spec['format']
+        self.headers = spec['headers']
+        self.row_offset = spec.get('row_offset', 0)
+        self.derive = spec.get('derive')
+        self.validate = spec.get('validate')
+        self.row_highlight = spec.get('row_highlight')
+        self.cell_highlights = spec.get('cell_highlights', {})
+        charlimit, self.charlimit_alert, charlimit_headers = spec.get('charlimit', (None, None, []))
+        self.extractors = [(header, self.__compile_header(header, spec), charlimit if header in charlimit_headers else None) for header in self.headers]
+        logging.debug(f'Compiled {carrier} export template for {sales_channel}: {len(self.headers)} headers')
+
+    def __compile_header(self, header:str, spec:dict):
+        '''returns extractor(order, derived) for header based on template spec'''
+        if header in spec.get('fixed', {}):
+            fixed_value = spec['fixed'][header]
+            return lambda order, derived: fixed_value
+
+        elif header in spec.get('mapping', {}):
+            # etsy data has no phone / email / ship-address-3: record fields are ''
+            get_value = attrgetter(get_field_name(spec['mapping'][header]))
+            transform = spec.get('mapped_transforms', {}).get(header)
+            if transform:
+                return lambda order, derived: transform(get_value(order))
+            return lambda order, derived: get_value(order)
+
+        elif header in spec.get('computed', {}):
+            return spec['computed'][header](self, header)
+        else:
+            return lambda order, derived: ''
+
+    def prepare_rows(self, orders:list) -> tuple:
+        '''returns (rows, styles). rows - export ready dicts, keys are template headers; styles - per row
+        (row fill or None, {header: cell fill}). Raises ParserError on unexpected errors'''
+        try:
+            rows, styles = [], []
+            for order in orders:
+                derived = self.derive(order, self) if self.derive else {}
+                row = {}
+                for header, extract, charlimit in self.extractors:
+                    row[header] = extract(order, derived)
+                    if charlimit and len(row[header]) > charlimit:
+                        logging.warning('Order with key %s and value %s triggered VBA warning for charlimit set by %s', header, row[header], self.carrier)
+                        vba_alert(self.charlimit_alert)
+                rows.append(self.validate(row) if self.validate else row)
+                styles.append(self.__get_row_styles(order))
+            return rows, styles
+        except ParserError:
+            raise
+        except Exception as e:
+            logging.critical(f'Error while preparing {self.carrier} export rows. Error: {e}')
+            logging.critical('Order causing trouble: %s', order)
+            raise ParserError(f'Error while preparing {self.carrier} export rows. Err: {e}')
+
+    def __get_row_styles(self, order:OrderRecord) -> tuple:
+        '''returns (row fill or None, {header: fill}) of order row'''
+        row_fill = None
+        if self.row_highlight:
+            predicate, fill = self.row_highlight
+            row_fill = fill if predicate(order) else None
+        cell_fills = {header: fill for header, (predicate, fill) in self.cell_highlights.items() if predicate(order)}
+        return row_fill, cell_fills
+
+
+class ExportEngine():
+    '''exports orders to carrier files based on CARRIER_TEMPLATES registry. Templates are compiled once per engine
+    and drive both csv and xlsx writers
+
+    main method:
+    export(carrier, orders, export_path)
+
+    Args:
+    sales_channel: str'''
+
+    def __init__(self, sales_channel:str):
+        self.sales_channel = sales_channel
+        self.templates = {}
+
+    def get_template(self, carrier:str) -> CarrierTemplate:
+        if carrier not in self.templates:
+            self.templates[carrier] = CarrierTemplate(carrier, self.sales_channel)
+        return self.templates[carrier]
+
+    def export(self, carrier:str, orders:list, export_path:str):
+        '''writes orders to carrier file at export_path, format by carrier template'''
+        template = self.get_template(carrier)
+        rows, styles = template.prepare_rows(orders)
+        if template.file_format == 'csv':
+            self.export_csv(export_path, template.headers, rows)
+        else:
+            XlsxExporter(rows, styles, export_path, template.headers, template.row_offset).export()
+            logging.info(f'XLSX {export_path} created. Orders inside: {len(rows)}')
+
+    @staticmethod
+    def export_csv(csv_filename:str, headers:list, contents:list, delimiter:str=CSV_DELIMITER):
+        '''exports data to csv details provided as func. args, don't export empty files'''
+        if not contents:
+            logging.info(f'Skipping {os.path.basename(csv_filename)} export. No new orders.')
+            return
+        try:
+            with open(csv_filename, 'w', encoding='utf-8-sig', newline='') as csv_f:
+                writer = csv.DictWriter(csv_f, fieldnames=headers, delimiter=delimiter)
+                writer.writeheader()
+                writer.writerows(contents)
+            logging.info(f'CSV {csv_filename} created. Orders inside: {len(contents)}')
+        except Exception as e:
+            logging.error(f'Error occured while exporting data to csv. Error: {e}.Arguments:\nheaders: {headers}\ncontents: {contents[0].keys()}')
+
+
+if __name__ == "__main__":
+    pass
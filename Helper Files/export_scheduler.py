@@ -0,0 +1,116 @@
+from output_capture import capture_output, vba_alert
+from log_utils import setup_worker_logging
+from errors import ParserError
+from export_engine import ExportEngine, CARRIER_TEMPLATES
+from metrics import METRICS
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import get_context
+import logging
+import time
+import os
+
+
+# GLOBAL VARIABLES
+VBA_ERROR_ALERT = 'ERROR_CALL_DADDY'
+# xlsx exports below this size are written in threads: worker process start up (spawn) costs more than it saves
+XLSX_PROCESS_MIN_ORDERS = 2000
+MAX_EXPORT_PROCESSES = 3
+MAX_EXPORT_THREADS = 4
+
+
+def export_carrier_orders(carrier:str, orders:list, export_path:str, sales_channel:str):
+    '''exports orders to carrier file. Module level function: picklable, runs in worker process or thread'''
+    ExportEngine(sales_channel).export(carrier, orders, export_path)
+
+def run_captured(job_func, *args) -> tuple:
+    '''runs job_func(*args), collecting VBA alerts and log lines it produces. Returns (succeeded, captured output,
+    (wall sec, cpu sec)). Job raising counts as failed: ParserError alerts its vba_token, unexpected errors - VBA_ERROR_ALERT'''
+    start_time, cpu_start_time = time.perf_counter(), time.thread_time()
+    with capture_output() as captured:
+        try:
+            job_func(*args)
+            succeeded = True
+        except ParserError as e:
+            if e.vba_token:
+                vba_alert(e.vba_token)
+            succeeded = False
+        except Exception as e:
+            logging.critical(f'Unexpected error in export job {job_func.__name__}{args[:1]}. Alerting VBA. Err: {e}')
+            vba_alert(VBA_ERROR_ALERT)
+            succeeded = False
+    return succeeded, captured, (time.perf_counter() - start_time, time.thread_time() - cpu_start_time)
+
+
+class ExportScheduler():
+    '''runs export jobs concurrently: xlsx carrier exports (CPU bound in openpyxl) in worker processes,
+    csv / txt exports in threads. Jobs alerts and log lines are collected and replayed in order jobs were added,
+    stdout seen by VBA does not depend on scheduling.
+
+    main methods:
+    add_job(name, job_func, *args) - job running in thread (may be bound method, no pickling)
+    add_carrier_job(carrier, orders, export_path, name=None) - carrier file export, skipped if no orders
+    run() - runs all jobs, returns True if all succeeded
+
+    Args:
+    sales_channel: str'''
+
+    def __init__(self, sales_channel:str):
+        self.sales_channel = sales_channel
+        self.jobs = []
+        # single core machine gains nothing from worker processes
+        self.use_processes = (os.cpu_count() or 1) > 1
+
+    def add_job(self, name:str, job_func, *args):
+        self.jobs.append((name, False, job_func, args))
+
+    def add_carrier_job(self, carrier:str, orders:list, export_path:str, name:str=None):
+        if not orders:
+            return
+        in_process = self.use_processes and CARRIER_TEMPLATES[carrier]['format'] == 'xlsx' and len(orders) >= XLSX_PROCESS_MIN_ORDERS
+        self.jobs.append((f'{name if name else carrier} export', in_process, export_carrier_orders, (carrier, orders, export_path, self.sales_channel)))
+
+    def run(self) -> bool:
+        '''runs jobs, replays their output in job order. Returns True if all jobs succeeded'''
+        start_time = time.perf_counter()
+        process_jobs_count = sum(1 for _, in_process, _, _ in self.jobs if in_process)
+        thread_pool = ThreadPoolExecutor(max_workers=MAX_EXPORT_THREADS, thread_name_prefix='export')
+        # spawn on all platforms: same behaviour as on Windows, no forking of process running fx refresh thread
+        process_pool = None
+        if process_jobs_count:
+            process_pool = ProcessPoolExecutor(max_workers=min(process_jobs_count, MAX_EXPORT_PROCESSES), mp_context=get_context('spawn'),
+                                            initializer=setup_worker_logging, initargs=(logging.getLogger().getEffectiveLevel(),))
+        try:
+            futures = [None] * len(self.jobs)
+            # process jobs submitted first, worker start up overlaps with thread jobs
+            for job_idx in sorted(range(len(self.jobs)), key=lambda job_idx: not self.jobs[job_idx][1]):
+                _, in_process, job_func, args = self.jobs[job_idx]
+                pool = process_pool if in_process else thread_pool
+                futures[job_idx] = pool.submit(run_captured, job_func, *args)
+            return self.__collect_results(futures)
+        finally:
+            thread_pool.shutdown()
+            if process_pool:
+                process_pool.shutdown()
+            logging.info(f'Export stage of {len(self.jobs)} jobs ({process_jobs_count} in processes) took {time.perf_counter() - start_time:.2f} sec')
+
+    def __collect_results(self, futures:list) -> bool:
+        '''waits for jobs in order they were added, replays their output. Returns True if all succeeded'''
+        all_succeeded = True
+        for (name, in_process, _, _), future in zip(self.jobs, futures):
+            try:
+                succeeded, captured, (wall_sec, cpu_sec) = future.result()
+            except Exception as e:
+                # worker process died (BrokenProcessPool) or result could not be transferred
+                logging.critical(f'Export job {name} crashed. Alerting VBA. Err: {e}')
+                vba_alert(VBA_ERROR_ALERT)
+                all_succeeded = False
+                continue
+            captured.replay()
+            logging.info(f'Export job {name} {"succeeded" if succeeded else "failed"} in {wall_sec:.2f} sec ({"process" if in_process else "thread"})')
+            METRICS.add_span(f'exports/{name}', wall_sec, cpu_sec)
+            all_succeeded = all_succeeded and succeeded
+        return all_succeeded
+
+
+if __name__ == "__main__":
+    pass
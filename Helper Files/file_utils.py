@@ -2,11 +2,22 @@ from datetime import datetime
 import platform
 import logging
 import shutil
+import time
 import json
 import sys
 import os
 
 
+# GLOBAL VARIABLES
+# overrides Helper Files folder (synthetic workspaces of benchmark.py), client files are written one level above it
+HELPER_DIR_ENV_VAR = 'ORDERS_PARSER_HELPER_DIR'
+# retention of per run files in Helper Files subfolders, applied by delete_oldest_files. Log file rotation: log_utils.py
+# run metrics json (metrics.py, ~2 KB per run): kept by age, long term record of stage timings
+RUN_METRICS_MAX_AGE_DAYS = 400
+# profiled runs reports (profiling.py, up to several MB per run): only latest runs kept, older are superseded by them
+PROFILES_KEEP_COUNT = 5
+
+
 def is_windows_machine() -> bool:
     '''returns True if machine executing the code is Windows based'''
     machine_os = platform.system()
@@ -15,12 +26,21 @@ def is_windows_machine() -> bool:
 def get_output_dir(client_file=True):
     '''returns target dir for output files depending on execution type (.exe/.py) and file type (client/systemic)'''
     # pyinstaller sets 'frozen' attr to sys module when compiling
-    if getattr(sys, 'frozen', False):
+    if os.environ.get(HELPER_DIR_ENV_VAR):
+        curr_folder = os.path.abspath(os.environ[HELPER_DIR_ENV_VAR])
+    elif getattr(sys, 'frozen', False):
         curr_folder = os.path.dirname(sys.executable)
     else:
         curr_folder = os.path.dirname(os.path.abspath(__file__))
     return get_level_up_abspath(curr_folder) if client_file else curr_folder
 
+def open_for_client(file_abspath:str):
+    '''opens file in its default application for client. Windows only, elsewhere file path is logged'''
+    if is_windows_machine():
+        os.startfile(file_abspath)
+    else:
+        logging.info(f'Not a Windows machine, file not opened: {file_abspath}')
+
 def get_level_up_abspath(absdir_path:str) -> str:
     '''returns abs directory path one level above provided dir as arg'''
     return os.path.dirname(absdir_path)
@@ -49,11 +69,14 @@ def get_backup_f_abspath(src_files_folder:str, backup_fname_prefix:str, ext:str)
     return os.path.join(src_files_folder, backup_fname)
 
 def dump_to_json(export_obj, json_fname:str) -> str:
-    '''exports export_obj to json file. Returns path to crated json'''
+    '''exports export_obj to json file. Returns path to crated json. File is replaced atomically
+    (written to temporary file first), so interrupted writes never leave partial json behind'''
     output_dir = get_output_dir(client_file=False)
     json_path = os.path.join(output_dir, json_fname)
-    with open(json_path, 'w', encoding='utf-8') as f:
+    tmp_path = f'{json_path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
         json.dump(export_obj, f, indent=4)
+    os.replace(tmp_path, json_path)
     return json_path
 
 def read_json_to_obj(json_file_path:str):
@@ -71,6 +94,27 @@ def delete_file(file_abspath:str):
     except Exception as e:
         logging.warning(f'Unexpected err: {e} while flushing db old records, deleting file: {file_abspath}')
 
+def delete_oldest_files(dir_path:str, keep_count:int=None, max_age_days:int=None, group_key=None):
+    '''deletes older files in dir_path (by modification time): all but keep_count newest and / or those older than max_age_days.
+    Optional group_key(fname) groups files kept / deleted together (e.g. several reports of same run). Failures are logged only'''
+    try:
+        groups = {}
+        for fname in os.listdir(dir_path):
+            fpath = os.path.join(dir_path, fname)
+            if os.path.isfile(fpath):
+                groups.setdefault(group_key(fname) if group_key else fname, []).append(fpath)
+        groups_mtimes = sorted(((max(os.path.getmtime(fpath) for fpath in fpaths), fpaths) for fpaths in groups.values()), reverse=True)
+        min_mtime = time.time() - max_age_days * 86400 if max_age_days is not None else 0
+        deleted_count = 0
+        for idx, (mtime, fpaths) in enumerate(groups_mtimes):
+            if (keep_count is not None and idx >= keep_count) or mtime < min_mtime:
+                for fpath in fpaths:
+                    os.remove(fpath)
+                deleted_count += 1
+        logging.debug(f'Deleted {deleted_count} of {len(groups_mtimes)} files / file groups in {dir_path}')
+    except Exception as e:
+        logging.warning(f'Failed to delete old files in {dir_path}. Err: {e}')
+
 def export_as_textfile(fname:str, items:list):
     '''simple txt export utility, writes each list item to new line'''
     with open(fname, 'w', encoding='utf-8') as f:
@@ -1,10 +1,15 @@
 from file_utils import get_output_dir, dump_to_json, read_json_to_obj
-from bs4 import BeautifulSoup
-from datetime import datetime
+from fx_history import FxHistory, FX_HISTORY_DIR
+from ecb_calendar import new_rates_expected
+from metrics import METRICS
+from output_capture import vba_alert
+from errors import NoFxRatesError
+from xml.etree.ElementTree import iterparse
+from datetime import date
+from io import BytesIO
+import threading
 import requests
 import logging
-import lxml
-import sys
 import os
 
 
@@ -12,146 +17,261 @@ import os
 ECB_XML_URL = 'https://www.ecb.europa.eu/stats/eurofxref/eurofxref-daily.xml'
 SUPPORTED_CURRENCIES = ['USD', 'GBP', 'CAD', 'CDN', 'AUD', 'HKD', 'SGD', 'SEK', 'PLN', 'MXN']
 RATES_JSON = 'fx.json'
-VBA_NO_FX_RATES = 'NO FOREX DATA IN PYTHON SIDE'
+ECB_TIMEOUT = 4
+# background refresh is given as long as its request may take
+FX_REFRESH_JOIN_TIMEOUT = ECB_TIMEOUT
 VBA_FOREX_ALERT = 'FOREX FAILURE'
 
 
 class Forex():
     '''all things related to currency conversion. FX data source: ECB xml
     access supported pairs dictionary {'currency': float, ...} through instance variable 'rates'
-    
-    main method for external use:
 
-    convert_to_eur(amount:float, currency:str)'''
+    Stale-while-revalidate: cached rates in fx.json are served immediately. When ECB publication calendar (ecb_calendar.py)
+    says newer rates should exist, they are requested in background thread and saved for next run (fx.json, history file).
+    Rates in use by current run (rates, history) never change mid run. Blocks on download only when no usable cached rates exist.
 
-    def __init__(self):
+    Requests are conditional: ETag / Last-Modified validators of last response are kept in fx.json and sent back,
+    unchanged xml is answered by ECB with 304 Not Modified and no body.
+
+    Each fetched daily snapshot extends local rates history (fx_history.py), used for date-specific conversions.
+
+    main methods for external use:
+
+    convert_to_eur(amount:float, currency:str, on_date:date=None) - on_date converts at historical rate
+
+    convert_columns_to_eur(amount_columns:list, currencies:list, dates:list=None) - batch conversion of whole run
+
+    finish_refresh() - waits for background refresh, alerts VBA if it failed or timed out. Call on every exit of run
+
+    Args:
+    ecb_url: (optional) ECB daily rates xml endpoint, can point to local stand-in (ecb_standin.py)
+    allow_network: (optional) False uses cached rates and history only (replays, simulations), no requests are made'''
+
+    def __init__(self, ecb_url:str=ECB_XML_URL, allow_network:bool=True):
+        self.ecb_url = ecb_url
+        self.allow_network = allow_network
         self.json_path = os.path.join(get_output_dir(client_file=False), RATES_JSON)
-        self.rates_file = self.__get_rates_file()
-        if self.__requires_update():
-            self.rates_file = self.__download_fresh_rates()
-        self.rates = self._get_rates()
-
-    def __get_rates_file(self):
-        '''returns fx data json file path'''
-        if os.path.exists(self.json_path):
-            self.prior_file = True
-            return self.json_path
-        else:
-            self.prior_file = False
-            logging.debug(f'No prior FX json file. Initializing...')
-            return self.__download_fresh_rates()
-
-    def __download_fresh_rates(self):
-        '''downloads fresh rates, writes to json, returs path of newly saved json file'''
-        logging.info(f'Updating FX rates json...')
-        rates = self.__get_new_rates_obj()
-        # handling case if older file exists, but new fails to download and __get_new_rates_obj returns {}
-        if rates:
-            logging.info(f'FX rates have been updated. Last update date: {rates["last_updated"]}')
-            return dump_to_json(rates, RATES_JSON)
-        else:
-            return self.json_path
+        self.refresh_thread = None
+        self.refresh_failed = False
+        # currencies with dates preceding rates history, warned about once
+        self.history_gaps = set()
+        with METRICS.span('fx rates load'):
+            self.history = FxHistory([currency for currency in SUPPORTED_CURRENCIES if currency != 'CDN'])
+            cached_rates = self.__read_cached_rates()
+            if cached_rates:
+                self.rates = cached_rates['currencies']
+                # in memory only: cached rates are covered by history even if it was never seeded / saved
+                self.history.add_daily_rates(cached_rates)
+                if self.allow_network and self.__requires_update(cached_rates):
+                    self.__start_background_refresh(cached_rates)
+            else:
+                self.rates = self.__download_initial_rates()['currencies']
 
-    def __get_new_rates_obj(self) -> dict:
-        '''returns new rates dictionary'''
+    def __read_cached_rates(self) -> dict:
+        '''returns rates dict from fx json file, {} if file is missing or unusable'''
+        if not os.path.exists(self.json_path):
+            logging.debug(f'No prior FX json file. Initializing...')
+            return {}
         try:
-            r = self.__get_request()
-            soup = self.__get_soup(r)
-            return self.__get_rates_from_soup(soup)
+            cached_rates = read_json_to_obj(self.json_path)
+            if cached_rates['last_updated'] and cached_rates['currencies']:
+                return cached_rates
         except Exception as e:
-            if self.prior_file:
-                logging.warning(f'Failed inside __get_new_rates. Alerting VBA about use of older FX rates. Err: {e}')
-                print(VBA_FOREX_ALERT)
-                return {}
-            else:
-                print(VBA_NO_FX_RATES)
-                logging.critical(f'Failed to initialize fx json file on initial run. Terminating immediately, VBA warned. Err: {e}')
-                sys.exit()
+            logging.warning(f'FX json file {self.json_path} is unusable, fresh rates required. Err: {e}')
+        return {}
 
-    def __get_request(self):
+    def __requires_update(self, cached_rates:dict) -> bool:
+        '''returns True if ECB should have published rates newer than cached ones (no polling on weekends, TARGET holidays
+        and before publication time)'''
         try:
-            r = requests.get(ECB_XML_URL, timeout=4)
-            if r.ok:
-                return r
-            else:
-                raise Exception(f'Something wrong with ECB XML. Response: {r}')
-        except TimeoutError as e:
-            logging.warning(f'Could not get ECB response for: {ECB_XML_URL} within 10 secods. Err: {e}. Returning None')
-            return None
+            return new_rates_expected(date.fromisoformat(cached_rates['last_updated']))
         except Exception as e:
-            logging.warning(f'Could not get response for: {ECB_XML_URL} Err: {e}. Returning None')
-            return None
-
-    def __get_soup(self, response:object) -> object:
-        '''returns BeautifulSoup object for parsing'''
-        return BeautifulSoup(response.text, 'lxml')
+            logging.warning(f'Failed to compare dates. ECB changed data format? Returning True. Err: {e}')
+            return True
 
-    def __get_rates_from_soup(self, soup:object) -> dict:
-        '''parses xml soup, returns rates as dict as:
+    def __start_background_refresh(self, cached_rates:dict):
+        '''starts daemon thread downloading and saving fresh rates for next run'''
+        logging.info(f'Serving cached FX rates, updating FX rates json in background...')
+        self.refresh_thread = threading.Thread(target=self.__refresh_rates, args=(cached_rates,), name='fx-refresh', daemon=True)
+        self.refresh_thread.start()
 
-        {'last_updated' : new_update_date,
-        'currencies' : {
-                USD: rate1,
-                CAD:rate2,
-                ...}}'''
-        xml_data = {}
+    def __refresh_rates(self, cached_rates:dict):
+        '''background thread target: conditionally downloads fresh rates, writes to json. Flags failure for finish_refresh'''
         try:
-            update_date = soup.cube.cube['time']
-            xml_data['last_updated'] = update_date
-            xml_data['currencies'] = {}
-
-            cubes = soup.findAll('cube', {'currency':SUPPORTED_CURRENCIES})
-            for cube in cubes:
-                currency = cube['currency']
-                rate = cube['rate']
-                xml_data['currencies'][currency] = float(rate)        
-            return xml_data
+            rates = self.__get_new_rates_obj(cached_rates)
+            if rates:
+                # separate history instance: conversions of current run keep reading unchanged self.history
+                self.__save_rates(rates, FxHistory(self.history.currencies))
+            else:
+                logging.info(f'ECB rates not modified since {cached_rates["last_updated"]}, cached rates kept')
         except Exception as e:
-            logging.warning(f'Failed to parse soup object. Likely changes in ECB XML structure. Returning None instead of dict. Err: {e}')
-            return None
-    
-    def __requires_update(self):
-        '''compares date in self.rates_file to today's date. If older than 2 days, returns True'''
+            self.refresh_failed = True
+            logging.warning(f'Background FX rates refresh failed. Cached rates remain in use. Err: {e}')
+
+    def __download_initial_rates(self) -> dict:
+        '''blocking download when no usable rates are cached. Raises NoFxRatesError on failure'''
         try:
-            json_data = read_json_to_obj(self.rates_file)
-            last_updated_raw = json_data['last_updated']
-            last_updated = datetime.strptime(last_updated_raw, '%Y-%m-%d')
-            today = datetime.today()
-            if (today - last_updated).days >= 2:
-                return True
-            else:
-                return False
+            if not self.allow_network:
+                raise ValueError('Network access not allowed')
+            rates = self.__get_new_rates_obj()
+            self.__save_rates(rates, self.history)
+            return rates
         except Exception as e:
-            print(VBA_FOREX_ALERT)
-            logging.warning(f'Failed to compare dates. ECB changed data format? Returning True. VBA Alerted. Err: {e}')
-            return True
+            logging.critical(f'Failed to initialize fx json file on initial run. Terminating immediately, VBA warned. Err: {e}')
+            raise NoFxRatesError(f'No cached fx rates, initial download failed. Err: {e}')
+
+    def __save_rates(self, rates:dict, history:FxHistory):
+        '''writes rates to fx json file, extends passed rates history and saves it'''
+        dump_to_json(rates, RATES_JSON)
+        history.add_daily_rates(rates)
+        history.save()
+        logging.info(f'FX rates have been updated. Last update date: {rates["last_updated"]}')
+
+    def __get_new_rates_obj(self, cached_rates:dict=None) -> dict:
+        '''returns new rates dictionary incl. response validators, None if xml was not modified since cached_rates.
+        Raises on failed request or parsing'''
+        r = self.__get_request(cached_rates if cached_rates else {})
+        if r.status_code == 304:
+            return None
+        rates = parse_ecb_daily_rates(r.content)
+        rates['etag'] = r.headers.get('ETag', '')
+        rates['last_modified'] = r.headers.get('Last-Modified', '')
+        return rates
+
+    def __get_request(self, cached_rates:dict):
+        '''returns ECB xml response, conditional on validators in cached_rates. Raises on timeout / bad response'''
+        headers = {}
+        if cached_rates.get('etag'):
+            headers['If-None-Match'] = cached_rates['etag']
+        if cached_rates.get('last_modified'):
+            headers['If-Modified-Since'] = cached_rates['last_modified']
+        r = requests.get(self.ecb_url, headers=headers, timeout=ECB_TIMEOUT)
+        if r.ok:
+            return r
+        else:
+            raise Exception(f'Something wrong with ECB XML. Response: {r}')
+
+    def finish_refresh(self, timeout:float=FX_REFRESH_JOIN_TIMEOUT):
+        '''waits up to timeout seconds for background refresh. Alerts VBA about use of older FX rates if refresh failed
+        or is still running after timeout'''
+        if self.refresh_thread is None:
+            return
+        self.refresh_thread.join(timeout)
+        if self.refresh_thread.is_alive():
+            logging.warning(f'Background FX rates refresh still running after {timeout} sec. Leaving it for next run, alerting VBA about use of older FX rates')
+            vba_alert(VBA_FOREX_ALERT)
+        elif self.refresh_failed:
+            logging.warning(f'Alerting VBA about use of older FX rates')
+            vba_alert(VBA_FOREX_ALERT)
 
-    def _get_rates(self):
-        '''returns rates dict'''
-        rates = read_json_to_obj(self.rates_file)
-        return rates['currencies']
-    
     def get_fx_rate(self, target_currency):
         '''returns fx rate for target currency'''
         if target_currency in SUPPORTED_CURRENCIES:
             return self.rates[target_currency]
         else:
             return None
-    
-    def convert_to_eur(self, amount:float, currency:str):
-        '''converts amount of currency to EUR, works w/ currencies in SUPPORTED_CURRENCIES
+
+    def get_rate_on_date(self, currency:str, on_date:date=None) -> float:
+        '''returns rate of supported currency published on on_date (or latest business day before it), latest cached rate
+        when on_date is not passed. Dates preceding rates history get its earliest (nearest) rate, logged once per currency.
+        Raises NoFxRatesError if currency has no rates at all'''
+        if not on_date:
+            return self.rates[currency]
+        historical_rate = self.history.get_rate(currency, on_date)
+        if historical_rate:
+            return historical_rate
+        first_date, first_rate = self.history.get_earliest_rate(currency)
+        if first_rate is None:
+            raise NoFxRatesError(f'No {currency} rates in fx json file and rates history')
+        if currency not in self.history_gaps:
+            self.history_gaps.add(currency)
+            logging.warning(f'{currency} rates history starts on {first_date}, earlier dates (e.g. {on_date}) are converted at its rate. '
+                            f'Add ECB history xml to \'{FX_HISTORY_DIR}\' folder for date specific rates')
+        return first_rate
+
+    def convert_to_eur(self, amount:float, currency:str, on_date:date=None):
+        '''converts amount of currency to EUR, works w/ currencies in SUPPORTED_CURRENCIES. Optional on_date converts
+        at rate of that date (see get_rate_on_date)
         NOTE: silently returns original amount for Amazon replacement orders (empty currency)'''
         currency = currency.upper()
         if currency == 'EUR' or currency == '':
             return amount
         elif currency in SUPPORTED_CURRENCIES:
             currency_adj = 'CAD' if currency == 'CDN' else currency
-            return round(amount / self.rates[currency_adj], 2)
+            return round(amount / self.get_rate_on_date(currency_adj, on_date), 2)
         else:
             logging.warning(f'Attempted currency conversion w/ unsupported currency: {currency}. Alerting VBA, returning original amount')
-            print(VBA_FOREX_ALERT)
+            vba_alert(VBA_FOREX_ALERT)
             return amount
 
+    def convert_columns_to_eur(self, amount_columns:list, currencies:list, dates:list=None) -> list:
+        '''batch version of convert_to_eur. Converts parallel amount columns (e.g. [totals, shipping prices]) of rows
+        with currencies column and optional dates column. Rows are grouped by (currency, date), rate is resolved once per group.
+        Returns list of converted columns in same order
+
+        NOTE: amounts are divided by rate (not multiplied by reciprocal) to keep convert_to_eur rounding exactly'''
+        METRICS.count('fx converted rows', len(currencies))
+        dates = dates if dates else [None] * len(currencies)
+        row_groups = {}
+        for row_idx, (currency, on_date) in enumerate(zip(currencies, dates)):
+            row_groups.setdefault((currency.upper(), on_date), []).append(row_idx)
+
+        converted_columns = [list(column) for column in amount_columns]
+        for (currency, on_date), row_idxs in row_groups.items():
+            if currency == 'EUR' or currency == '':
+                continue
+            elif currency in SUPPORTED_CURRENCIES:
+                currency_adj = 'CAD' if currency == 'CDN' else currency
+                rate = self.get_rate_on_date(currency_adj, on_date)
+                for column in converted_columns:
+                    for row_idx in row_idxs:
+                        column[row_idx] = round(column[row_idx] / rate, 2)
+            else:
+                logging.warning(f'Attempted currency conversion w/ unsupported currency: {currency} on {len(row_idxs)} rows. Alerting VBA, returning original amounts')
+                vba_alert(VBA_FOREX_ALERT)
+        return converted_columns
+
+
+def parse_ecb_daily_rates(xml_content:bytes) -> dict:
+    '''streams ECB daily xml, returns rates as dict:
+
+    {'last_updated' : new_update_date,
+    'currencies' : {
+            USD: rate1,
+            CAD:rate2,
+            ...}}
+
+    Parsing stops as soon as all supported currencies of first (latest) date are collected. Supported currencies missing
+    in xml are logged and left out. Raises ValueError if xml could not be parsed or holds no date / supported currencies'''
+    # CDN is an alias of CAD, not published by ECB
+    pending_currencies = set(SUPPORTED_CURRENCIES) - {'CDN'}
+    xml_data = {'last_updated': None, 'currencies': {}}
+    try:
+        for _, element in iterparse(BytesIO(xml_content), events=('start',)):
+            if not element.tag.endswith('Cube'):
+                continue
+            if 'time' in element.attrib:
+                if xml_data['last_updated']:
+                    # next date cube reached
+                    break
+                xml_data['last_updated'] = element.attrib['time']
+            currency = element.attrib.get('currency')
+            if currency in pending_currencies:
+                xml_data['currencies'][currency] = float(element.attrib['rate'])
+                pending_currencies.discard(currency)
+                if not pending_currencies:
+                    break
+    except Exception as e:
+        logging.warning(f'Failed to parse ECB xml. Likely changes in ECB XML structure. Err: {e}')
+        raise ValueError(f'Failed to parse ECB xml. Err: {e}') from e
+    if not xml_data['last_updated'] or not xml_data['currencies']:
+        logging.warning(f'No time attribute or supported currencies found in ECB xml cubes. Parsed: {xml_data}')
+        raise ValueError('No rates parsed from ECB XML')
+    if pending_currencies:
+        logging.warning(f'Supported currencies {sorted(pending_currencies)} missing in ECB xml of {xml_data["last_updated"]}')
+    return xml_data
+
 
 if __name__ == '__main__':
-    pass
\ No newline at end of file
+    pass
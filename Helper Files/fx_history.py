@@ -0,0 +1,143 @@
+from file_utils import get_output_dir, dump_to_json, read_json_to_obj
+from xml.etree.ElementTree import iterparse
+from bisect import bisect_right
+from datetime import date
+from array import array
+from io import BytesIO
+import logging
+import os
+
+
+# GLOBAL VARIABLES
+FX_HISTORY_JSON = 'fx_history.json'
+FX_HISTORY_DIR = 'fx history'
+
+
+class FxHistory():
+    '''local ECB reference rates history. Each currency is kept as pair of compact sorted arrays:
+    date ordinals (array 'l') and rates (array 'd'), looked up with bisect.
+
+    History is seeded from ECB history xml files (eurofxref-hist.xml, 90 day / daily xmls) placed in
+    'fx history' folder inside Helper Files and extended by each daily rates fetch (see Forex).
+    Seeded files are remembered by signature and parsed only once.
+
+    main methods:
+    get_rate(currency, on_date) - returns rate published on on_date or latest business day before it, None if not covered
+    get_earliest_rate(currency) - returns (first date, its rate) of currency history
+    add_daily_rates(rates) - merges daily rates dict ({'last_updated', 'currencies'}) into history
+    save() - writes history to fx_history.json
+
+    Args:
+    currencies: currencies to keep history of'''
+
+    def __init__(self, currencies:list):
+        self.currencies = currencies
+        self.json_path = os.path.join(get_output_dir(client_file=False), FX_HISTORY_JSON)
+        self.seeded_files = {}
+        self.series = {}
+        self.__load()
+        self.__seed_from_xml_files()
+
+    def __load(self):
+        '''reads history from json file, if present'''
+        if not os.path.exists(self.json_path):
+            return
+        try:
+            history = read_json_to_obj(self.json_path)
+            self.seeded_files = history['seeded_files']
+            for currency, (iso_dates, rates) in history['currencies'].items():
+                dates = array('l', (date.fromisoformat(iso_date).toordinal() for iso_date in iso_dates))
+                self.series[currency] = (dates, array('d', rates))
+        except Exception as e:
+            logging.warning(f'FX history file {self.json_path} is unusable, history will be rebuilt from xml files. Err: {e}')
+            self.seeded_files, self.series = {}, {}
+
+    def __seed_from_xml_files(self):
+        '''merges rates from new / changed ECB xml files in history folder, saves history if anything was merged'''
+        history_dir = os.path.join(get_output_dir(client_file=False), FX_HISTORY_DIR)
+        if not os.path.isdir(history_dir):
+            return
+        seeded_new = False
+        for fname in sorted(os.listdir(history_dir)):
+            if not fname.lower().endswith('.xml'):
+                continue
+            fpath = os.path.join(history_dir, fname)
+            stat = os.stat(fpath)
+            signature = [stat.st_mtime, stat.st_size]
+            if self.seeded_files.get(fname) == signature:
+                continue
+            try:
+                with open(fpath, 'rb') as f:
+                    dated_rates = dict(iter_ecb_rates(f.read(), self.currencies))
+                self.__merge(dated_rates)
+                self.seeded_files[fname] = signature
+                seeded_new = True
+                logging.info(f'FX history seeded from {fname}: {len(dated_rates)} dates')
+            except Exception as e:
+                logging.warning(f'Failed to seed FX history from {fpath}. Skipping file. Err: {e}')
+        if seeded_new:
+            self.save()
+
+    def __merge(self, dated_rates:dict):
+        '''merges {iso_date: {currency: rate}} into series. Rates of already known dates are overwritten'''
+        for currency in self.currencies:
+            new_rates = {date.fromisoformat(iso_date).toordinal(): rates[currency] for iso_date, rates in dated_rates.items() if currency in rates}
+            if not new_rates:
+                continue
+            dates, rates = self.series.get(currency, ([], []))
+            merged = dict(zip(dates, rates))
+            merged.update(new_rates)
+            sorted_dates = sorted(merged)
+            # replaced as single tuple, lookups never see dates and rates out of sync
+            self.series[currency] = (array('l', sorted_dates), array('d', (merged[ordinal] for ordinal in sorted_dates)))
+
+    def add_daily_rates(self, rates:dict):
+        '''merges daily rates dict {'last_updated': iso_date, 'currencies': {currency: rate}} into history'''
+        self.__merge({rates['last_updated']: rates['currencies']})
+
+    def save(self):
+        '''writes history to json file'''
+        currencies = {}
+        for currency, (dates, rates) in self.series.items():
+            currencies[currency] = [[date.fromordinal(ordinal).isoformat() for ordinal in dates], list(rates)]
+        dump_to_json({'seeded_files': self.seeded_files, 'currencies': currencies}, FX_HISTORY_JSON)
+
+    def get_rate(self, currency:str, on_date:date) -> float:
+        '''returns rate published on on_date or latest rate published before it (weekends, holidays).
+        Returns None if currency has no history or on_date precedes it'''
+        if currency not in self.series:
+            return None
+        dates, rates = self.series[currency]
+        idx = bisect_right(dates, on_date.toordinal())
+        return rates[idx - 1] if idx else None
+
+    def get_earliest_rate(self, currency:str) -> tuple:
+        '''returns (date, rate) of first rate in currency history, (None, None) if currency has no history'''
+        if currency not in self.series:
+            return None, None
+        dates, rates = self.series[currency]
+        return date.fromordinal(dates[0]), rates[0]
+
+
+def iter_ecb_rates(xml_content:bytes, currencies:list):
+    '''streams ECB rates xml (daily or history), yields (iso_date, {currency: rate}) for each date cube.
+    Only currencies in passed list are collected'''
+    currencies = set(currencies)
+    curr_date, curr_rates = None, {}
+    for event, element in iterparse(BytesIO(xml_content), events=('start', 'end')):
+        if not element.tag.endswith('Cube'):
+            continue
+        if event == 'start':
+            if 'time' in element.attrib:
+                curr_date, curr_rates = element.attrib['time'], {}
+            elif element.attrib.get('currency') in currencies and curr_date:
+                curr_rates[element.attrib['currency']] = float(element.attrib['rate'])
+        elif 'time' in element.attrib:
+            yield curr_date, curr_rates
+            curr_date = None
+            # drops parsed date cube, keeps memory flat on long history files
+            element.clear()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,213 @@
+from parser_constants import EXPECTED_SALES_CHANNELS
+from synthetic_data import SyntheticOrdersGenerator, HELPER_FILES_DIR
+from database import DATABASE_NAME
+from file_utils import HELPER_DIR_ENV_VAR, read_json_to_obj
+from forex import RATES_JSON
+from benchmark import NO_NETWORK_PROXY
+from sqlalchemy import create_engine, inspect, text
+from datetime import date
+import subprocess
+import tempfile
+import tarfile
+import openpyxl
+import logging
+import shutil
+import glob
+import sys
+import json
+import io
+import os
+import re
+
+
+# GLOBAL VARIABLES
+GOLDEN_SEED = 7
+GOLDEN_ORDERS_COUNT = 2000
+# run date stamps in output file names: 'AmazonEU-DPost 2022.10.01 14.35.csv'
+FNAME_DATE_STAMP = re.compile(r' \d{4}\.\d{2}\.\d{2} \d{2}\.\d{2}')
+# outputs compared: client files one level above Helper Files, LP csvs inside it
+COMPARED_OUTPUT_PATTERNS = ['*.csv', '*.xlsx', '*.txt', os.path.join(HELPER_FILES_DIR, '*.csv')]
+# db columns of program run differ by run (backup path, time)
+COMPARED_RUN_COLUMNS = ['sales_channel']
+# seeded random (engineer_total), no os.startfile outside Windows (older revisions call it directly)
+RUNNER_CODE = '''import random, runpy, sys, os
+random.seed(int(sys.argv[1]))
+os.startfile = lambda path: None
+sys.argv = ['main.py'] + sys.argv[2:]
+runpy.run_path('main.py', run_name='__main__')'''
+
+
+class GoldenOutputCheck():
+    '''byte for byte / cell for cell comparison of reference code (git revision, default HEAD) and current working tree
+    on same synthetic inputs (synthetic_data.py). Each side runs in its own workspace in separate process, code copied
+    to workspace Helper Files (works for revisions before ORDERS_PARSER_HELPER_DIR existed), random seeded for
+    engineer_total. Compared: DPost / LP csvs, Etonas / NLPost / DPDUPS xlsx cell values and fills, same buyer /
+    replacement / unmapped skus txt files, orders db rows and stdout tokens for VBA.
+
+    main methods:
+    run() - returns {sales channel: [differences]}, empty lists if outputs are identical
+
+    Args:
+    reference_rev: (optional) git revision of reference code, defaults to HEAD
+    sales_channels: (optional) list, defaults to all expected sales channels
+    orders_count: (optional) int
+    seed: (optional) int, seeds both input generation and runs'''
+
+    def __init__(self, reference_rev:str='HEAD', sales_channels:list=None, orders_count:int=GOLDEN_ORDERS_COUNT, seed:int=GOLDEN_SEED):
+        self.reference_rev = reference_rev
+        self.sales_channels = sales_channels if sales_channels else EXPECTED_SALES_CHANNELS
+        self.orders_count = orders_count
+        self.seed = seed
+        self.current_code_dir = os.path.dirname(os.path.abspath(__file__))
+
+    def run(self) -> dict:
+        work_dir = tempfile.mkdtemp(prefix='parser golden ')
+        try:
+            reference_code_dir = self.__export_reference_code(work_dir)
+            results = {}
+            for sales_channel in self.sales_channels:
+                channel_dir = os.path.join(work_dir, sales_channel)
+                inputs_dir = self.__create_inputs(channel_dir, sales_channel)
+                reference_dir = self.__run_side(inputs_dir, reference_code_dir, os.path.join(channel_dir, 'reference'), sales_channel)
+                current_dir = self.__run_side(inputs_dir, self.current_code_dir, os.path.join(channel_dir, 'current'), sales_channel)
+                results[sales_channel] = self.compare_workspaces(reference_dir, current_dir)
+                logging.info(f'Golden check {sales_channel}: {len(results[sales_channel])} differences vs {self.reference_rev}')
+            return results
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def __export_reference_code(self, work_dir:str) -> str:
+        '''extracts Helper Files of reference revision via git archive, returns its path'''
+        repo_root = subprocess.run(['git', 'rev-parse', '--show-toplevel'], cwd=self.current_code_dir,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        archive = subprocess.run(['git', 'archive', '--format=tar', self.reference_rev, HELPER_FILES_DIR], cwd=repo_root,
+                                capture_output=True, check=True).stdout
+        reference_root = os.path.join(work_dir, 'reference code')
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+            tar.extractall(reference_root)
+        return os.path.join(reference_root, HELPER_FILES_DIR)
+
+    def __create_inputs(self, channel_dir:str, sales_channel:str) -> str:
+        '''writes orders export and reference workbooks once, both sides get copies'''
+        inputs_dir = os.path.join(channel_dir, 'inputs')
+        os.makedirs(os.path.join(inputs_dir, HELPER_FILES_DIR))
+        generator = SyntheticOrdersGenerator(sales_channel, self.orders_count, self.seed)
+        generator.export_reference_workbooks(os.path.join(inputs_dir, HELPER_FILES_DIR))
+        generator.export_orders(os.path.join(inputs_dir, 'orders export.txt'))
+        # rates dated today: no background ECB refresh on either side (its failure alert would depend on time of run)
+        rates_path = os.path.join(inputs_dir, HELPER_FILES_DIR, RATES_JSON)
+        rates = read_json_to_obj(rates_path)
+        rates['last_updated'] = date.today().isoformat()
+        with open(rates_path, 'w', encoding='utf-8') as f:
+            json.dump(rates, f, indent=4)
+        return inputs_dir
+
+    def __run_side(self, inputs_dir:str, code_dir:str, workspace_dir:str, sales_channel:str) -> str:
+        '''copies inputs and code to workspace, runs parser there. Returns workspace path, stdout saved in it'''
+        shutil.copytree(inputs_dir, workspace_dir)
+        helper_dir = os.path.join(workspace_dir, HELPER_FILES_DIR)
+        for code_path in glob.glob(os.path.join(code_dir, '*.py')):
+            shutil.copy(code_path, helper_dir)
+        source_fpath = os.path.join(workspace_dir, 'orders export.txt')
+        env = {key: value for key, value in os.environ.items() if key != HELPER_DIR_ENV_VAR}
+        env.update({'HTTP_PROXY': NO_NETWORK_PROXY, 'HTTPS_PROXY': NO_NETWORK_PROXY})
+        completed = subprocess.run([sys.executable, '-c', RUNNER_CODE, str(self.seed), source_fpath, sales_channel, 'False'],
+                                cwd=helper_dir, env=env, capture_output=True, text=True, encoding='utf-8')
+        with open(os.path.join(workspace_dir, 'stdout.txt'), 'w', encoding='utf-8') as f:
+            f.write(completed.stdout)
+        if completed.returncode != 0:
+            logging.warning(f'Golden check run in {workspace_dir} exited with {completed.returncode}. stderr: {completed.stderr[-2000:]}')
+        return workspace_dir
+
+    @classmethod
+    def compare_workspaces(cls, reference_dir:str, current_dir:str) -> list:
+        '''returns list of differences between outputs of two runs'''
+        differences = cls.__compare_lines('stdout', os.path.join(reference_dir, 'stdout.txt'), os.path.join(current_dir, 'stdout.txt'))
+        reference_outputs, current_outputs = cls.__get_outputs(reference_dir), cls.__get_outputs(current_dir)
+        for output_name in sorted(set(reference_outputs) | set(current_outputs)):
+            if output_name not in current_outputs or output_name not in reference_outputs:
+                differences.append(f'{output_name}: {"missing" if output_name not in current_outputs else "not in reference"}')
+            elif output_name.endswith('.xlsx'):
+                differences.extend(cls.__compare_xlsx(output_name, reference_outputs[output_name], current_outputs[output_name]))
+            else:
+                differences.extend(cls.__compare_lines(output_name, reference_outputs[output_name], current_outputs[output_name]))
+        differences.extend(cls.__compare_db(os.path.join(reference_dir, HELPER_FILES_DIR, DATABASE_NAME),
+                                            os.path.join(current_dir, HELPER_FILES_DIR, DATABASE_NAME)))
+        return differences
+
+    @staticmethod
+    def __get_outputs(workspace_dir:str) -> dict:
+        '''returns {output name without run date stamp: path}. Source orders export and stdout are not outputs'''
+        outputs = {}
+        for pattern in COMPARED_OUTPUT_PATTERNS:
+            for output_path in glob.glob(os.path.join(workspace_dir, pattern)):
+                output_name = os.path.relpath(output_path, workspace_dir)
+                if output_name not in ['orders export.txt', 'stdout.txt']:
+                    outputs[FNAME_DATE_STAMP.sub('', output_name)] = output_path
+        return outputs
+
+    @staticmethod
+    def __compare_lines(output_name:str, reference_path:str, current_path:str) -> list:
+        '''byte comparison, first differing line reported'''
+        with open(reference_path, 'rb') as f_reference, open(current_path, 'rb') as f_current:
+            reference_lines, current_lines = f_reference.read().splitlines(), f_current.read().splitlines()
+        if reference_lines == current_lines:
+            return []
+        for line_idx, (reference_line, current_line) in enumerate(zip(reference_lines, current_lines), start=1):
+            if reference_line != current_line:
+                return [f'{output_name} line {line_idx}: {reference_line!r} != {current_line!r}']
+        return [f'{output_name}: {len(reference_lines)} lines in reference, {len(current_lines)} in current']
+
+    @staticmethod
+    def __compare_xlsx(output_name:str, reference_path:str, current_path:str) -> list:
+        '''cell values and fills of all sheets. Up to 5 differences per file reported'''
+        reference_wb, current_wb = openpyxl.load_workbook(reference_path), openpyxl.load_workbook(current_path)
+        if reference_wb.sheetnames != current_wb.sheetnames:
+            return [f'{output_name} sheets: {reference_wb.sheetnames} != {current_wb.sheetnames}']
+        differences = []
+        for ws_name in reference_wb.sheetnames:
+            reference_ws, current_ws = reference_wb[ws_name], current_wb[ws_name]
+            if (reference_ws.max_row, reference_ws.max_column) != (current_ws.max_row, current_ws.max_column):
+                differences.append(f'{output_name} [{ws_name}] size: {reference_ws.dimensions} != {current_ws.dimensions}')
+                continue
+            for reference_row, current_row in zip(reference_ws.iter_rows(), current_ws.iter_rows()):
+                for reference_cell, current_cell in zip(reference_row, current_row):
+                    reference_fill = (reference_cell.fill.fill_type, reference_cell.fill.fgColor.rgb)
+                    current_fill = (current_cell.fill.fill_type, current_cell.fill.fgColor.rgb)
+                    if reference_cell.value != current_cell.value or reference_fill != current_fill:
+                        differences.append(f'{output_name} [{ws_name}] {reference_cell.coordinate}: '
+                                        f'{reference_cell.value!r} {reference_fill} != {current_cell.value!r} {current_fill}')
+        return differences[:5]
+
+    @staticmethod
+    def __compare_db(reference_db_path:str, current_db_path:str) -> list:
+        '''orders (columns present in both databases) and runs sales channels'''
+        differences = []
+        reference_engine, current_engine = create_engine(f'sqlite:///{reference_db_path}'), create_engine(f'sqlite:///{current_db_path}')
+        order_columns = sorted(set(column['name'] for column in inspect(reference_engine).get_columns('order'))
+                            & set(column['name'] for column in inspect(current_engine).get_columns('order')) - {'run', 'id'})
+        for table_name, columns in [('order', order_columns), ('program_run', COMPARED_RUN_COLUMNS)]:
+            query = text(f'SELECT {", ".join(columns)} FROM "{table_name}" ORDER BY {", ".join(columns)}')
+            with reference_engine.connect() as reference_conn, current_engine.connect() as current_conn:
+                reference_rows, current_rows = reference_conn.execute(query).fetchall(), current_conn.execute(query).fetchall()
+            if reference_rows != current_rows:
+                differing_rows = set(reference_rows) ^ set(current_rows)
+                differences.append(f'db {table_name}: {len(reference_rows)} rows in reference, {len(current_rows)} in current, '
+                                f'{len(differing_rows)} differing, e.g.: {sorted(differing_rows, key=str)[:3]}')
+        reference_engine.dispose()
+        current_engine.dispose()
+        return differences
+
+
+if __name__ == '__main__':
+    # usage: python golden_check.py [reference git revision, default HEAD] [sales channels, e.g. AmazonEU,Etsy] [orders count]
+    # exits with 1 if outputs of current code differ from reference
+    check = GoldenOutputCheck(sys.argv[1] if len(sys.argv) > 1 else 'HEAD',
+                            sys.argv[2].split(',') if len(sys.argv) > 2 else None,
+                            int(sys.argv[3]) if len(sys.argv) > 3 else GOLDEN_ORDERS_COUNT)
+    check_results = check.run()
+    for channel, channel_differences in check_results.items():
+        print(f'{channel}: {"identical outputs" if not channel_differences else f"{len(channel_differences)} differences"}')
+        for difference in channel_differences:
+            print(f'\t{difference}')
+    sys.exit(1 if any(check_results.values()) else 0)
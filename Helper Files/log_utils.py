@@ -0,0 +1,57 @@
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from multiprocessing import parent_process
+import logging
+import atexit
+import shutil
+import queue
+import gzip
+import os
+
+
+# GLOBAL VARIABLES
+LOG_FNAME = 'loading_orders.log'
+LOG_MAX_BYTES = 5 * 1024 * 1024
+# rotated logs kept as gzip archives: loading_orders.log.1.gz ... loading_orders.log.5.gz
+LOG_BACKUP_COUNT = 5
+
+
+def gzip_namer(default_name:str) -> str:
+    '''rotated log file name: loading_orders.log.1 -> loading_orders.log.1.gz'''
+    return f'{default_name}.gz'
+
+def gzip_rotator(source:str, dest:str):
+    '''compresses full log file into archive, removes it (new log file is opened by handler)'''
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+def setup_logging(log_path:str, level:int=logging.INFO) -> QueueListener:
+    '''configures root logger: records are put on queue by logging thread, written to size rotated log file
+    (gzip archived backups) by listener thread. Returns started listener (stopped, queue flushed at exit).
+    No-op in spawned worker processes re-importing main module (returns None): workers are configured by
+    setup_worker_logging, rotation stays with parent process only'''
+    if parent_process() is not None:
+        return None
+    file_handler = RotatingFileHandler(log_path, 'a', maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    file_handler.namer = gzip_namer
+    file_handler.rotator = gzip_rotator
+    file_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    # message only: record is formatted once more, by file handler in listener thread
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    logging.basicConfig(handlers=[queue_handler], level=level)
+    listener = QueueListener(log_queue, file_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+def setup_worker_logging(level:int):
+    '''export worker process initializer (export_scheduler.py): sets root logger level passed by parent process.
+    Worker records are captured by export job and replayed by parent, which writes them to its own handlers.
+    Explicit, so workers keep INFO lines when parser is used as library (pipeline.py) and main.py is not re-imported'''
+    logging.getLogger().setLevel(level)
+
+
+if __name__ == '__main__':
+    pass
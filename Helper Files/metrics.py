@@ -0,0 +1,86 @@
+from file_utils import get_output_dir, delete_oldest_files, RUN_METRICS_MAX_AGE_DAYS
+from contextlib import contextmanager
+from datetime import datetime
+import threading
+import logging
+import time
+import json
+import os
+
+
+# GLOBAL VARIABLES
+RUN_METRICS_DIR = 'run metrics'
+
+
+class RunMetrics():
+    '''lightweight per run metrics: timing spans (wall and CPU time of stage) and counters. Spans opened inside another
+    span (same thread) are named by path: 'enrichment/pricing'. Thread safe, one process wide instance: METRICS.
+
+    main methods:
+    span(name) - context manager timing block
+    add_span(name, wall_sec, cpu_sec) - records span measured elsewhere (e.g. in worker process)
+    count(name, increment=1) - increments counter
+    reset() - starts new run: clears spans and counters (several runs in one process, see pipeline.py)
+    write(sales_channel) - writes metrics to log and to per run json file in 'run metrics' folder inside Helper Files
+    (files older than RUN_METRICS_MAX_AGE_DAYS are deleted)'''
+
+    def __init__(self):
+        self.started_at = datetime.now()
+        self.spans = []
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def reset(self):
+        with self.lock:
+            self.started_at = datetime.now()
+            self.spans = []
+            self.counters = {}
+
+    @contextmanager
+    def span(self, name:str):
+        '''times block: wall time (perf_counter) and CPU time of current thread'''
+        stack = self.local.__dict__.setdefault('stack', [])
+        stack.append(name)
+        path = '/'.join(stack)
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            stack.pop()
+            self.add_span(path, time.perf_counter() - wall_start, time.thread_time() - cpu_start)
+
+    def add_span(self, name:str, wall_sec:float, cpu_sec:float):
+        with self.lock:
+            self.spans.append({'name': name, 'wall_sec': round(wall_sec, 4), 'cpu_sec': round(cpu_sec, 4)})
+
+    def count(self, name:str, increment:int=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + increment
+
+    def write(self, sales_channel:str) -> str:
+        '''logs spans and counters, dumps them to json file. Returns json path, None if it could not be written'''
+        logging.info(f'Run metrics (wall sec / cpu sec):')
+        for span in self.spans:
+            logging.info(f'\t{span["name"]}: {span["wall_sec"]:.3f} / {span["cpu_sec"]:.3f}')
+        for name, value in self.counters.items():
+            logging.info(f'\t{name}: {value}')
+        metrics_dir = os.path.join(get_output_dir(client_file=False), RUN_METRICS_DIR)
+        json_path = os.path.join(metrics_dir, f'{sales_channel} {self.started_at.strftime("%Y.%m.%d %H.%M.%S")}.json')
+        try:
+            os.makedirs(metrics_dir, exist_ok=True)
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump({'sales_channel': sales_channel, 'started_at': self.started_at.isoformat(timespec='seconds'),
+                        'spans': self.spans, 'counters': self.counters}, f, indent=4)
+            delete_oldest_files(metrics_dir, max_age_days=RUN_METRICS_MAX_AGE_DAYS)
+            return json_path
+        except Exception as e:
+            logging.warning(f'Failed to write run metrics to {json_path}. Err: {e}')
+            return None
+
+
+METRICS = RunMetrics()
+
+
+if __name__ == '__main__':
+    pass
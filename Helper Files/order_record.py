@@ -0,0 +1,137 @@
+from parser_constants import AMAZON_KEYS, ETSY_KEYS, DPOST_HEADERS_MAPPING, LP_HEADERS_MAPPING, NLPOST_HEADERS_MAPPING
+from parser_constants import ETONAS_HEADERS_MAPPING, DPDUPS_HEADERS_MAPPING
+from errors import SourceHeadersError
+from operator import itemgetter
+import logging
+import csv
+import sys
+
+
+# GLOBAL VARIABLES
+# fields added to orders during processing (weights.py), not based on proxy keys
+ENRICHMENT_FIELDS = ['tracked', 'skip_service_selection', 'shipping_service', 'total_eur', 'shipping_eur', 'total_engineered']
+# internal order keys read directly by pipeline code: enrichment, routing rules (ship-service-level, sales-channel),
+# same buyer detection, database, export computed fields. Keys read by carrier files only come from EXPORT_MAPPINGS
+PIPELINE_KEYS = ['order-id', 'secondary-order-id', 'same-buyer-order-id', 'purchase-date', 'buyer-name', 'buyer-fname', 'buyer-lname',
+                 'buyer-phone-number', 'sku', 'title', 'quantity-purchased', 'currency', 'item-price', 'discount', 'shipping-price',
+                 'recipient-name', 'ship-address-1', 'ship-address-2', 'ship-address-3', 'ship-postal-code', 'ship-country',
+                 'ship-service-level', 'sales-channel', 'weight', 'category', 'brand', 'vmdoption']
+# carrier files {header: internal order key} mappings of export_engine.CARRIER_TEMPLATES
+EXPORT_MAPPINGS = [DPOST_HEADERS_MAPPING, LP_HEADERS_MAPPING, NLPOST_HEADERS_MAPPING, ETONAS_HEADERS_MAPPING, DPDUPS_HEADERS_MAPPING]
+# low cardinality values repeated across orders: single (interned) str object per distinct value
+INTERNED_KEYS = ['currency', 'ship-country', 'sales-channel', 'ship-service-level']
+# proxy keys read strictly downstream: missing source column terminates run at ingest. Other columns are optional ('' if missing)
+REQUIRED_KEYS = {
+    'Amazon': ['order-id', 'secondary-order-id', 'purchase-date', 'buyer-name', 'buyer-phone-number', 'sku', 'title', 'quantity-purchased',
+               'currency', 'item-price', 'shipping-price', 'recipient-name', 'ship-address-1', 'ship-address-2', 'ship-address-3', 'ship-country'],
+    'Etsy': ['order-id', 'purchase-date', 'buyer-name', 'buyer-fname', 'buyer-lname', 'sku', 'quantity-purchased', 'currency',
+             'item-price', 'discount', 'shipping-price', 'recipient-name', 'ship-address-1', 'ship-address-2', 'ship-country'],
+}
+
+
+def get_field_name(proxy_key:str) -> str:
+    '''returns order record field name of internal (proxy) order key: 'ship-address-1' -> 'ship_address_1' '''
+    return proxy_key.replace('-', '_').lower()
+
+
+def get_used_keys() -> list:
+    '''returns internal order keys read downstream, each once: PIPELINE_KEYS followed by keys in EXPORT_MAPPINGS.
+    Other source columns (payments, taxes, fees, delivery window...) are dropped at ingest'''
+    mapped_keys = [order_key for mapping in EXPORT_MAPPINGS for order_key in mapping.values()]
+    return list(dict.fromkeys(PIPELINE_KEYS + mapped_keys))
+
+
+# projected (used) internal order keys followed by enrichment fields, each once
+RECORD_FIELDS = list(dict.fromkeys([get_field_name(order_key) for order_key in get_used_keys()] + ENRICHMENT_FIELDS))
+INTERNED_FIELDS = [get_field_name(order_key) for order_key in INTERNED_KEYS]
+
+
+class OrderRecord():
+    '''single order in canonical form: one slot per internal order key read downstream (proxy key, see get_field_name,
+    get_used_keys) and enrichment field, same for all sales channels. Fields channel has no column for are ''. No per order
+    dict: values are kept in slots, read / written as attributes (order.ship_country)
+
+    main methods:
+    update(fields) - sets fields from {field: value} dict
+    to_dict() - returns {field: value} (json dumps, logging)
+
+    Args:
+    values: field values in RECORD_FIELDS order'''
+    __slots__ = RECORD_FIELDS
+
+    def __init__(self, values:list):
+        for field, value in zip(RECORD_FIELDS, values):
+            setattr(self, field, value)
+
+    def update(self, fields:dict):
+        for field, value in fields.items():
+            setattr(self, field, value)
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in RECORD_FIELDS}
+
+    def __repr__(self) -> str:
+        return f'OrderRecord({self.to_dict()})'
+
+
+class OrderAdapter():
+    '''reads sales channel source file into OrderRecord list. Channel proxy keys (parser_constants.AMAZON_KEYS / ETSY_KEYS)
+    are resolved once per file into column indexes, each csv row is then mapped to record fields in single pass.
+    Only columns of record fields are kept (column projection), INTERNED_KEYS values are interned.
+    Missing or short row values are treated as by csv.DictReader (None), blank lines are skipped.
+
+    main method:
+    read_records(source_file) - returns list of OrderRecord. Raises SourceHeadersError if required columns are missing
+
+    Args:
+    sales_channel: str'''
+
+    def __init__(self, sales_channel:str):
+        self.sales_channel = sales_channel
+        self.channel = 'Etsy' if sales_channel == 'Etsy' else 'Amazon'
+        self.proxy_keys = ETSY_KEYS if sales_channel == 'Etsy' else AMAZON_KEYS
+        self.delimiter = ',' if sales_channel == 'Etsy' else '\t'
+
+    def read_records(self, source_file:str) -> list:
+        with open(source_file, 'r', encoding='utf-8') as f:
+            reader = csv.reader(f, delimiter=self.delimiter)
+            header = next(reader, [])
+            get_values = self.__get_values_getter(header)
+            records = [OrderRecord(get_values(row)) for row in reader if row]
+        if records:
+            self.__validate_header(header)
+        logging.debug(f'Read {len(records)} {self.sales_channel} orders')
+        return records
+
+    def __get_values_getter(self, header:list):
+        '''returns function returning record field values of csv row. Fields without source column point to
+        '' appended to each row (index: len(header))'''
+        header_len = len(header)
+        column_idxs = {column: idx for idx, column in enumerate(header)}
+        field_columns = {get_field_name(proxy_key): column for proxy_key, column in self.proxy_keys.items()}
+        field_idxs = [column_idxs.get(field_columns.get(field), header_len) for field in RECORD_FIELDS]
+        getter = itemgetter(*field_idxs)
+        logging.debug(f'{self.sales_channel} source columns kept at ingest: {len(set(field_idxs) - {header_len})} of {header_len}')
+        interned_idxs = [idx for idx, field in enumerate(RECORD_FIELDS) if field in INTERNED_FIELDS]
+
+        def get_values(row:list) -> list:
+            if len(row) != header_len:
+                # short rows padded with None, extra values dropped (as restval / restkey in DictReader)
+                row = row[:header_len] + [None] * (header_len - len(row))
+            row.append('')
+            values = list(getter(row))
+            for idx in interned_idxs:
+                if values[idx]:
+                    values[idx] = sys.intern(values[idx])
+            return values
+        return get_values
+
+    def __validate_header(self, header:list):
+        missing_columns = [self.proxy_keys[key] for key in REQUIRED_KEYS[self.channel] if self.proxy_keys[key] not in header]
+        if missing_columns:
+            logging.critical(f'Loaded {self.sales_channel} orders have no required columns: {missing_columns}. Source headers: {header}')
+            raise SourceHeadersError(f'No columns {missing_columns} in loaded {self.sales_channel} orders')
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,61 @@
+from contextvars import ContextVar
+from contextlib import contextmanager
+import logging
+
+
+# GLOBAL VARIABLES
+CAPTURED_OUTPUT = ContextVar('captured_output', default=None)
+
+
+class CapturedOutput():
+    '''VBA alert tokens and log lines of a job running concurrently with others. Collected instead of being
+    printed / logged immediately, replayed by caller in fixed job order - output does not depend on scheduling.
+    Also collects alerts of whole run for pipeline.process_orders (capture_logs=False). Picklable, can be returned from worker process.
+
+    main methods:
+    replay() - passes collected alerts to vba_alert (printed or collected by outer capture), collected log lines to logging'''
+
+    def __init__(self, capture_logs:bool=True):
+        self.capture_logs = capture_logs
+        self.alerts = []
+        self.log_records = []
+
+    def replay(self):
+        for level, message in self.log_records:
+            logging.log(level, message)
+        for alert in self.alerts:
+            vba_alert(alert)
+
+
+def vba_alert(alert:str):
+    '''prints alert token for VBA. Collected instead when called inside capture_output block'''
+    captured = CAPTURED_OUTPUT.get()
+    if captured is None:
+        print(alert)
+    else:
+        captured.alerts.append(alert)
+
+def _capture_log_record(record:logging.LogRecord) -> bool:
+    '''root logger filter: collects records logged inside capture_output block, lets others through'''
+    captured = CAPTURED_OUTPUT.get()
+    if captured is None or not captured.capture_logs:
+        return True
+    captured.log_records.append((record.levelno, record.getMessage()))
+    return False
+
+@contextmanager
+def capture_output(capture_logs:bool=True):
+    '''collects vba_alert tokens and (capture_logs) root logger records of current thread (context) into yielded CapturedOutput'''
+    root_logger = logging.getLogger()
+    if _capture_log_record not in root_logger.filters:
+        root_logger.addFilter(_capture_log_record)
+    captured = CapturedOutput(capture_logs)
+    token = CAPTURED_OUTPUT.set(captured)
+    try:
+        yield captured
+    finally:
+        CAPTURED_OUTPUT.reset(token)
+
+
+if __name__ == '__main__':
+    pass
@@ -1,42 +1,34 @@
-from parser_utils import get_dpost_product_header_val, get_origin_country, shorten_word_sequence, enter_LP_address
-from parser_utils import get_lp_priority, get_LP_siuntos_rusis_header, get_hs_code
-from file_utils import get_output_dir, delete_file, export_as_textfile
-from xlsx_exporter import EtonasExporter, NLPostExporter, DPDUPSExporter
-from parser_constants import EXPORT_CONSTANTS
-from countries import EU_COUNTRY_CODES
+from file_utils import get_output_dir, delete_file, export_as_textfile, open_for_client
+from export_scheduler import ExportScheduler
+from output_capture import vba_alert
+from routing_rules import RuleTable, SERVICE_RULES
+from same_buyer import SameBuyerDetector, get_buyer_key
+from metrics import METRICS
+from errors import ExportStageError
 from datetime import datetime
 import logging
-import csv
-import sys
 import os
 
 
 # GLOBAL VARIABLES
-VBA_ERROR_ALERT = 'ERROR_CALL_DADDY'
-VBA_NO_NEW_JOB = 'NO NEW JOB'
-VBA_KEYERROR_ALERT = 'ERROR_IN_SOURCE_HEADERS'
-VBA_DPOST_CHARLIMIT_ALERT = 'DPOST_CHARLIMIT_WARNING'
 VBA_REPLACEMENT_ALERT = 'REPLACEMENT ORDER PRESENT'
-DPOST_NAME_CHARLIMIT = 30
-DPOST_ADDRESS_CHARLIMIT = 40
 
 
 class ParseOrders():
-    '''Input: orders as list of dicts, outputs csv, xlsx files based on shipment method
+    '''Input: orders as list of OrderRecord (order_record.py), outputs csv, xlsx files based on shipment method
 
     Args:
-    -orders - list of order dicts
+    -orders - list of OrderRecord
     -db_client - object
-    -proxy_keys = dict. Maps internal order keys (based on amazon) to external order headers(keys)
     -sales_channel - str ('AmazonEU'/'AmazonCOM'/'Etsy')
     
     export_orders(testing=False) : main method, sorts orders by shipment company, if testing flag is False,
-    exports files with appropriate orders data and adds all passed orders when creating class to database'''
+    exports files with appropriate orders data and, once all exports succeeded, adds all passed orders when creating class to database.
+    Returns False if no orders were routed (nothing exported). Exported files are collected in output_paths, routed orders counts - in service_counts'''
     
-    def __init__(self, all_orders:list, db_client:object, proxy_keys:dict, sales_channel:str):
+    def __init__(self, all_orders:list, db_client:object, sales_channel:str):
         self.all_orders = all_orders
         self.db_client = db_client
-        self.proxy_keys = proxy_keys
         self.sales_channel = sales_channel
         self.dpost_orders = []
         self.lp_orders = []
@@ -44,6 +36,10 @@ class ParseOrders():
         self.etonas_orders = []
         self.nlpost_orders = []
         self.dpdups_orders = []
+        self.repeat_buyers = {}
+        self.output_paths = {}
+        self.service_counts = {}
+        self.added_to_db_count = 0
 
     def export_txt_files(self):
         self.export_same_buyer_details()
@@ -51,34 +47,54 @@ class ParseOrders():
             self.export_replacement_orders()
 
     def export_same_buyer_details(self):
-        '''exports orders data made by same person'''
+        '''exports orders data made by same person in this batch, incl. buyers who ordered in earlier runs (self.repeat_buyers)'''
         same_buyer_orders = self.get_same_buyer_orders()
+        earlier_orders = self._add_repeat_buyer_orders(same_buyer_orders)
         if not same_buyer_orders:
-            logging.info(f'No orders by same person in this batch. Skipping export to txt')
+            logging.info(f'No orders by same person in this batch or recent runs. Skipping export to txt')
             return
         with open(self.same_buyers_filename, 'w', encoding='utf-8') as f:
             f.write('Buyer\t\tOrder Number\t\t\tShipping Address(1-2)')
             for recipient_name in same_buyer_orders:
                 f.write(f'\n\n{recipient_name}')
                 for order in same_buyer_orders[recipient_name]:
-                    f.write(f"\n\t\t{order[self.proxy_keys['same-buyer-order-id']]}\t\t{order[self.proxy_keys['ship-address-1']]} {order[self.proxy_keys['ship-address-2']]}")
+                    f.write(f"\n\t\t{order.same_buyer_order_id}\t\t{order.ship_address_1} {order.ship_address_2}")
+                for order_id, _, sales_channel, run_timestamp in earlier_orders.get(recipient_name, []):
+                    f.write(f"\n\t\t{order_id}\t\tEARLIER ORDER: {sales_channel} run on {run_timestamp.strftime('%Y.%m.%d %H.%M')}")
         logging.info(f'Same Buyer Orders have been written to {self.same_buyers_filename} and being showed to client')
-        os.startfile(self.same_buyers_filename)
-
-    def get_same_buyer_orders(self):
-        '''step1: collects {recipient-name: [{order1}, {order2}]} structure; step2: removes single orders'''
-        recipient_name_keys_orders = {}
+        self.output_paths['same buyer'] = self.same_buyers_filename
+        open_for_client(self.same_buyers_filename)
+
+    def get_same_buyer_orders(self) -> dict:
+        '''returns {recipient name: [order1, order2]} of orders made by same person (fuzzy name, address, phone matching
+        in same_buyer.py), single orders excluded'''
+        return SameBuyerDetector().get_same_buyer_orders(self.all_orders)
+
+    def _add_repeat_buyer_orders(self, same_buyer_orders:dict) -> dict:
+        '''returns {recipient name: [earlier order tuples]} for buyers found in self.repeat_buyers. Single orders of
+        repeat buyers are added to same_buyer_orders as groups of their own (mutates passed dict)'''
+        earlier_orders = {}
+        grouped_order_ids = {id(order) for group in same_buyer_orders.values() for order in group}
+        for recipient_name, group in list(same_buyer_orders.items()):
+            earlier_orders[recipient_name] = self.__get_earlier_orders(group)
         for order in self.all_orders:
-            # If name is in same_buyers_orders keys, append order dict as list item, else, add order dict as list
-            if order[self.proxy_keys['recipient-name']] in recipient_name_keys_orders:
-                recipient_name_keys_orders[order[self.proxy_keys['recipient-name']]].append(order)
-            else:
-                recipient_name_keys_orders[order[self.proxy_keys['recipient-name']]] = [order]
-        # Filter for same person orders dict, where key is recipient name and value is a list of order dicts:
-        for name_key in list(recipient_name_keys_orders):
-            if len(recipient_name_keys_orders[name_key]) == 1:
-                recipient_name_keys_orders.pop(name_key, None)
-        return recipient_name_keys_orders
+            if id(order) in grouped_order_ids:
+                continue
+            group_earlier_orders = self.__get_earlier_orders([order])
+            if group_earlier_orders:
+                recipient_name = order.recipient_name
+                same_buyer_orders[recipient_name] = [order]
+                earlier_orders[recipient_name] = group_earlier_orders
+        return earlier_orders
+
+    def __get_earlier_orders(self, group:list) -> list:
+        '''returns earlier orders in db of buyers in group, each listed once'''
+        group_earlier_orders = []
+        for buyer_key in dict.fromkeys(get_buyer_key(order) for order in group):
+            for earlier_order in self.repeat_buyers.get(buyer_key, []):
+                if earlier_order not in group_earlier_orders:
+                    group_earlier_orders.append(earlier_order)
+        return group_earlier_orders
 
     def export_replacement_orders(self):
         '''collect and export txt file FOR AMAZON orders'''
@@ -86,235 +102,39 @@ class ParseOrders():
         if replacement_orders:
             export_as_textfile(self.replacement_filename, replacement_orders)
             logging.warning(f'Replacement order(s) exported to file: {self.replacement_filename}')
-            print(VBA_REPLACEMENT_ALERT)
+            self.output_paths['replacement orders'] = self.replacement_filename
+            vba_alert(VBA_REPLACEMENT_ALERT)
 
     def _collect_replacement_order_ids(self):
-        '''returns list of order ids that dont have currency and has total-eur as 0'''
+        '''returns list of order ids that dont have currency and has total_eur as 0'''
         replacement_order_ids = []
         for order in self.all_orders:
-            if order[self.proxy_keys['currency']] == '' and order['total-eur'] == 0:
-                order_id = order[self.proxy_keys['order-id']]
-                replacement_order_ids.append(order_id)
+            if order.currency == '' and order.total_eur == 0:
+                replacement_order_ids.append(order.order_id)
         return replacement_order_ids
 
-    def export_csv(self, csv_filename : str, headers : list, contents : list, delimiter:str=';'):
-        '''exports data to csv details provided as func. args, don't export empty files'''
-        if not contents:
-            logging.info(f'Skipping {os.path.basename(csv_filename)} export. No new orders.')
-            return
-        try:
-            with open(csv_filename, 'w', encoding='utf-8-sig', newline='') as csv_f:
-                writer = csv.DictWriter(csv_f, fieldnames=headers, delimiter=delimiter)
-                writer.writeheader()
-                writer.writerows(contents)
-            logging.info(f'CSV {csv_filename} created. Orders inside: {len(contents)}')
-        except Exception as e:
-            logging.error(f'Error occured while exporting data to csv. Error: {e}.Arguments:\nheaders: {headers}\ncontents: {contents[0].keys()}')
-
-
-    def get_csv_export_ready_data(self, orders : list, headers_option : str) -> list:
-        '''reduces orders to that needed in output csv, based on passed option from EXPORT_CONSTANTS'''
-        assert headers_option in ['dp', 'lp'], 'Unexpected headers export option passed to get_csv_export_ready_data function. Expected dp or lp'
-        try:
-            export_ready_data = []
-            headers_settings = EXPORT_CONSTANTS[headers_option]
-            for order in orders:
-                reduced_order = self.get_export_ready_order(order, headers_settings)
-                if headers_option == 'dp':
-                    validated_order = self.__validate_dpost_order(reduced_order)
-                    export_ready_data.append(validated_order)
-                else:    
-                    # Most of LP valiation is made on VBA side, deleting some fields conditionally.
-                    validated_order = self.__validate_lp_order(reduced_order)
-                    export_ready_data.append(validated_order)
-            return export_ready_data
-        except Exception as e:
-            print(VBA_ERROR_ALERT)
-            logging.critical(f'Error while iterating collected row dicts and trying to reduce. Error: {e}')
-            logging.critical(f'Order causing trouble: {order}')
-            sys.exit()
-
-    def get_export_ready_order(self, order : dict, headers_settings : dict) -> dict:
-        '''outputs a dict, those keys correspong to target export csv headers based on passed headers_settings'''        
-        export = {}
-        title_proxy_key = self.proxy_keys.get('title', '')
-
-        for header in headers_settings['headers']:
-            # Fixed values and header mapping: 
-            if header in headers_settings['fixed'].keys():
-                export[header] = headers_settings['fixed'][header]
-
-            elif header in headers_settings['mapping'].keys():
-                # etsy data has no phone / email / ship-address-3. Preventing key error via dict.get()
-                target_key = self.proxy_keys.get(headers_settings['mapping'][header], '')
-                export[header] = order.get(target_key, '')
-
-            # DP specific headers
-            elif header == 'PRODUCT':
-                export[header] = get_dpost_product_header_val(order)
-            elif header == 'CUST_REF':
-                export[header] = order[self.proxy_keys['recipient-name']][:20]
-
-            # LP specific headers
-            elif header == 'Siuntos rūšis':
-                export[header] = get_LP_siuntos_rusis_header(order['vmdoption'], order['tracked'])
-            elif header in ['Gavėjo gatvė', 'Adreso eilutė 1', 'Adreso eilutė 2']:
-                export[header] = enter_LP_address(header, order, self.proxy_keys)
-            
-            elif header == 'Pirmenybinis siuntimas':
-                export[header] = get_lp_priority(order)
-            elif header == 'HS kodas':
-                export[header] = get_hs_code(order['brand'], order['category'])
-            elif header == 'Delivery Method':
-                service_level_proxy_key = self.proxy_keys.get('ship-service-level', '')
-                optional_str = ' EXPEDITED' if order.get(service_level_proxy_key, '') == 'Expedited' else ''
-                export[header] = order.get(service_level_proxy_key, '') + optional_str
-
-            # Common headers
-            elif header in ['DETAILED_CONTENT_DESCRIPTIONS_1', 'Siuntos turinio aprašymas anglų kalba']:
-                export[header] = order['category']
-            elif header in ['DECLARED_VALUE_1', 'TOTAL_VALUE', 'Deklaruojama vertė (eur)']:
-                export[header] = order['total-engineered']
-            elif header in ['DECLARED_ORIGIN_COUNTRY_1', 'Prekių kilmės šalis']:
-                # etsy - no item title, in case weight workbook missing title still:
-                if title_proxy_key == '':
-                    export[header] = 'CN'
-                else:
-                    export[header] = get_origin_country(order[self.proxy_keys['title']])
-            else:
-                export[header] = ''
-        return export
-
-
-    def __validate_dpost_order(self, order : dict) -> dict:
-        '''rearranges /shortens data fields on demand (charlimit for fields)
-        Takes care of: address1,2,3 , name, postcode fields'''
-        name = order['NAME']
-        order['POSTAL_CODE'] = order['POSTAL_CODE'].upper()
-
-        if len(name) > DPOST_NAME_CHARLIMIT:
-            logging.debug('Order enters name shortening functions')
-            order['NAME'] = shorten_word_sequence(name)
-
-        if len(order['ADDRESS_LINE_1']) > DPOST_ADDRESS_CHARLIMIT or \
-            len(order['ADDRESS_LINE_2']) > DPOST_ADDRESS_CHARLIMIT or \
-            len(order['ADDRESS_LINE_3']) > DPOST_ADDRESS_CHARLIMIT:
-            logging.debug('Order enters address reorganisation')
-            order = self.__reorg_dpost_order_addr(order)        
-        return order
-
-    @staticmethod
-    def __reorg_dpost_order_addr(order : dict) -> dict:
-        '''reoganizes address fields, returns original order dict, if reorganization still exceeds fields' limits'''
-        original_order = order.copy()
-        logging.debug(f'Before address reorg:\nf1: {order["ADDRESS_LINE_1"]}\nf2: {order["ADDRESS_LINE_2"]}\nf3:{order["ADDRESS_LINE_3"]}')
-        total_address_seq = order['ADDRESS_LINE_1'] + ' ' + order['ADDRESS_LINE_2'] + ' ' + order['ADDRESS_LINE_3']
-        address_seq = total_address_seq.split()
-        # Reset fields, declare availability flags
-        order['ADDRESS_LINE_1'] = order['ADDRESS_LINE_2'] = order['ADDRESS_LINE_3'] = ''
-        f1_not_filled = f2_not_filled = True
-        # Reorganizing fields
-        for addr_item in address_seq:
-            if len(order['ADDRESS_LINE_1']) + len(addr_item) < DPOST_ADDRESS_CHARLIMIT and f1_not_filled:
-                order['ADDRESS_LINE_1'] = order['ADDRESS_LINE_1'] + addr_item + ' '
-            elif len(order['ADDRESS_LINE_2']) + len(addr_item) < DPOST_ADDRESS_CHARLIMIT and f2_not_filled:
-                order['ADDRESS_LINE_2'] = order['ADDRESS_LINE_2'] + addr_item + ' '
-                f1_not_filled = False
-            elif len(order['ADDRESS_LINE_3']) + len(addr_item) < DPOST_ADDRESS_CHARLIMIT:
-                order['ADDRESS_LINE_3'] = order['ADDRESS_LINE_3'] + addr_item + ' '
-                f2_not_filled = False
-            else:
-                logging.warning(f'Address reorganization failed. Total address char count: {len(order["ADDRESS_LINE_1"])+len(order["ADDRESS_LINE_2"])+len(order["ADDRESS_LINE_3"])} could not fit into 3x{DPOST_ADDRESS_CHARLIMIT}')
-                logging.warning(f'Warning VBA, returning original order: {original_order}')
-                print(VBA_DPOST_CHARLIMIT_ALERT)
-                return original_order
-        logging.debug(f'After reorg:\nf1: {order["ADDRESS_LINE_1"]}\nf2: {order["ADDRESS_LINE_2"]}\nf3:{order["ADDRESS_LINE_3"]}')
-        return order
-
-    def __validate_lp_order(self, order : dict) -> dict:
-        '''conditionally deletes some of the fields before export'''
-        if order['Gavėjo šalies kodas'].upper() in EU_COUNTRY_CODES:
-            order['Siuntos turinio kategorija'] = ''
-            order['HS kodas'] = ''
-            order['Prekių kilmės šalis'] = ''
-            order['Siuntos turinio aprašymas anglų kalba'] = ''
-            order['Kiekis (vnt)'] = ''
-            order['Deklaruojamas siuntos svoris (g)'] = ''
-            order['Deklaruojama vertė (eur)'] = ''
-        return order
-
     def route_orders_to_shipping_services(self, skip_etonas:bool):
-        '''choose different routing functions based on orders source (COM/EU Amazon). Performs check in the end for empty lists'''
+        '''routes orders to service lists by rules in routing_rules.SERVICE_RULES: service picked by pricing / predefined
+        service first, ruleset for orders without pricing after. Performs check in the end for empty lists'''
         logging.info(f'Sorting orders by shippment company specific to {self.sales_channel} ruleset')
-        for order in self.all_orders:
-            if self.__routed_by_cheapest_or_predefined_service(order, skip_etonas):
-                continue
-            else:
-                self.__route_order_without_pricing(order, skip_etonas)
+        service_rules = RuleTable('Shipping service', SERVICE_RULES, {'sales_channel': self.sales_channel, 'skip_etonas': skip_etonas})
+        service_lists = {'nlpost': self.nlpost_orders, 'lp': self.lp_orders, 'lp_tracked': self.lp_tracked_orders,
+                        'dpost': self.dpost_orders, 'etonas': self.etonas_orders, 'dpdups': self.dpdups_orders}
+        for order, service in zip(self.all_orders, service_rules.evaluate(self.all_orders)):
+            service_lists[service].append(order)
+        service_rules.log_counters()
+        for service, service_orders in service_lists.items():
+            self.service_counts[service] = len(service_orders)
+            METRICS.count(f'orders to {service}', len(service_orders))
         logging.info(f'{len(self.nlpost_orders)} orders to nlpost')
         logging.info(f'{len(self.lp_orders)} orders to lp (untracked)')
         logging.info(f'{len(self.lp_tracked_orders)} orders to lp_tracked')
         logging.info(f'{len(self.dpost_orders)} orders to dpost')
         logging.info(f'{len(self.etonas_orders)} orders to etonas')
         logging.info(f'{len(self.dpdups_orders)} orders to ups / dpd')
-        self.exit_no_new_orders()
-    
-    def __routed_by_cheapest_or_predefined_service(self, order:dict, skip_etonas:bool) -> bool:
-        '''routes order based on order keys: 'shipping_service', 'tracked'
-        returns True afer adding order to corresponding list via __add_order_to_service_list method'''
-        if order['shipping_service'] == 'nl':
-            return self.__add_order_to_service_list(order, self.nlpost_orders)
-
-        elif order['shipping_service'] == 'lp' and order['tracked']:
-            return self.__add_order_to_service_list(order, self.lp_tracked_orders)
 
-        elif order['shipping_service'] == 'lp' and order['tracked'] == False:
-            return self.__add_order_to_service_list(order, self.lp_orders)
-
-        elif order['shipping_service'] == 'dp':
-            return self.__add_order_to_service_list(order, self.dpost_orders)
-
-        elif order['shipping_service'] == 'etonas' and not skip_etonas:
-            return self.__add_order_to_service_list(order, self.etonas_orders)
-
-        elif order['shipping_service'] == 'ups' or order['shipping_service'] == 'dpd':
-            return self.__add_order_to_service_list(order, self.dpdups_orders)
-        else:
-            return False
-    
-    def __add_order_to_service_list(self, order:dict, service_list:list):
-        '''adds order to service list, returns True'''
-        service_list.append(order)
-        return True
-
-    def __route_order_without_pricing(self, order:dict, skip_etonas:bool):
-        '''ruleset for routing order when no service was picked based on pricing or predefined rules in weights.py'''        
-        service_level_proxy_key = self.proxy_keys.get('ship-service-level', '')
-        
-        if order.get(service_level_proxy_key, '') == 'Expedited' or order['shipping-eur'] >= 10:
-            logging.debug(f'WITHOUT PRICING: Order routed to DPDUPS')
-            self.dpdups_orders.append(order)
-        elif order['category'] == 'TAROT CARDS' and order[self.proxy_keys['ship-country']] in ['GB', 'UK'] and not skip_etonas:
-            logging.debug(f'WITHOUT PRICING: Order routed to ETONAS')
-            self.etonas_orders.append(order)
-        elif order['category'] in ['TAROT CARDS', 'PLAYING CARDS', 'DICE']:
-            logging.debug(f'WITHOUT PRICING: Order routed to DPOST')
-            self.dpost_orders.append(order)
-        elif order['tracked']:
-            logging.debug(f'WITHOUT PRICING: Order routed to LPTRACKED')
-            self.lp_tracked_orders.append(order)
-        else:
-            logging.debug(f'WITHOUT PRICING: Order routed to LP')
-            self.lp_orders.append(order)
-    
-    def exit_no_new_orders(self):
-        '''terminates python program, closes db connection, warns VBA'''
-        if not self.etonas_orders and not self.dpost_orders and not self.nlpost_orders and not self.lp_orders \
-                and not self.dpdups_orders and not self.lp_tracked_orders:
-            logging.info(f'No new orders for processing. Terminating, alerting VBA.')
-            self.db_client.session.close()
-            print(VBA_NO_NEW_JOB)
-            sys.exit()
+    def has_routed_orders(self) -> bool:
+        return any(self.service_counts.values())
     
     def _prepare_filepaths(self):
         '''creates cls variables of files abs paths to be created one dir above this script dir'''
@@ -336,80 +156,64 @@ class ParseOrders():
         delete_file(self.lp_filename)
         delete_file(self.lp_tracked_filename)
     
-    def export_dpost(self):
-        '''export csv file for Deutsche Post shipping service'''
-        if self.dpost_orders:
-            dpost_content = self.get_csv_export_ready_data(self.dpost_orders, 'dp')
-            self.export_csv(self.dpost_filename, EXPORT_CONSTANTS['dp']['headers'], dpost_content)
-
-    def export_dpdups(self):
-        '''export csv file for DPD/UPS shipping services'''
-        if self.dpdups_orders:
-            DPDUPSExporter(self.dpdups_orders, self.dpdups_filename, self.sales_channel, self.proxy_keys).export()
-            logging.info(f'XLSX {self.dpdups_filename} created. Orders inside: {len(self.dpdups_orders)}')
-
-    def export_lp(self):
-        '''export csv file for Lietuvos Pastas shipping service'''
-        if self.lp_orders:
-            lp_content = self.get_csv_export_ready_data(self.lp_orders, 'lp')
-            self.export_csv(self.lp_filename, EXPORT_CONSTANTS['lp']['headers'], lp_content)
-
-    def export_lp_tracked(self):
-        '''export csv file for Lietuvos Pastas (TRACKED orders) shipping service'''
-        if self.lp_tracked_orders:
-            lp_content = self.get_csv_export_ready_data(self.lp_tracked_orders, 'lp')
-            self.export_csv(self.lp_tracked_filename, EXPORT_CONSTANTS['lp']['headers'], lp_content)
-
-    def export_etonas(self):
-        '''export xlsx file for Etonas shipping service'''
-        if self.etonas_orders:
-            EtonasExporter(self.etonas_orders, self.etonas_filename, self.sales_channel, self.proxy_keys).export()
-            logging.info(f'XLSX {self.etonas_filename} created. Orders inside: {len(self.etonas_orders)}')
-    
-    def export_nlpost(self):
-        '''export xlsx file for NLPost shipping service'''
-        if self.nlpost_orders:
-            NLPostExporter(self.nlpost_orders, self.nlpost_filename, self.sales_channel, self.proxy_keys).export()
-            logging.info(f'XLSX {self.nlpost_filename} created. Orders inside: {len(self.nlpost_orders)}')
+    def run_exports(self) -> bool:
+        '''exports txt files and carrier files concurrently (see export_scheduler.py). Returns True if all exports succeeded'''
+        scheduler = ExportScheduler(self.sales_channel)
+        scheduler.add_job('txt files', self.export_txt_files)
+        scheduler.add_carrier_job('dp', self.dpost_orders, self.dpost_filename)
+        scheduler.add_carrier_job('lp', self.lp_orders, self.lp_filename)
+        scheduler.add_carrier_job('lp', self.lp_tracked_orders, self.lp_tracked_filename, name='lp_tracked')
+        scheduler.add_carrier_job('etonas', self.etonas_orders, self.etonas_filename)
+        scheduler.add_carrier_job('nlpost', self.nlpost_orders, self.nlpost_filename)
+        scheduler.add_carrier_job('dpdups', self.dpdups_orders, self.dpdups_filename)
+        for service, service_orders, export_path in [('dpost', self.dpost_orders, self.dpost_filename), ('lp', self.lp_orders, self.lp_filename),
+                ('lp_tracked', self.lp_tracked_orders, self.lp_tracked_filename), ('etonas', self.etonas_orders, self.etonas_filename),
+                ('nlpost', self.nlpost_orders, self.nlpost_filename), ('dpdups', self.dpdups_orders, self.dpdups_filename)]:
+            if service_orders:
+                self.output_paths[service] = export_path
+        return scheduler.run()
 
     def push_orders_to_db(self):
         '''adds all orders in this class to orders table in db'''
-        count_added_to_db = self.db_client.add_orders_to_db()
-        logging.info(f'Total of {count_added_to_db} new orders have been added to database, after exports were completed')
+        self.added_to_db_count = self.db_client.add_orders_to_db()
+        logging.info(f'Total of {self.added_to_db_count} new orders have been added to database, after exports were completed')
 
     def test_exports(self, testing=False, skip_etonas=False):
         '''customize what shall happen when testing=True'''
         print(f'TESTING FLAG IS: {testing}. Refer to test_exports in parse_orders.py')
         logging.info(f'TESTING FLAG IS: {testing}. Refer to test_exports in parse_orders.py')
         # self.export_txt_files()
-        # self.export_dpost()
-        # self.export_lp()
-        # self.export_lp_tracked()
-        # self.export_etonas()
-        # self.export_nlpost()
-        # self.export_dpdups()
+        # self.run_exports()
         # self.push_orders_to_db()
         self.db_client.session.close()
         print(f'Finished executing ParseOrders.test_exports(testing={testing}) ')
     
-    def export_orders(self, testing=False, skip_etonas=False):
+    def export_orders(self, testing=False, skip_etonas=False) -> bool:
         '''Summing up tasks inside ParseOrders class. When testing, behaviour customizable inside
-        test_exports method'''
+        test_exports method. Returns False if there were no new orders to export. Raises ExportStageError if any export failed'''
         self._prepare_filepaths()
         self.delete_old_files()
-        self.route_orders_to_shipping_services(skip_etonas)
+        with METRICS.span('routing'):
+            self.route_orders_to_shipping_services(skip_etonas)
+        if not self.has_routed_orders():
+            logging.info(f'No new orders for processing. Terminating, alerting VBA.')
+            self.db_client.session.close()
+            return False
         if testing:
             self.test_exports(testing, skip_etonas)
-            return
-        self.export_txt_files()
-        self.export_dpost()
-        self.export_lp()
-        self.export_lp_tracked()
-        self.export_etonas()
-        self.export_nlpost()
-        self.export_dpdups()
+            return True
+        # single db query, before exports run in threads
+        with METRICS.span('repeat buyer lookup'):
+            self.repeat_buyers = self.db_client.get_repeat_buyers(self.all_orders)
+        with METRICS.span('exports'):
+            exports_succeeded = self.run_exports()
+        if not exports_succeeded:
+            logging.critical(f'Export stage failed. Orders were not added to database. Terminating')
+            self.db_client.session.close()
+            raise ExportStageError('Export stage failed')
         self.push_orders_to_db()
         self.db_client.session.close()
+        return True
 
 
 if __name__ == "__main__":
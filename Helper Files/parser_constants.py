@@ -363,11 +363,6 @@ DPDUPS_HEADERS_MAPPING = {
     'Weight' : 'weight',
 }
 
-EXPORT_CONSTANTS = {
-                'dp' : {'headers' : DPOST_HEADERS, 'mapping' : DPOST_HEADERS_MAPPING, 'fixed' : DPOST_FIXED_VALUES},
-                'lp' : {'headers' : LP_HEADERS, 'mapping' : LP_HEADERS_MAPPING, 'fixed' : LP_FIXED_VALUES}
-                }
-
 EXPECTED_SALES_CHANNELS = ['AmazonCOM', 'AmazonEU', 'Etsy']
 
 AMAZON_KEYS = {
@@ -452,6 +447,13 @@ QUANTITY_PATTERN = {
     'Etsy' : r'^\d+\svnt.\s',
     }
 
+# Amazon purchase-date: 2022-09-29T10:12:33+00:00 (date part parsed); Etsy Sale Date: 09/29/22
+PURCHASE_DATE_FORMAT = {
+    'AmazonCOM' : '%Y-%m-%d',
+    'AmazonEU' : '%Y-%m-%d',
+    'Etsy' : '%m/%d/%y',
+    }
+
 TRACKED_LP_SHIPMENT_TYPE = {
     'VKS' : 'P2P_3_XS',
     'MKS' : 'P2P_3_S',
@@ -1,26 +1,21 @@
 from parser_constants import ORIGIN_COUNTRY_CRITERIAS, CATEGORY_CRITERIAS, TRACKED_LP_SHIPMENT_TYPE, UNTRACKED_LP_SHIPMENT_TYPE
-from countries import COUNTRY_CODES, GIFT_COUNTRIES
+from parser_constants import PURCHASE_DATE_FORMAT
+from order_record import OrderRecord
+from output_capture import vba_alert
+from errors import ParserError
+from countries import COUNTRIES
 from string import ascii_letters
+from datetime import datetime, date
 import logging
 import random
-import sys
 import re
 
 
 # GLOBAL VARIABLES
-VBA_ERROR_ALERT = 'ERROR_CALL_DADDY'
-VBA_KEYERROR_ALERT = 'ERROR_IN_SOURCE_HEADERS'
 VBA_DPOST_CHARLIMIT_ALERT = 'DPOST_CHARLIMIT_WARNING'
 DPOST_NAME_CHARLIMIT = 30
 
 
-def get_sales_channel_category_brand(order:dict, product_name_proxy_key:str, return_brand:bool=False):
-    '''returns hardcoded PLAYING CARDS for etsy orders and category/brand for Amazon order'''
-    if product_name_proxy_key == '':
-        return 'PLAYING CARDS'
-    else:
-        return get_product_category_or_brand(order[product_name_proxy_key], return_brand)
-
 def get_product_category_or_brand(title:str, return_brand:bool=False) -> str:
     '''returns item category or brand based on item title. Last item in CATEGORY_CRITERIAS. Item before that - brand.
     Switch return index based on provided bool'''
@@ -39,14 +34,11 @@ def get_category_by_brand(brand_to_match:str) -> str:
             return category
     return 'OTHER'
 
-def get_sales_channel_hs_code(order:dict, product_name_proxy_key:str):
-    '''returns HS code based on sales channel. Hardcoded for Etsy in case of no present title proxy key'''
-    if product_name_proxy_key == '':
-        return '9504 40'
-    else:
-        item_brand = get_product_category_or_brand(order[product_name_proxy_key], return_brand=True)
-        item_category = get_product_category_or_brand(order[product_name_proxy_key])
-        return get_hs_code(item_brand, item_category)
+def get_sales_channel_hs_code(order:OrderRecord):
+    '''returns HS code based on order item title (Etsy title is added from weights workbook)'''
+    item_brand = get_product_category_or_brand(order.title, return_brand=True)
+    item_category = get_product_category_or_brand(order.title)
+    return get_hs_code(item_brand, item_category)
 
 def get_hs_code(item_brand:str, item_category:str) -> str:
     '''returns hs code based on item brand and category. Updated on 2021.11'''
@@ -73,37 +65,28 @@ def get_origin_country(title:str):
             return criteria_set[-1]
     return 'CN'
 
-def get_total_price(order:dict, sales_channel:str, return_as_float:bool=False):
-    '''returns a total order price based on sales channel. Default returns as str, optionally: as float'''
+def get_order_prices(order:OrderRecord, sales_channel:str) -> tuple:
+    '''returns (total, shipping price) of order as floats, each price column parsed once. Terminates on invalid prices
+    (price columns presence is checked at ingest)'''
     try:
+        shipping_price = float(order.shipping_price)
         if sales_channel == 'Etsy':
             # use formula: Order Value - Discount Amount + Shipping
-            order_value = float(order['Order Value'])
-            discount = float(order['Discount Amount'])
-            shipping = float(order['Shipping'])
-            total = round(order_value - discount + shipping, 2)
-            return total if return_as_float else str(total)
+            total = round(float(order.item_price) - float(order.discount) + shipping_price, 2)
         else:
             # For amazon orders, total = item-price + shipping-price
-            item_price = float(order['item-price'])
-            shipping_price = float(order['shipping-price'])
-            total = round(item_price + shipping_price, 2)
-            return total if return_as_float else str(total)
-    except KeyError as e:
-        logging.critical(f'Failed in get_total_price. Sales ch: {sales_channel}; order: {order} Key err: {e}')
-        print(VBA_KEYERROR_ALERT)
-        sys.exit()
+            total = round(float(order.item_price) + shipping_price, 2)
+        return total, shipping_price
     except ValueError as e:
-        logging.critical(f'Failed in get_total_price. Sales ch: {sales_channel}; order: {order}. Err: {e}')
-        print(VBA_ERROR_ALERT)
-        sys.exit()
+        logging.critical('Failed in get_order_prices. Sales ch: %s; order: %s. Err: %s', sales_channel, order, e)
+        raise ParserError(f'Invalid price in {sales_channel} order. Err: {e}')
 
-def get_dpost_product_header_val(order:dict) -> str:
+def get_dpost_product_header_val(order:OrderRecord) -> str:
     '''returns PRODUCT header value for Deutsche Post csv'''
     try:
-        return 'GPT' if order['tracked'] else 'GMP' 
+        return 'GPT' if order.tracked else 'GMP' 
     except Exception as e:
-        logging.critical(f'Failed while accessing order category key in get_dpost_product_header_val util func. Order: {order} Returning GMP. Err: {e}')
+        logging.critical('Failed while accessing order category key in get_dpost_product_header_val util func. Order: %s Returning GMP. Err: %s', order, e)
         return 'GMP'
 
 def clean_phone_number(phone_number:str) -> str:
@@ -119,63 +102,43 @@ def clean_phone_number(phone_number:str) -> str:
             cleaned_number = phone_number
         return replace_phone_zero(cleaned_number)
     except Exception as e:
-        logging.warning(f'Could not parse phone number: {phone_number} inside clean_phone_number util func. Err: {e}. Returning original number')
+        logging.warning('Could not parse phone number: %s inside clean_phone_number util func. Err: %s. Returning original number', phone_number, e)
         return replace_phone_zero(phone_number)
 
 def replace_phone_zero(phone_number:str) -> str:
     '''returns phone number with 00 insted of +. Example: +1-213-442 returns 001-213-442'''
     return phone_number.replace('+', '00')
 
-def get_lp_priority(order:dict) -> str:
+def get_lp_priority(order:OrderRecord) -> str:
     '''returns 1 or '' as string to fill in Lietuvos Pastas 'Pirmenybinis siuntimas' header value'''
     try:
-        if order['tracked']:
+        if order.tracked:
             return '1'
         else:
-            return '1' if order['vmdoption'] != '' and order['vmdoption'] != 'VKS' else ''
+            return '1' if order.vmdoption != '' and order.vmdoption != 'VKS' else ''
     except Exception as e:
-        logging.critical(f'Failed in get_lp_registered_priority_value util func. Order: {order}. Err: {e}')
+        logging.critical('Failed in get_lp_registered_priority_value util func. Order: %s. Err: %s', order, e)
         return ''
 
-def get_order_ship_price(order:dict, proxy_keys:dict) -> float:
-    '''returns order shipping price as float'''
+def get_order_purchase_date(order:OrderRecord, sales_channel:str) -> date:
+    '''returns order purchase date, None if it can not be parsed. Called from OrderData'''
     try:
-        target_key = proxy_keys['shipping-price']
-        return float(order[target_key])
-    except KeyError:
-        logging.critical(f'Key error: Could not find column: \'{target_key}\' in data source. Exiting on order: {order}')
-        print(VBA_KEYERROR_ALERT)
-        sys.exit()
+        purchase_date = order.purchase_date.strip()
+        if sales_channel != 'Etsy':
+            # drop time and utc offset part of ISO timestamp
+            purchase_date = purchase_date[:10]
+        return datetime.strptime(purchase_date, PURCHASE_DATE_FORMAT[sales_channel]).date()
     except Exception as e:
-        logging.warning(f'Error retrieving \'{target_key}\' in order: {order}, returning 0 (integer). Error: {e}')
-        return 0
-
-def get_order_country(order:dict, proxy_keys) -> str:
-    '''returns order destination country code. Called from ParseOrders'''
-    try:
-        target_key = proxy_keys['ship-country']
-        return order[target_key]
-    except KeyError:
-        logging.critical(f'Could not find column: \'shipping-country\' in data source. Exiting on order: {order}. Terminating immediately')
-        print(VBA_KEYERROR_ALERT)
-        sys.exit()
-    except Exception as e:
-        logging.critical(f'Error retrieving ship-country in order: {order}, returning empty string. Error: {e}')
-        print(VBA_KEYERROR_ALERT)
-        sys.exit()
+        logging.warning('Could not parse purchase date of order: %s, returning None. Error: %s', order, e)
+        return None
 
 def get_country_code(country:str) -> str:
-    '''using COUNTRY_CODES dict, returns 2 letter str for country if len(country) > 2. Called from main'''
+    '''using COUNTRIES registry, returns 2 letter str for country if len(country) > 2. Called from pipeline'''
     try:
-        if len(country) > 2:
-            country_code = COUNTRY_CODES[country.upper()]
-            return country_code
-        else:
-            return country
+        return COUNTRIES.get_code(country)
     except KeyError as e:
         logging.critical(f'Failed to get country code for: {country}. Err:{e}. Alerting VBA, terminating immediately')
-        print(VBA_ERROR_ALERT)
-        sys.exit()
+        raise ParserError(f'Unknown country: {country}')
 
 def get_inner_qty_sku(original_code:str, quantity_pattern:str):
     '''returns recognized internal quantity from passed regex pattern: quantity_pattern inside original_code arg and simplified code
@@ -207,7 +170,7 @@ def shorten_word_sequence(long_seq : str) -> str:
         return short_seq        
     except Exception as e:
         logging.warning(f'Could not shorten name: {long_seq}. Error: {e}. Alerting VBA, returning unedited')
-        print(VBA_DPOST_CHARLIMIT_ALERT)
+        vba_alert(VBA_DPOST_CHARLIMIT_ALERT)
         return long_seq
 
 def abbreviate_word(word : str) -> str:
@@ -229,7 +192,7 @@ def split_sku(split_sku:str, sales_channel:str) -> list:
 def alert_VBA_duplicate_mapping_sku(sku_code:str):
     '''duplicate SKU code found when reading mapping xlsx, alerts VBA, logs sku_code with warning level'''
     logging.warning(f'Duplicate SKU code found in mapping xlsx. User has been warned. SKU code found at least twice: {sku_code}')
-    print(f'DUPLICATE SKU IN MAPPING: {sku_code}')
+    vba_alert(f'DUPLICATE SKU IN MAPPING: {sku_code}')
 
 def get_LP_siuntos_rusis_header(vmdoption:str, tracked:bool):
     '''returns 'siuntos rusis' header value for LP csv'''
@@ -244,11 +207,11 @@ def engineer_total(country_code:str, order_total:float, order_id:str) -> float:
     try:
         if country_code in ['BR', 'BY'] and order_total > 10:
             engineered_total = round(random.uniform(6, 9.98), 2)
-            logging.warning(f'{order_id} (to: {country_code}) total-engineered key has new random value: {engineered_total}')            
+            logging.warning('%s (to: %s) total-engineered key has new random value: %s', order_id, country_code, engineered_total)
             return engineered_total
-        elif country_code in GIFT_COUNTRIES and order_total > 20:
+        elif COUNTRIES.is_gift(country_code) and order_total > 20:
             engineered_total = round(random.uniform(15, 19.98), 2)
-            logging.warning(f'{order_id} (to: {country_code}) total-engineered key has new random value: {engineered_total}')
+            logging.warning('%s (to: %s) total-engineered key has new random value: %s', order_id, country_code, engineered_total)
             return engineered_total
         else:
             return order_total
@@ -257,15 +220,14 @@ def engineer_total(country_code:str, order_total:float, order_id:str) -> float:
             Returning original order_total. Err: {e}')
         return order_total
 
-def enter_LP_address(header:str, order:dict, proxy_keys:dict) -> str:
+def enter_LP_address(header:str, order:OrderRecord) -> str:
     '''returns address string for LP csv file'''
-    # disposable address fields (etsy has no address3)
-    address1 = order[proxy_keys['ship-address-1']]
-    address2 = order[proxy_keys['ship-address-2']]
-    add3_key = proxy_keys.get('ship-address-3','')
-    address3 = order.get(add3_key, '')
+    # disposable address fields (etsy has no address3: '')
+    address1 = order.ship_address_1
+    address2 = order.ship_address_2
+    address3 = order.ship_address_3
     # country LT -> use "Gavëjo gatvė", "Adreso eilutė 1" fields for other countries use "Adreso eilutė 2", "Adreso eilutė 2"
-    if get_order_country(order, proxy_keys) == 'LT':
+    if order.ship_country == 'LT':
         if header == 'Gavėjo gatvė':
             return address1
         elif header == 'Adreso eilutė 1':
@@ -0,0 +1,142 @@
+from parser_constants import EXPECTED_SALES_CHANNELS
+from parser_utils import clean_phone_number, get_country_code, split_sku
+from file_utils import dump_to_json
+from weights import OrderData
+from forex import Forex
+from database import SQLAlchemyOrdersDB
+from parse_orders import ParseOrders
+from order_record import OrderAdapter
+from output_capture import capture_output
+from errors import ParserError
+from metrics import METRICS
+import logging
+import time
+
+
+# GLOBAL VARIABLES
+VBA_OK = 'EXPORTED_SUCCESSFULLY'
+VBA_NO_NEW_JOB = 'NO NEW JOB'
+
+
+class RunResult():
+    '''outcome of processing single orders file
+
+    Attributes:
+    status - VBA_OK, VBA_NO_NEW_JOB if file contained no new orders (nothing exported)
+    alerts - VBA alert tokens raised during run, in order
+    output_paths - {output: path} of written files: 'dpost', 'lp', 'lp_tracked', 'etonas', 'nlpost', 'dpdups',
+    'same buyer', 'replacement orders', 'unmapped skus'
+    counts - {'loaded orders', 'new orders', 'orders to <service>', 'added to db': int}
+
+    main method:
+    get_vba_output() - stdout tokens for VBA: alerts followed by status'''
+
+    def __init__(self, status:str, alerts:list, output_paths:dict, counts:dict):
+        self.status = status
+        self.alerts = alerts
+        self.output_paths = output_paths
+        self.counts = counts
+
+    def get_vba_output(self) -> list:
+        return self.alerts + [self.status]
+
+
+def get_cleaned_orders(source_file:str, sales_channel:str) -> list:
+    '''returns cleaned orders (as cleaned in clean_orders func) from source_file arg path'''
+    with METRICS.span('ingest'):
+        raw_orders = get_raw_orders(source_file, sales_channel)
+    with METRICS.span('clean'):
+        cleaned_orders = clean_orders(raw_orders, sales_channel)
+    return cleaned_orders
+
+def get_raw_orders(source_file:str, sales_channel:str) -> list:
+    '''returns raw orders as list of OrderRecord for each order in txt source_file. Proxy keys are resolved by
+    sales channel adapter at ingest (order_record.py)'''
+    return OrderAdapter(sales_channel).read_records(source_file)
+
+def clean_orders(orders:list, sales_channel:str) -> list:
+    '''performs universal data cleaning for amazon and etsy raw orders data'''
+    for order in orders:
+        # sku str value replaced by list of skus
+        order.sku = split_sku(order.sku, sales_channel)
+        if sales_channel == 'Etsy':
+            # transform etsy country (Lithuania) to country code (LT)
+            order.ship_country = get_country_code(order.ship_country)
+        else:
+            # fix phone numbers in amazon from '+1 210-728-4548 ext. 01071' to a more friendly version
+            order.buyer_phone_number = clean_phone_number(order.buyer_phone_number)
+    return orders
+
+
+def process_orders(source_fpath:str, sales_channel:str, skip_etonas:bool=False, testing:bool=False) -> RunResult:
+    '''parses source orders file, exports target files, adds new orders to database. No stdout output, no process exit:
+    VBA alerts are collected into returned RunResult; run terminating errors raise ParserError subclasses (errors.py)
+    carrying alerts raised before error. Run metrics (metrics.py) are reset on start, written on end.
+    Safe to call for several files in one process'''
+    if sales_channel not in EXPECTED_SALES_CHANNELS:
+        raise ParserError(f'Unexpected sales channel: {sales_channel}')
+    METRICS.reset()
+    start_time, cpu_start_time = time.perf_counter(), time.process_time()
+    with capture_output(capture_logs=False) as captured:
+        try:
+            status, output_paths, counts = _run_stages(source_fpath, sales_channel, skip_etonas, testing)
+            return RunResult(status, captured.alerts, output_paths, counts)
+        except ParserError as e:
+            e.alerts = list(captured.alerts)
+            raise
+        finally:
+            # written on early exits too (no new orders, errors)
+            METRICS.add_span('total', time.perf_counter() - start_time, time.process_time() - cpu_start_time)
+            METRICS.write(sales_channel)
+
+def _run_stages(source_fpath:str, sales_channel:str, skip_etonas:bool, testing:bool) -> tuple:
+    '''returns (status, output paths, counts) of run'''
+    # Get cleaned source orders
+    cleaned_source_orders = get_cleaned_orders(source_fpath, sales_channel)
+
+    db_client = SQLAlchemyOrdersDB(cleaned_source_orders, source_fpath, sales_channel, testing=testing)
+    fx = None
+    try:
+        new_orders = db_client.get_new_orders_only()
+        logging.info(f'Loaded file contains: {len(cleaned_source_orders)}. Further processing: {len(new_orders)} orders')
+        METRICS.count('loaded orders', len(cleaned_source_orders))
+        METRICS.count('new orders', len(new_orders))
+        counts = {'loaded orders': len(cleaned_source_orders), 'new orders': len(new_orders)}
+        output_paths = {}
+
+        # Add additional data to orders
+        logging.info(f'Passing new orders to add category, brand, (/mapped) weight data')
+        with METRICS.span('enrichment'):
+            # created here, background fx refresh it may start is joined below even if enrichment fails
+            fx = Forex()
+            orders_data_client = OrderData(new_orders, sales_channel, fx=fx)
+            weighted_orders = orders_data_client.add_orders_data()
+
+        if testing:
+            logging.warning(f'TESTING MODE. Unmapped sku export disabled. orders exported to json')
+            dump_to_json([order.to_dict() for order in weighted_orders], 'debugging_orders.json')
+        else:
+            unmapped_skus_path = orders_data_client.export_unmapped_skus()
+            if unmapped_skus_path:
+                output_paths['unmapped skus'] = unmapped_skus_path
+
+        # Parse orders, export target files
+        orders_parser = ParseOrders(weighted_orders, db_client, sales_channel)
+        exported = orders_parser.export_orders(testing=testing, skip_etonas=skip_etonas)
+        output_paths.update(orders_parser.output_paths)
+        counts.update({f'orders to {service}': service_count for service, service_count in orders_parser.service_counts.items()})
+        counts['added to db'] = orders_parser.added_to_db_count
+    finally:
+        # already closed by ParseOrders unless run failed before exports
+        db_client.session.close()
+        # on every exit path: failed or timed out background fx refresh is alerted, not dropped
+        if fx:
+            with METRICS.span('fx refresh wait'):
+                fx.finish_refresh()
+    if not exported:
+        return VBA_NO_NEW_JOB, output_paths, counts
+    return VBA_OK, output_paths, counts
+
+
+if __name__ == '__main__':
+    pass
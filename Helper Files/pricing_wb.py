@@ -1,6 +1,9 @@
-from excel_utils import get_last_used_row_col, cell_to_float
+from excel_utils import cell_to_float
+from order_record import OrderRecord
 from file_utils import get_output_dir
-from countries import COUNTRY_CODES
+from countries import COUNTRIES
+from metrics import METRICS
+from bisect import bisect_left
 import openpyxl
 import logging
 import os
@@ -8,113 +11,222 @@ import os
 
 # GLOBAL VARIABLES
 PRICING_WB = 'PRICING.xlsx'
+ROUTE_TABLE_TXT = 'PRICING routes.txt'
 ALLOWED_SERVICE_QUERIES = ['NL', 'LP', 'DP', 'ETONAS', 'DPD', 'UPS']
+UNTRACKED_SERVICES = ['NL', 'LP', 'DP', 'ETONAS']
+TRACKED_SERVICES = ['NL', 'LP', 'DP', 'ETONAS', 'DPD', 'UPS']
+VMD_HIERARCHY = ['VKS', 'MKS', 'DKS']
+SEGMENT_SEARCH_RANGE = 50
 
 
 class PricingWB:
     '''interaction with PRICING.xlsx workbook. Assumes workbook integrity has been checked on VBA side.
-    
-    Args:
-    proxy_keys:dict (order key mapping for Amazon / Etsy)
-
-    main method:
-    get_pricing_offer - returns price offer as float if found, None otherwise'''
-
-    def __init__(self, proxy_keys:dict):
-        self.proxy_keys = proxy_keys
-        wb_path = os.path.join(get_output_dir(client_file=False), PRICING_WB)
-        self.wb = openpyxl.load_workbook(wb_path, data_only=True)
-        self.ws_tracked = self.wb['PrTracked']
-        self.ws_untracked = self.wb['PrUntracked']
-        self.ws_tracked_limits = get_last_used_row_col(self.ws_tracked)
-        self.ws_untracked_limits = get_last_used_row_col(self.ws_untracked)
-
-    def get_pricing_offer(self, order:dict, service:str):
-        '''returns price offer for order data provided. External error handling, allow to fail here'''
-        tracked, country_code = order['tracked'], order[self.proxy_keys['ship-country']]
-        logging.debug(f'Getting offer for: {service}. Tracked: {tracked}, country: {country_code}')
-        self.__validate_query(service, country_code)
-        ws = self.ws_tracked if tracked else self.ws_untracked
-        limits = self.ws_tracked_limits if tracked else self.ws_untracked_limits
-        target_row = self.__get_country_row(ws, limits, country_code)
-        target_col = self.__get_target_col(ws, limits, order, service)
-        
-        offer = ws.cell(row=target_row, column=target_col).value
-        logging.debug(f'returning offer before float conversion: {offer}')
-        return cell_to_float(offer)
-
-    def __validate_query(self, service:str, country_code:str):
-        '''validates external querying for basic compatibility with pricing sheets'''
-        if service not in ALLOWED_SERVICE_QUERIES:
-            logging.critical(f'Pricing was queried by unsupported service: {service}')
-            raise ValueError('Order pricing: Service not supported')
-        if country_code not in COUNTRY_CODES.values():
-            logging.warning(f'Attempt to query pricing for not supported country: {country_code}')
-            raise ValueError('Order pricing: Country code not supported')
-
-    def __get_country_row(self, ws:object, limits:dict, country_code:str) -> int:
-        '''returns country matching row inside ws sheet. 0 if not found'''
-        max_row = limits['max_row']
-        for row in range(1, max_row + 1):
-            if ws.cell(row=row, column=1).value == country_code:                
-                return row
-        return 0
-
-    def __get_target_col(self, ws:object, limits:dict, order:dict, service:str) -> int:
-        '''returns target column for service based on order and pricing sheet data'''
-        max_col = limits['max_col']
-        order_weight, vmdoption = order['weight'], order['vmdoption']
-        logging.debug(f'Weight: {order_weight}, vmdoption: {vmdoption}')
-        segment_start_col = self.__get_segment_start_col(ws, max_col, service)
-        segment_end_col = self.__get_segment_end_col(ws, segment_start_col)
-        vmdoption = self.__validate_vmdoption(ws, vmdoption, segment_start_col, segment_end_col)
-        adj_start_col = self.__get_vmd_adj_start_col(ws, vmdoption, segment_start_col, segment_end_col)
-        
-        # find target column
-        for col in range(adj_start_col, segment_end_col + 1):
-            col_weight_limit = ws.cell(row=3, column=col).value
-            if order_weight <= col_weight_limit:
-                return col
-        return 0
+    Both pricing sheets are read once on init and compiled into route table, mapping
+    (tracked, country, vmdoption, batteries) to weight breakpoints (union of all services' weight limits)
+    and cheapest eligible service for each weight bracket.
 
-    def __get_segment_start_col(self, ws:object, max_col:int, service:str) -> int:
-        '''returns segment start column for target row and service. 0 if not found'''
+    Args:
+    wb_path:str (optional) pricing workbook path, defaults to PRICING.xlsx in Helper Files
+
+    main methods:
+    get_cheapest_service - returns cheapest eligible service for order (single route table lookup), '' if none
+    route - returns (cheapest service, its offer) for route table key and weight
+    get_service_offer - returns offer of particular service as float, None if not available
+    dump_route_table - writes route table weight brackets to txt file for audit'''
+
+    def __init__(self, wb_path:str=None):
+        self.wb_path = wb_path if wb_path else os.path.join(get_output_dir(client_file=False), PRICING_WB)
+        with METRICS.span('pricing workbook load'):
+            self.sheets = self.__read_sheets()
+            self.country_rows = self.__get_country_rows()
+            self.segments = self.__compile_segments()
+            self.route_table = self.__compile_route_table()
+
+    def __read_sheets(self) -> dict:
+        '''returns {tracked: sheet values as list of row tuples} for PrTracked, PrUntracked sheets'''
+        wb = openpyxl.load_workbook(self.wb_path, data_only=True, read_only=True)
+        sheets = {True: [row for row in wb['PrTracked'].iter_rows(values_only=True)],
+                False: [row for row in wb['PrUntracked'].iter_rows(values_only=True)]}
+        wb.close()
+        return sheets
+
+    def _cell_value(self, tracked:bool, row:int, col:int):
+        '''returns cell value in tracked / untracked sheet by excel (1-based) row, col numbering. None if out of range'''
+        try:
+            return self.sheets[tracked][row - 1][col - 1] if row > 0 and col > 0 else None
+        except IndexError:
+            return None
+
+    def __get_country_rows(self) -> dict:
+        '''returns {(tracked, country_code): row} for first row of each supported country inside column A'''
+        country_rows = {}
+        for tracked, rows in self.sheets.items():
+            for row, row_values in enumerate(rows, start=1):
+                country_code = row_values[0] if row_values else None
+                if COUNTRIES.is_pricing_supported(country_code) and (tracked, country_code) not in country_rows:
+                    country_rows[(tracked, country_code)] = row
+        return country_rows
+
+    def __compile_segments(self) -> dict:
+        '''returns {(tracked, service, vmdoption): (weight_limits, target_cols)} for every service segment available for vmdoption.
+        Replicates sheet lookup: vmdoption upgraded (VKS -> MKS -> DKS) if not available within segment, target column
+        is first column from vmdoption start up to segment end, whose weight limit (row 3) is not less than order weight'''
+        segments = {}
+        for tracked in self.sheets:
+            max_col = max((len(row) for row in self.sheets[tracked][:3]), default=0)
+            for service in ALLOWED_SERVICE_QUERIES:
+                start_col = self.__get_segment_start_col(tracked, max_col, service)
+                if not start_col:
+                    logging.debug(f'Service {service} segment not found in pricing sheet (tracked: {tracked})')
+                    continue
+                end_col = self.__get_segment_end_col(tracked, start_col)
+                for vmdoption in VMD_HIERARCHY:
+                    adj_start_col = self.__get_vmd_adj_start_col(tracked, vmdoption, start_col, end_col)
+                    if adj_start_col:
+                        segments[(tracked, service, vmdoption)] = self.__get_weight_steps(tracked, adj_start_col, end_col)
+        return segments
+
+    def __get_segment_start_col(self, tracked:bool, max_col:int, service:str) -> int:
+        '''returns segment start column for service. 0 if not found'''
         for col in range(2, max_col + 1):
-            if ws.cell(row=1, column=col).value == service:
+            if self._cell_value(tracked, 1, col) == service:
                 return col
         return 0
 
-    def __get_segment_end_col(self, ws:object, segment_start_col:int) -> int:
-        '''returns last column in service segment (search range end'''
-        for col in range(segment_start_col, segment_start_col + 50):
-            if ws.cell(row=2, column=col).value == None:
+    def __get_segment_end_col(self, tracked:bool, segment_start_col:int) -> int:
+        '''returns last column in service segment (search range end)'''
+        for col in range(segment_start_col, segment_start_col + SEGMENT_SEARCH_RANGE):
+            if self._cell_value(tracked, 2, col) == None:
                 return col - 1
         return 0
 
-    def __validate_vmdoption(self, ws:object, vmdoption:str, segment_start_col:int, segment_end_col:int) -> str:
-        '''if Shipping service does not support VKS / MKS return next available by hierarchy: VKS -> MKS -> DKS
-        returns first vmdtoption that is not less than original and available within service segment columns'''
-        # least bad (?) way to introduce and upgrade string hierarchy with indexing
-        logging.debug(f'Entering VMD validation with vmdoption arg value: {vmdoption}')
-        vmd_hierarchy = {'VKS': 1, 'MKS': 2, 'DKS': 3}
-        vmd_options = {1: 'VKS', 2: 'MKS', 3: 'DKS'}
-        order_vmd_idx = vmd_hierarchy[vmdoption]
-        for col in range(segment_start_col, segment_end_col + 1):
-            if ws.cell(row=2, column=col).value == vmdoption:
-                return vmdoption
-
-        # if not found, increase index, recursively call with upgraded vmdoption
-        upgraded_vmd = vmd_options[order_vmd_idx + 1]
-        logging.debug(f'No {vmdoption} match found, upgrading to {upgraded_vmd}. CALLING RECCURSIVELY')
-        return self.__validate_vmdoption(ws, upgraded_vmd, segment_start_col, segment_end_col)
-
-    def __get_vmd_adj_start_col(self, ws:object, vmdoption:str, segment_start_col:int, segment_end_col:int) -> int:
-        '''returns service segment start col as int, adjusted for vmdoption actually available inside segment headers'''
-        for col in range(segment_start_col, segment_end_col + 1):
-            if ws.cell(row=2, column=col).value == vmdoption:
-                return col
+    def __get_vmd_adj_start_col(self, tracked:bool, vmdoption:str, segment_start_col:int, segment_end_col:int) -> int:
+        '''returns segment start column adjusted for first vmdoption (not less than original by hierarchy)
+        available inside segment headers. 0 if no option is available'''
+        for upgraded_vmd in VMD_HIERARCHY[VMD_HIERARCHY.index(vmdoption):]:
+            for col in range(segment_start_col, segment_end_col + 1):
+                if self._cell_value(tracked, 2, col) == upgraded_vmd:
+                    return col
         return 0
 
+    def __get_weight_steps(self, tracked:bool, adj_start_col:int, segment_end_col:int) -> tuple:
+        '''returns (weight_limits, target_cols) as ascending weight limits, each mapped to first column reachable
+        by order weight. Columns with limit not exceeding one before them are never picked and are skipped'''
+        weight_limits, target_cols = [], []
+        for col in range(adj_start_col, segment_end_col + 1):
+            col_weight_limit = self._cell_value(tracked, 3, col)
+            if not isinstance(col_weight_limit, (int, float)):
+                # heavier orders fail comparison with non numeric limit in sheet
+                break
+            if not weight_limits or col_weight_limit > weight_limits[-1]:
+                weight_limits.append(col_weight_limit)
+                target_cols.append(col)
+        return weight_limits, target_cols
+
+    def __compile_route_table(self) -> dict:
+        '''returns {(tracked, country, vmdoption, batteries): (breakpoints, services, offers)} where services[i] is cheapest
+        eligible service for weight in bracket (breakpoints[i-1], breakpoints[i]] and offers[i] - its price'''
+        route_table = {}
+        for (tracked, country_code), row in self.country_rows.items():
+            services = TRACKED_SERVICES if tracked else UNTRACKED_SERVICES
+            for vmdoption in VMD_HIERARCHY:
+                for batteries in [True, False]:
+                    eligible_services = self.__filter_eligible_services(services, country_code, batteries)
+                    price_steps = self.__get_price_steps(tracked, row, vmdoption, eligible_services)
+                    breakpoints = sorted({limit for weight_limits, _ in price_steps.values() for limit in weight_limits})
+                    cheapest_offers = [self.__pick_cheapest_service(price_steps, weight) for weight in breakpoints]
+                    route_services = [service for service, _ in cheapest_offers]
+                    route_offers = [offer for _, offer in cheapest_offers]
+                    route_table[(tracked, country_code, vmdoption, batteries)] = (breakpoints, route_services, route_offers)
+        logging.info(f'Pricing route table compiled. Entries: {len(route_table)}')
+        return route_table
+
+    def __filter_eligible_services(self, services:list, country_code:str, batteries:bool) -> list:
+        '''selectively remove services not compatible with order contents / shipping rules'''
+        excluded_services = []
+        if batteries:
+            # only allow lp / nlpost / dp to be selected from
+            excluded_services.extend(['ETONAS', 'DPD', 'UPS'])
+            # remove dp for non DE countries
+            if country_code != 'DE':
+                excluded_services.append('DP')
+        if country_code == 'UK':
+            excluded_services.append('ETONAS')
+        return [service for service in services if service not in excluded_services]
+
+    def __get_price_steps(self, tracked:bool, row:int, vmdoption:str, services:list) -> dict:
+        '''returns {service: (weight_limits, offers)} for services available for vmdoption in country row'''
+        price_steps = {}
+        for service in services:
+            segment = self.segments.get((tracked, service, vmdoption))
+            if segment:
+                weight_limits, target_cols = segment
+                offers = [cell_to_float(self._cell_value(tracked, row, col)) for col in target_cols]
+                price_steps[service] = (weight_limits, offers)
+        return price_steps
+
+    def __pick_cheapest_service(self, price_steps:dict, weight) -> tuple:
+        '''returns cheapest service (lowercase) and its offer for weight. Evaluates only float/int offers,
+        first service wins on equal offers. ('', None) if no offer is available'''
+        eligible_offers = {}
+        for service, (weight_limits, offers) in price_steps.items():
+            idx = bisect_left(weight_limits, weight)
+            if idx < len(weight_limits) and isinstance(offers[idx], (float, int)):
+                eligible_offers[service.lower()] = offers[idx]
+        try:
+            cheapest_service = min(eligible_offers, key=lambda key: eligible_offers[key])
+            return cheapest_service, eligible_offers[cheapest_service]
+        except ValueError:
+            return '', None
+
+    def route(self, tracked:bool, country_code:str, vmdoption:str, batteries:bool, weight) -> tuple:
+        '''returns (cheapest service, offer) from route table. ('', None) if no offer is available'''
+        try:
+            breakpoints, services, offers = self.route_table[(tracked, country_code, vmdoption, batteries)]
+            idx = bisect_left(breakpoints, weight)
+            return (services[idx], offers[idx]) if idx < len(breakpoints) else ('', None)
+        except (KeyError, TypeError) as e:
+            logging.debug('No pricing route for: %s, weight: %s. Err: %s', (tracked, country_code, vmdoption, batteries), weight, e)
+            return '', None
+
+    def get_cheapest_service(self, order:OrderRecord) -> str:
+        '''returns cheapest eligible service for order based on order tracked status, country, vmdoption, weight, category.
+        Empty string if no offer is available'''
+        METRICS.count('pricing lookups')
+        batteries = order.category == 'BATTERIES'
+        cheapest_service, _ = self.route(order.tracked, order.ship_country, order.vmdoption, batteries, order.weight)
+        return cheapest_service
+
+    def get_service_offer(self, tracked:bool, country_code:str, vmdoption:str, weight, service:str):
+        '''returns offer of particular service as float, None if not available. Does not apply eligibility rules'''
+        target_row = self.country_rows.get((tracked, country_code), 0)
+        weight_limits, target_cols = self.segments.get((tracked, service, vmdoption), ([], []))
+        try:
+            idx = bisect_left(weight_limits, weight)
+        except TypeError:
+            return None
+        if not target_row or idx == len(weight_limits):
+            return None
+        offer = cell_to_float(self._cell_value(tracked, target_row, target_cols[idx]))
+        return offer if isinstance(offer, (float, int)) else None
+
+    def dump_route_table(self, txt_path:str=None) -> str:
+        '''writes route table to txt file: one line per weight range, where cheapest service stays the same.
+        Returns path of written file'''
+        txt_path = txt_path if txt_path else os.path.join(get_output_dir(client_file=False), ROUTE_TABLE_TXT)
+        with open(txt_path, 'w', encoding='utf-8') as f:
+            f.write('Tracked\tCountry\tVMD\tBatteries\tWeight from (excl.)\tWeight to (incl.)\tService')
+            for (tracked, country_code, vmdoption, batteries), (breakpoints, services, _) in sorted(self.route_table.items()):
+                range_start = 0
+                for idx, (weight_break, service) in enumerate(zip(breakpoints, services)):
+                    # write range once winning service changes on next breakpoint
+                    if idx + 1 == len(breakpoints) or services[idx + 1] != service:
+                        service_name = service if service else 'NO OFFER'
+                        f.write(f'\n{tracked}\t{country_code}\t{vmdoption}\t{batteries}\t{range_start}\t{weight_break}\t{service_name}')
+                        range_start = weight_break
+        logging.info(f'Pricing route table written to: {txt_path}')
+        return txt_path
+
 
 if __name__ == '__main__':
-    pass
\ No newline at end of file
+    PricingWB().dump_route_table()
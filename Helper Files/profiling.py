@@ -0,0 +1,103 @@
+from file_utils import get_output_dir, delete_oldest_files, PROFILES_KEEP_COUNT
+from datetime import datetime
+import tracemalloc
+import logging
+import cProfile
+import pstats
+import os
+
+
+# GLOBAL VARIABLES
+PROFILE_ENV_VAR = 'ORDERS_PARSER_PROFILE'
+# extra (last) argument VBA can pass on launch -> profiling mode. Same values accepted in env variable (case insensitive)
+PROFILE_ARGS = {'PROFILE': 'cpu', 'PROFILE_MEMORY': 'memory'}
+PROFILES_DIR = 'profiles'
+PROFILE_TOP_N = 40
+MEMORY_TOP_N = 25
+TRACEMALLOC_FRAMES = 10
+
+
+def get_profile_mode(argv:list) -> str:
+    '''returns profiling mode requested by last launch argument or env variable: 'cpu', 'memory' (cpu + memory), None if not requested'''
+    if len(argv) > 1 and argv[-1] in PROFILE_ARGS:
+        return PROFILE_ARGS[argv[-1]]
+    return PROFILE_ARGS.get(os.environ.get(PROFILE_ENV_VAR, '').upper())
+
+def strip_profile_arg(argv:list) -> list:
+    '''returns launch arguments without profiling argument'''
+    return argv[:-1] if len(argv) > 1 and argv[-1] in PROFILE_ARGS else argv
+
+
+class RunProfiler():
+    '''opt-in profiling of whole run (cProfile, optionally tracemalloc). Reports are written to 'profiles' folder inside
+    Helper Files on any run end (including runs terminated by errors); nothing is printed, stdout tokens for VBA are unchanged.
+    Reports of PROFILES_KEEP_COUNT latest runs are kept (run files share timestamp prefix).
+    cProfile covers main thread only: export jobs in threads / worker processes are timed by run metrics (metrics.py).
+
+    main method:
+    run(func, *args) - runs func under profiler, writes reports, returns func result (re-raises its exceptions)
+
+    Args:
+    mode: 'cpu' - cProfile; 'memory' - cProfile and tracemalloc (noticeably slower run)'''
+
+    def __init__(self, mode:str):
+        self.mode = mode
+        self.profiles_dir = os.path.join(get_output_dir(client_file=False), PROFILES_DIR)
+        self.fname_prefix = datetime.now().strftime('%Y.%m.%d %H.%M.%S')
+
+    def run(self, func, *args):
+        logging.info(f'Profiling mode: {self.mode}. Reports will be written to: {self.profiles_dir}')
+        profiler = cProfile.Profile()
+        if self.mode == 'memory':
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        profiler.enable()
+        try:
+            return func(*args)
+        finally:
+            profiler.disable()
+            self.__write_reports(profiler)
+
+    def __write_reports(self, profiler:cProfile.Profile):
+        '''writes .pstats, top N functions summary and (memory mode) peak memory report. Failures are logged only'''
+        try:
+            os.makedirs(self.profiles_dir, exist_ok=True)
+            # memory snapshot first, before stats processing allocates
+            if tracemalloc.is_tracing():
+                self.__write_memory_report(os.path.join(self.profiles_dir, f'{self.fname_prefix} memory.txt'))
+            pstats_path = os.path.join(self.profiles_dir, f'{self.fname_prefix}.pstats')
+            profiler.dump_stats(pstats_path)
+            self.__write_summary(profiler, os.path.join(self.profiles_dir, f'{self.fname_prefix} summary.txt'))
+            logging.info(f'Profiling reports written. Stats: {pstats_path}')
+            timestamp_len = len(self.fname_prefix)
+            delete_oldest_files(self.profiles_dir, keep_count=PROFILES_KEEP_COUNT, group_key=lambda fname: fname[:timestamp_len])
+        except Exception as e:
+            logging.warning(f'Failed to write profiling reports to {self.profiles_dir}. Err: {e}')
+        finally:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+    @staticmethod
+    def __write_summary(profiler:cProfile.Profile, summary_path:str):
+        '''top N functions by cumulative and by own time'''
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            stats = pstats.Stats(profiler, stream=f).strip_dirs()
+            f.write(f'Top {PROFILE_TOP_N} functions by cumulative time\n')
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_TOP_N)
+            f.write(f'\nTop {PROFILE_TOP_N} functions by own time\n')
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(PROFILE_TOP_N)
+
+    @staticmethod
+    def __write_memory_report(report_path:str):
+        '''traced peak / current memory and top N allocating lines still held at run end'''
+        current_size, peak_size = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, module.__file__) for module in [tracemalloc, cProfile]])
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write(f'Peak traced memory: {peak_size / 1024 / 1024:.2f} MiB\nTraced memory at run end: {current_size / 1024 / 1024:.2f} MiB\n')
+            f.write(f'\nTop {MEMORY_TOP_N} lines by memory held at run end:\n')
+            for stat in snapshot.statistics('lineno')[:MEMORY_TOP_N]:
+                f.write(f'{stat}\n')
+        logging.info(f'Peak traced memory: {peak_size / 1024 / 1024:.2f} MiB')
+
+
+if __name__ == '__main__':
+    pass
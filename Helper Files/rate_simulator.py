@@ -0,0 +1,187 @@
+from parser_constants import EXPECTED_SALES_CHANNELS
+from file_utils import get_output_dir, get_src_files_folder, dump_to_json, read_json_to_obj
+from database import ProgramRun, DATABASE_NAME
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine
+from pricing_wb import PricingWB, PRICING_WB
+from log_utils import setup_logging, LOG_FNAME
+from weights import OrderData, WB_NAME
+from pipeline import get_cleaned_orders
+from errors import ParserError
+from collections import Counter
+from datetime import datetime
+import logging
+import sys
+import os
+
+
+# GLOBAL VARIABLES
+SIMULATION_CACHE_JSON = 'simulation_cache.json'
+SIMULATION_ORDER_KEYS = ['tracked', 'skip_service_selection', 'shipping_service', 'vmdoption', 'weight', 'category']
+NO_SERVICE = 'without pricing'
+
+
+class RateCardSimulator():
+    '''what-if simulator for candidate PRICING workbooks. Replays stored / backed up orders (ProgramRun.fpath in orders.db
+    and files in 'src files' folder) through offline OrderData enrichment once (historical FX rates, no network),
+    caches compact enriched orders in json and re-routes them against each candidate workbook's route table.
+
+    main methods:
+    simulate(candidate_wb_paths) - returns {wb_path: {service: {'orders', 'cost', 'unpriced'}}}, current PRICING.xlsx included
+    export_report(results) - writes per service volume and total cost deltas vs current PRICING.xlsx to txt file
+
+    Args:
+    source_files: (optional) list of (fpath, sales_channel) to replay. Defaults to all runs in db and src files folder'''
+
+    def __init__(self, source_files:list=None):
+        self.cache_path = os.path.join(get_output_dir(client_file=False), SIMULATION_CACHE_JSON)
+        self.source_files = source_files if source_files else self.get_stored_source_files()
+        self.orders = self.__get_enriched_orders()
+
+    @staticmethod
+    def get_stored_source_files() -> list:
+        '''returns [(fpath, sales_channel), ...] of existing backups recorded in db runs and found in src files folder'''
+        source_files = {}
+        db_path = os.path.join(get_output_dir(client_file=False), DATABASE_NAME)
+        if os.path.exists(db_path):
+            session = sessionmaker(bind=create_engine(f'sqlite:///{db_path}', echo=False))()
+            for run in session.query(ProgramRun).order_by(ProgramRun.timestamp).all():
+                source_files[run.fpath] = run.sales_channel
+            session.close()
+        src_files_folder = get_src_files_folder()
+        for fname in sorted(os.listdir(src_files_folder)):
+            # backup fname format: sales_channel YY-MM-DD HH-MM.ext
+            sales_channel = fname.split(' ')[0]
+            fpath = os.path.join(src_files_folder, fname)
+            if sales_channel in EXPECTED_SALES_CHANNELS and fpath not in source_files:
+                source_files[fpath] = sales_channel
+        return [(fpath, sales_channel) for fpath, sales_channel in source_files.items() if os.path.exists(fpath)]
+
+    def __get_enriched_orders(self) -> list:
+        '''returns compact enriched orders of all source files, deduplicated by order id. Enriches only files not in cache'''
+        cache = self.__read_cache()
+        uncached_files = [(fpath, ch) for fpath, ch in self.source_files if self.__file_signature(fpath) != cache['files'].get(fpath, {}).get('signature')]
+        logging.info(f'Rate simulation sources: {len(self.source_files)} files, {len(uncached_files)} require enrichment')
+        for sales_channel in EXPECTED_SALES_CHANNELS:
+            channel_files = [fpath for fpath, ch in uncached_files if ch == sales_channel]
+            if channel_files:
+                cache['files'].update(self.__enrich_channel_files(channel_files, sales_channel))
+        dump_to_json(cache, SIMULATION_CACHE_JSON)
+
+        orders, seen_order_ids = [], set()
+        for fpath, _ in self.source_files:
+            for order in cache['files'].get(fpath, {}).get('orders', []):
+                if order['order_id'] not in seen_order_ids:
+                    seen_order_ids.add(order['order_id'])
+                    orders.append(order)
+        logging.info(f'Rate simulation replays {len(orders)} unique orders')
+        return orders
+
+    def __read_cache(self) -> dict:
+        '''returns cache dict. Cache is dropped when WEIGHTS.xlsx changed since enrichment'''
+        weights_signature = self.__file_signature(os.path.join(get_output_dir(client_file=False), WB_NAME))
+        try:
+            cache = read_json_to_obj(self.cache_path)
+            if cache['weights_signature'] == weights_signature:
+                return cache
+            logging.info(f'{WB_NAME} changed since last simulation. Dropping enriched orders cache')
+        except Exception as e:
+            logging.debug(f'No usable simulation cache at {self.cache_path}. Err: {e}')
+        return {'weights_signature': weights_signature, 'files': {}}
+
+    @staticmethod
+    def __file_signature(fpath:str) -> list:
+        '''returns [mtime, size] of file, None if file does not exist'''
+        try:
+            stat = os.stat(fpath)
+            return [stat.st_mtime, stat.st_size]
+        except OSError:
+            return None
+
+    def __enrich_channel_files(self, fpaths:list, sales_channel:str) -> dict:
+        '''returns {fpath: {'signature', 'sales_channel', 'orders'}} for files of same sales channel, enriched in single OrderData pass'''
+        file_orders = {}
+        for fpath in fpaths:
+            try:
+                file_orders[fpath] = get_cleaned_orders(fpath, sales_channel)
+            except ParserError:
+                logging.warning(f'Failed to load backup {fpath} for rate simulation. Skipping file')
+        all_orders = [order for orders in file_orders.values() for order in orders]
+        if all_orders:
+            OrderData(all_orders, sales_channel, offline=True).add_orders_data()
+
+        enriched_files = {}
+        for fpath, orders in file_orders.items():
+            compact_orders = []
+            for order in orders:
+                compact_order = {key: getattr(order, key) for key in SIMULATION_ORDER_KEYS}
+                compact_order['order_id'] = order.order_id
+                compact_order['country'] = order.ship_country
+                compact_orders.append(compact_order)
+            enriched_files[fpath] = {'signature': self.__file_signature(fpath), 'sales_channel': sales_channel, 'orders': compact_orders}
+        return enriched_files
+
+    def simulate(self, candidate_wb_paths:list) -> dict:
+        '''returns {wb_path: {service: {'orders', 'cost', 'unpriced'}}} for current PRICING.xlsx followed by candidate workbooks'''
+        baseline_wb_path = os.path.join(get_output_dir(client_file=False), PRICING_WB)
+        results = {}
+        for wb_path in [baseline_wb_path] + list(candidate_wb_paths):
+            results[wb_path] = self._route_orders(PricingWB(wb_path=wb_path))
+        return results
+
+    def _route_orders(self, pricing:PricingWB) -> dict:
+        '''returns per service volume and cost of replayed orders. Identical route queries are grouped and looked up once'''
+        route_queries = Counter()
+        for order in self.orders:
+            if not order['skip_service_selection'] and order['weight'] != '' and order['vmdoption'] != '':
+                route_queries[(True, order['tracked'], order['country'], order['vmdoption'], order['category'] == 'BATTERIES', order['weight'])] += 1
+            else:
+                # predefined service (or routed without pricing) keeps service, priced by its own offer
+                route_queries[(False, order['tracked'], order['country'], order['vmdoption'], order['shipping_service'], order['weight'])] += 1
+
+        services_summary = {}
+        for (priced, tracked, country, vmdoption, option, weight), count in route_queries.items():
+            if priced:
+                service, offer = pricing.route(tracked, country, vmdoption, option, weight)
+            else:
+                service = option
+                offer = pricing.get_service_offer(tracked, country, vmdoption, weight, service.upper()) if service else None
+            service_summary = services_summary.setdefault(service if service else NO_SERVICE, {'orders': 0, 'cost': 0.0, 'unpriced': 0})
+            service_summary['orders'] += count
+            if offer is None:
+                service_summary['unpriced'] += count
+            else:
+                service_summary['cost'] += offer * count
+        return services_summary
+
+    def export_report(self, results:dict) -> str:
+        '''writes simulation results to txt file in output dir, returns its path. Deltas are against first (current) workbook'''
+        date_stamp = datetime.today().strftime("%Y.%m.%d %H.%M")
+        report_path = os.path.join(get_output_dir(), f'Rate simulation {date_stamp}.txt')
+        wb_paths = list(results)
+        baseline = results[wb_paths[0]]
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write(f'Rate card simulation over {len(self.orders)} orders from {len(self.source_files)} source files\n')
+            f.write(f'Current pricing: {wb_paths[0]}')
+            for wb_path in wb_paths:
+                services = sorted(set(baseline) | set(results[wb_path]))
+                f.write(f'\n\n{wb_path}\nService\tOrders\tCost\tUnpriced\tOrders delta\tCost delta')
+                for service in services:
+                    current = baseline.get(service, {'orders': 0, 'cost': 0.0, 'unpriced': 0})
+                    simulated = results[wb_path].get(service, {'orders': 0, 'cost': 0.0, 'unpriced': 0})
+                    f.write(f"\n{service}\t{simulated['orders']}\t{simulated['cost']:.2f}\t{simulated['unpriced']}"
+                            f"\t{simulated['orders'] - current['orders']:+d}\t{simulated['cost'] - current['cost']:+.2f}")
+                total_cost = sum(summary['cost'] for summary in results[wb_path].values())
+                total_delta = total_cost - sum(summary['cost'] for summary in baseline.values())
+                f.write(f'\nTOTAL\t{len(self.orders)}\t{total_cost:.2f}\t\t\t{total_delta:+.2f}')
+                logging.info(f'Rate simulation {os.path.basename(wb_path)}: total cost {total_cost:.2f}, delta vs current: {total_delta:+.2f}')
+        logging.info(f'Rate simulation report written to: {report_path}')
+        return report_path
+
+
+if __name__ == '__main__':
+    # usage: python rate_simulator.py <candidate PRICING.xlsx path> [<another candidate path> ...]
+    setup_logging(os.path.join(get_output_dir(client_file=False), LOG_FNAME))
+    simulator = RateCardSimulator()
+    simulation_results = simulator.simulate(sys.argv[1:])
+    print(simulator.export_report(simulation_results))
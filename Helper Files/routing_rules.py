@@ -0,0 +1,137 @@
+from parser_constants import TRACKED_INNER_SALES_CHANNELS
+import logging
+import time
+
+
+# GLOBAL VARIABLES
+# rule fields: name used in rule predicates -> order record field (order_record.py)
+ORDER_FIELDS = {
+    'shipping_eur': 'shipping_eur',
+    'total_eur': 'total_eur',
+    'category': 'category',
+    'vmdoption': 'vmdoption',
+    'service': 'shipping_service',
+    'tracked': 'tracked',
+    'country': 'ship_country',
+    'inner_sales_channel': 'sales_channel',
+    'service_level': 'ship_service_level',
+}
+UK_COUNTRIES = ['GB', 'UK']
+SMALL_ITEM_CATEGORIES = ['TAROT CARDS', 'PLAYING CARDS', 'DICE']
+UPS_TRACKED = {'shipping_service': 'ups', 'tracked': True, 'skip_service_selection': True}
+ETONAS_TRACKED = {'shipping_service': 'etonas', 'tracked': True, 'skip_service_selection': True}
+TRACKED = {'tracked': True}
+
+
+def always(params:dict) -> bool:
+    return True
+
+def etonas_allowed(params:dict) -> bool:
+    return not params['skip_etonas']
+
+def is_uk_tarot(row:dict) -> bool:
+    return row['category'] == 'TAROT CARDS' and row['country'] in UK_COUNTRIES
+
+
+# Rule tables: (rule name, enabled(params) -> bool, predicate(row) -> bool, outcome). First matching rule wins.
+# Rules disabled for run params are dropped when table is compiled
+
+TRACKED_RULES = {
+    'Etsy': {
+        'fields': ['shipping_eur', 'total_eur', 'category', 'vmdoption', 'country'],
+        'rules': [
+            ('ups: shipping >= 21', always, lambda row: row['shipping_eur'] >= 21, UPS_TRACKED),
+            ('etonas: uk tarot not MKS', always, lambda row: is_uk_tarot(row) and row['vmdoption'] != 'MKS', ETONAS_TRACKED),
+            ('tracked: paid shipping or total > 70', always, lambda row: row['shipping_eur'] > 0 or row['total_eur'] > 70, TRACKED),
+        ],
+    },
+    'Amazon': {
+        'fields': ['shipping_eur', 'total_eur', 'category', 'vmdoption', 'country', 'inner_sales_channel'],
+        'rules': [
+            ('ups: shipping >= 15', always, lambda row: row['shipping_eur'] >= 15, UPS_TRACKED),
+            ('etonas: uk tarot not MKS (AmazonEU)', lambda params: params['sales_channel'] == 'AmazonEU',
+                lambda row: is_uk_tarot(row) and row['vmdoption'] != 'MKS', ETONAS_TRACKED),
+            ('tracked: inner sales channel or total > 70', always,
+                lambda row: row['inner_sales_channel'].lower() in TRACKED_INNER_SALES_CHANNELS or row['total_eur'] > 70, TRACKED),
+        ],
+    },
+}
+
+SERVICE_RULES = {
+    'fields': ['service', 'tracked', 'shipping_eur', 'category', 'country', 'service_level'],
+    'rules': [
+        # cheapest service picked by pricing or predefined by tracked rules
+        ('nlpost: picked', always, lambda row: row['service'] == 'nl', 'nlpost'),
+        ('lp_tracked: picked, tracked', always, lambda row: row['service'] == 'lp' and row['tracked'], 'lp_tracked'),
+        ('lp: picked, untracked', always, lambda row: row['service'] == 'lp' and row['tracked'] == False, 'lp'),
+        ('dpost: picked', always, lambda row: row['service'] == 'dp', 'dpost'),
+        ('etonas: picked', etonas_allowed, lambda row: row['service'] == 'etonas', 'etonas'),
+        ('dpdups: picked', always, lambda row: row['service'] in ['ups', 'dpd'], 'dpdups'),
+        # routing without pricing
+        ('dpdups: expedited or shipping >= 10', always, lambda row: row['service_level'] == 'Expedited' or row['shipping_eur'] >= 10, 'dpdups'),
+        ('etonas: uk tarot', etonas_allowed, is_uk_tarot, 'etonas'),
+        ('dpost: cards, dice', always, lambda row: row['category'] in SMALL_ITEM_CATEGORIES, 'dpost'),
+        ('lp_tracked: tracked', always, lambda row: row['tracked'], 'lp_tracked'),
+        ('lp: rest', always, lambda row: True, 'lp'),
+    ],
+}
+
+
+class RuleTable():
+    '''first-match decision table compiled for run: disabled rules are dropped, order fields of rule fields are resolved once.
+    Evaluated column-wise over batch of orders: rule fields are extracted once per order, then each rule is
+    applied to all orders not matched by preceding rules. Per rule hit counts and evaluation times are kept.
+
+    main methods:
+    evaluate(orders) - returns list of matched rule outcomes (None for orders matching no rule)
+    log_counters() - writes per rule hits / evaluation time to log
+
+    Args:
+    name: table name used in log
+    table: table spec ({'fields': [...], 'rules': [...]}), see TRACKED_RULES, SERVICE_RULES
+    params: run params rules are compiled for ({'sales_channel': str, 'skip_etonas': bool})'''
+
+    def __init__(self, name:str, table:dict, params:dict):
+        self.name = name
+        self.fields = [(field, ORDER_FIELDS[field]) for field in table['fields']]
+        self.rules = [(rule_name, predicate, outcome) for rule_name, enabled, predicate, outcome in table['rules'] if enabled(params)]
+        self.hits = {rule_name: 0 for rule_name, _, _ in self.rules}
+        self.eval_seconds = {rule_name: 0.0 for rule_name, _, _ in self.rules}
+        self.evaluated_orders = 0
+        logging.debug(f'Compiled {name} rule table: {len(self.rules)} of {len(table["rules"])} rules enabled')
+
+    def __get_rows(self, orders:list) -> list:
+        '''returns rule field values of orders as list of row dicts (single pass per field column)'''
+        field_names = [field for field, _ in self.fields]
+        columns = [[getattr(order, order_field) for order in orders] for _, order_field in self.fields]
+        return [dict(zip(field_names, values)) for values in zip(*columns)]
+
+    def evaluate(self, orders:list) -> list:
+        '''returns outcome of first matching rule for each order, None where no rule matched'''
+        rows = self.__get_rows(orders)
+        outcomes = [None] * len(rows)
+        pending = range(len(rows))
+        for rule_name, predicate, outcome in self.rules:
+            if not pending:
+                break
+            start_time = time.perf_counter()
+            unmatched = []
+            for row_idx in pending:
+                if predicate(rows[row_idx]):
+                    outcomes[row_idx] = outcome
+                else:
+                    unmatched.append(row_idx)
+            self.eval_seconds[rule_name] += time.perf_counter() - start_time
+            self.hits[rule_name] += len(pending) - len(unmatched)
+            pending = unmatched
+        self.evaluated_orders += len(rows)
+        return outcomes
+
+    def log_counters(self):
+        logging.info(f'{self.name} rule table evaluated for {self.evaluated_orders} orders:')
+        for rule_name, _, _ in self.rules:
+            logging.info(f'\t{rule_name}: {self.hits[rule_name]} hits, {self.eval_seconds[rule_name] * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    pass
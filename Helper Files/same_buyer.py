@@ -0,0 +1,147 @@
+from order_record import OrderRecord
+from unicodedata import normalize, combining
+import logging
+import re
+
+
+# GLOBAL VARIABLES
+MIN_PHONE_DIGITS = 7
+# blocks above this size (placeholder phones, large apartment buildings) are not compared pairwise
+MAX_BLOCK_SIZE = 50
+
+
+def normalize_text(text:str) -> str:
+    '''returns casefolded text without accents'''
+    return ''.join(char for char in normalize('NFKD', text.casefold()) if not combining(char))
+
+def get_name_tokens(name:str) -> tuple:
+    '''returns normalized name tokens: 'J. Döe' -> ('j', 'doe')'''
+    return tuple(re.findall(r'[^\W_]+', normalize_text(name)))
+
+def normalize_postal_code(postal_code:str) -> str:
+    '''returns postal code without spaces, dashes in upper case: 'ab1 2cd' -> 'AB12CD' '''
+    return re.sub(r'[\W_]', '', postal_code).upper()
+
+def get_buyer_key(order:OrderRecord) -> str:
+    '''returns normalized buyer key of order across runs: 'john doe|AB12CD|GB'. None if recipient name has no letters / digits'''
+    name_tokens = get_name_tokens(order.recipient_name)
+    if not name_tokens:
+        return None
+    postal_code = normalize_postal_code(order.ship_postal_code)
+    country = order.ship_country.upper()
+    # etonas export changes GB to UK in orders
+    country = 'GB' if country == 'UK' else country
+    return f'{" ".join(name_tokens)}|{postal_code}|{country}'
+
+def tokens_compatible(tokens_a:tuple, tokens_b:tuple) -> bool:
+    '''returns True if names can belong to same person: each token of shorter name matches separate token of longer one
+    (equal or initial of it) and at least one full token is shared. 'J. Doe' ~ 'John Doe', 'Doe John' ~ 'John Doe' '''
+    shorter, longer = sorted([tokens_a, tokens_b], key=len)
+    if not shorter:
+        return False
+    remaining = list(longer)
+    shared_full_token = False
+    for token in shorter:
+        match = next((other for other in remaining if other == token), None)
+        if match:
+            shared_full_token = shared_full_token or len(token) > 1
+        else:
+            match = next((other for other in remaining if other[0] == token[0] and (len(token) == 1 or len(other) == 1)), None)
+            if not match:
+                return False
+        remaining.remove(match)
+    return shared_full_token
+
+
+class SameBuyerDetector():
+    '''groups orders made by same person. Exact normalized names (case, accents, punctuation ignored) are grouped directly,
+    orders sharing blocking key - postal code + address numbers or phone digits - are compared pairwise within block only
+    and grouped if names are compatible (see tokens_compatible). Near-linear: no comparisons across blocks.
+
+    main method:
+    get_same_buyer_orders(orders) - returns {recipient name: [order1, order2, ...]} of groups with more than one order'''
+
+    def __get_address_key(self, order:OrderRecord) -> str:
+        '''returns normalized postal code + numbers in address lines ('LT-12345|12-5'), None if either is missing'''
+        postal_code = normalize_postal_code(order.ship_postal_code)
+        # etsy has no address3 ('')
+        address_numbers = re.findall(r'\d+', f'{order.ship_address_1} {order.ship_address_2} {order.ship_address_3}')
+        if not postal_code or not address_numbers:
+            return None
+        return f'{postal_code}|{"-".join(address_numbers)}'
+
+    def __get_phone_key(self, order:OrderRecord) -> str:
+        '''returns phone digits, None if number is missing or too short to be meaningful (etsy exports have no phone numbers)'''
+        digits = re.sub(r'\D', '', order.buyer_phone_number)
+        return digits if len(digits) >= MIN_PHONE_DIGITS else None
+
+    def __get_blocks(self, orders:list) -> tuple:
+        '''returns names tokens of orders and blocks: {('name' / 'address' / 'phone', key): [order indexes]}'''
+        names_tokens, blocks = [], {}
+        for order_idx, order in enumerate(orders):
+            recipient_name = order.recipient_name
+            name_tokens = get_name_tokens(recipient_name)
+            names_tokens.append(name_tokens)
+            # names without letters / digits are grouped by exact value
+            block_keys = [('name', name_tokens if name_tokens else recipient_name),
+                        ('address', self.__get_address_key(order)),
+                        ('phone', self.__get_phone_key(order))]
+            for block_key in block_keys:
+                if block_key[1] is not None:
+                    blocks.setdefault(block_key, []).append(order_idx)
+        return names_tokens, blocks
+
+    def get_same_buyer_orders(self, orders:list) -> dict:
+        '''returns {recipient name of first order in group: [orders in group]}, groups in order of first appearance'''
+        names_tokens, blocks = self.__get_blocks(orders)
+        parents = list(range(len(orders)))
+        # distinct name tokens of each group (by group root), fuzzy merge must be compatible with all of them
+        group_names = {order_idx: {name_tokens} for order_idx, name_tokens in enumerate(names_tokens)}
+
+        def find(order_idx:int) -> int:
+            while parents[order_idx] != order_idx:
+                parents[order_idx] = parents[parents[order_idx]]
+                order_idx = parents[order_idx]
+            return order_idx
+
+        def union(root_a:int, root_b:int):
+            root, child = min(root_a, root_b), max(root_a, root_b)
+            parents[child] = root
+            group_names[root] |= group_names.pop(child)
+
+        def groups_compatible(root_a:int, root_b:int) -> bool:
+            '''prevents chaining: 'J. Doe' joins 'John Doe' or 'Jane Doe', not both'''
+            return all(tokens_compatible(name_a, name_b) for name_a in group_names[root_a] for name_b in group_names[root_b])
+
+        # exact names are collapsed before any fuzzy merge: group names are then complete when checked for compatibility,
+        # two 'J. Doe' orders can not bridge 'Jane Doe' and 'José Doe' groups merged earlier
+        for (block_type, _), order_idxs in blocks.items():
+            if block_type == 'name':
+                for order_idx in order_idxs[1:]:
+                    root_a, root_b = find(order_idxs[0]), find(order_idx)
+                    if root_a != root_b:
+                        union(root_a, root_b)
+
+        comparisons = 0
+        for (block_type, _), order_idxs in blocks.items():
+            if block_type == 'name' or len(order_idxs) < 2:
+                continue
+            if len(order_idxs) > MAX_BLOCK_SIZE:
+                logging.warning(f'Same buyer {block_type} block of {len(order_idxs)} orders is too large, skipping comparisons')
+            else:
+                for pos, idx_a in enumerate(order_idxs):
+                    for idx_b in order_idxs[pos + 1:]:
+                        comparisons += 1
+                        root_a, root_b = find(idx_a), find(idx_b)
+                        if root_a != root_b and groups_compatible(root_a, root_b):
+                            union(root_a, root_b)
+        logging.debug(f'Same buyer detection: {len(orders)} orders, {len(blocks)} blocks, {comparisons} pairwise comparisons')
+
+        groups = {}
+        for order_idx, order in enumerate(orders):
+            groups.setdefault(find(order_idx), []).append(order)
+        return {group[0].recipient_name: group for group in groups.values() if len(group) > 1}
+
+
+if __name__ == '__main__':
+    pass
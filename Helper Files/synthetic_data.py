@@ -0,0 +1,358 @@
+from parser_constants import AMAZON_KEYS, ETSY_KEYS, EXPECTED_SALES_CHANNELS, READ_EXCEL_CONFIG
+from ecb_calendar import get_latest_publication_date
+from forex import SUPPORTED_CURRENCIES, RATES_JSON
+from pricing_wb import PRICING_WB, ALLOWED_SERVICE_QUERIES
+from weights import WB_NAME
+from datetime import datetime, timedelta
+import openpyxl
+import random
+import json
+import csv
+import sys
+import os
+
+
+# GLOBAL VARIABLES
+HELPER_FILES_DIR = 'Helper Files'
+DEFAULT_SEED = 42
+CATALOG_SIZE = 400
+# share of catalog skus missing in WEIGHTS.xlsx (orders with invalid weights)
+MISSING_WEIGHT_SHARE = 0.03
+AMAZON_EXPORT_HEADERS = ['order-id', 'order-item-id', 'purchase-date', 'payments-date', 'buyer-email', 'buyer-name',
+    'buyer-phone-number', 'sku', 'product-name', 'quantity-purchased', 'currency', 'item-price', 'item-tax', 'shipping-price',
+    'shipping-tax', 'ship-service-level', 'recipient-name', 'ship-address-1', 'ship-address-2', 'ship-address-3', 'ship-city',
+    'ship-state', 'ship-postal-code', 'ship-country', 'ship-phone-number', 'delivery-start-date', 'delivery-end-date',
+    'delivery-time-zone', 'delivery-Instructions', 'sales-channel', 'is-business-order', 'purchase-order-number',
+    'price-designation', 'is-sold-by-ab']
+ETSY_EXPORT_HEADERS = ['Sale Date', 'Order ID', 'Buyer User ID', 'Full Name', 'First Name', 'Last Name', 'Number of Items',
+    'Payment Method', 'Date Shipped', 'Street 1', 'Street 2', 'Ship City', 'Ship State', 'Ship Zipcode', 'Ship Country',
+    'Currency', 'Order Value', 'Coupon Code', 'Coupon Details', 'Discount Amount', 'Shipping Discount', 'Shipping',
+    'Sales Tax', 'Order Total', 'Status', 'Card Processing Fees', 'Order Net', 'Adjusted Order Total',
+    'Adjusted Card Processing Fees', 'Adjusted Net Order Amount', 'Buyer', 'Order Type', 'Payment Type', 'InPerson Discount',
+    'InPerson Location', 'SKU']
+# (title, vmdoption, weight range in grams). Titles hit brand / category criterias of parser_constants.CATEGORY_CRITERIAS
+CATALOG_PRODUCTS = [
+    ('Bicycle Standard Playing Cards', 'VKS', (90, 110)),
+    ('Bicycle Rider Back Playing Cards 12 decks', 'DKS', (1100, 1300)),
+    ('Copag 310 Slimline Playing Cards', 'VKS', (80, 100)),
+    ('Theory11 Avengers Playing Cards', 'VKS', (100, 120)),
+    ('Lo Scarabeo Tarot of Marseille', 'MKS', (250, 400)),
+    ('US Games Rider Waite Tarot Deck', 'MKS', (300, 450)),
+    ('Angel Answers Oracle Cards', 'MKS', (350, 500)),
+    ('Llewellyn Witches Tarot Kit', 'DKS', (700, 900)),
+    ('Energizer CR2032 Lithium Battery 5 pcs', 'VKS', (15, 30)),
+    ('Duracell Plus AA Batteries 12 pcs', 'MKS', (280, 320)),
+    ('Varta Longlife 9V Battery', 'VKS', (40, 50)),
+    ('Panasonic Eneloop AAA Rechargeable 4 pcs', 'MKS', (60, 80)),
+    ('Q-Workshop Elvish Dice Set', 'VKS', (40, 70)),
+    ('NFL Football Trading Cards Box', 'DKS', (900, 1500)),
+    ('Wooden Puzzle Box', 'MKS', (200, 600)),
+]
+STORAGE_BRANDS = ['Q-WORKSHOP', 'OTHER', 'BICYCLE', 'VARTA']
+# ship country code: (Etsy country name, postal code format: 9 - digit, A - letter)
+SHIP_COUNTRIES = {
+    'DE': ('Germany', '99999'), 'FR': ('France', '99999'), 'IT': ('Italy', '99999'), 'ES': ('Spain', '99999'),
+    'NL': ('Netherlands', '9999 AA'), 'LT': ('Lithuania', 'LT-99999'), 'PL': ('Poland', '99-999'), 'SE': ('Sweden', '999 99'),
+    'IE': ('Ireland', 'A99 A9A9'), 'CH': ('Switzerland', '9999'), 'GB': ('United Kingdom', 'AA9 9AA'),
+    'US': ('United States', '99999'), 'CA': ('Canada', 'A9A 9A9'), 'MX': ('Mexico', '99999'), 'BR': ('Brazil', '99999-999'),
+    'AU': ('Australia', '9999'), 'HK': ('Hong Kong', ''), 'SG': ('Singapore', '999999'),
+}
+# approximate ECB reference rates (currency units per EUR); generated rates deviate by up to FX_RATE_JITTER
+FX_BASE_RATES = {'USD': 1.08, 'GBP': 0.85, 'CAD': 1.47, 'AUD': 1.65, 'HKD': 8.45, 'SGD': 1.45, 'SEK': 11.4, 'PLN': 4.35, 'MXN': 18.9}
+FX_RATE_JITTER = 0.05
+# per sales channel: {ship country: weight}; Amazon: {ship country: marketplace} (default - first one), Etsy: {currency: weight}
+CHANNEL_MARKETS = {
+    'AmazonEU': {
+        'countries': {'DE': 30, 'FR': 15, 'IT': 12, 'ES': 10, 'GB': 15, 'NL': 4, 'SE': 3, 'PL': 3, 'IE': 2, 'LT': 2, 'CH': 2, 'US': 2},
+        'sales_channels': {'DE': 'Amazon.de', 'FR': 'Amazon.fr', 'IT': 'Amazon.it', 'ES': 'Amazon.es', 'NL': 'Amazon.nl',
+                        'GB': 'Amazon.co.uk', 'SE': 'Amazon.se', 'PL': 'Amazon.pl'},
+    },
+    'AmazonCOM': {
+        'countries': {'US': 60, 'CA': 15, 'MX': 8, 'BR': 4, 'AU': 5, 'GB': 4, 'DE': 4},
+        'sales_channels': {'US': 'Amazon.com', 'CA': 'Amazon.ca', 'MX': 'Amazon.com.mx'},
+    },
+    'Etsy': {
+        'countries': {'US': 30, 'DE': 12, 'GB': 12, 'FR': 8, 'CA': 6, 'AU': 6, 'IT': 5, 'ES': 4, 'NL': 4, 'SE': 3, 'PL': 2,
+                    'LT': 2, 'HK': 2, 'SG': 2, 'IE': 2},
+        'currencies': {'EUR': 40, 'USD': 30, 'GBP': 12, 'CAD': 5, 'AUD': 5, 'HKD': 2, 'SGD': 2, 'SEK': 2, 'PLN': 2},
+    },
+}
+MARKETPLACE_CURRENCIES = {'Amazon.co.uk': 'GBP', 'Amazon.se': 'SEK', 'Amazon.pl': 'PLN', 'Amazon.com': 'USD', 'Amazon.ca': 'CAD',
+                        'Amazon.com.mx': 'MXN'}
+# older Amazon CA exports use CDN instead of CAD
+CDN_SHARE = 0.3
+FIRST_NAMES = ['John', 'Jane', 'Max', 'Erika', 'José', 'Zoë', 'Jonas', 'Giulia', 'Pierre', 'Ana', 'Björn', 'Li', 'Marta', 'Seán']
+LAST_NAMES = ['Doe', 'Roe', 'Mustermann', 'García', 'Rossi', 'Dubois', 'Kowalski', 'Jonaitis', 'Andersson', "O'Neil", 'Smith', 'Wong']
+STREETS = ['Main Street', 'Hauptstraße', 'Rue de la Paix', 'Via Roma', 'Calle Mayor', 'Gedimino pr.', 'Kungsgatan', 'Baker Street']
+CITIES = ['Berlin', 'Paris', 'Roma', 'Madrid', 'Vilnius', 'Stockholm', 'London', 'New York', 'Toronto', 'Sydney']
+
+
+class SyntheticOrdersGenerator():
+    '''generates realistic, reproducible (seeded) sales channel exports and matching reference workbooks for benchmarks
+    and end-to-end runs without client data. Exports cover multi sku listings (' + ', Etsy ','), inner quantity prefixes
+    ('(3 vnt.) ' Amazon, '3 vnt. ' Etsy), Amazon sku mapping, multi item Amazon orders, repeat buyers, Amazon replacement
+    orders (empty currency, zero prices), all supported currencies and skus without weights.
+
+    main methods:
+    export_orders(source_fpath) - writes Amazon (tab delimited txt) / Etsy (csv) export of orders_count rows
+    export_reference_workbooks(helper_dir) - writes WEIGHTS.xlsx, PRICING.xlsx, Amazon SKU Mapping.xlsx, Storage.xlsm and
+        current fx.json (no ECB request needed on run) to helper_dir
+
+    Args:
+    sales_channel: str
+    orders_count: int
+    seed: (optional) int'''
+
+    def __init__(self, sales_channel:str, orders_count:int, seed:int=DEFAULT_SEED):
+        assert sales_channel in EXPECTED_SALES_CHANNELS, f'Unexpected sales_channel: {sales_channel}'
+        self.sales_channel = sales_channel
+        self.orders_count = orders_count
+        self.random = random.Random(f'{seed}-{sales_channel}')
+        self.market = CHANNEL_MARKETS[sales_channel]
+        self.catalog = self.__get_catalog()
+        self.amazon_skus = self.__get_amazon_skus()
+        self.buyers = [self.__get_buyer() for _ in range(max(10, orders_count * 3 // 4))]
+
+    def __get_catalog(self) -> dict:
+        '''returns {sku: (title, vmdoption, weight)}, skus alike shop skus: numeric ('1040830') and alphanumeric ('T1147')'''
+        catalog = {}
+        while len(catalog) < CATALOG_SIZE:
+            sku = str(self.random.randint(1000000, 1099999)) if self.random.random() < 0.6 else f'{self.random.choice("TWP")}{self.random.randint(100, 9999)}'
+            title, vmdoption, (min_weight, max_weight) = self.random.choice(CATALOG_PRODUCTS)
+            catalog[sku] = (title, vmdoption, self.random.randint(min_weight, max_weight))
+        return catalog
+
+    def __get_amazon_skus(self) -> dict:
+        '''returns {amazon listing sku: custom label} for Amazon SKU Mapping.xlsx, part of labels with inner quantity'''
+        amazon_skus = {}
+        for idx, sku in enumerate(self.random.sample(sorted(self.catalog), CATALOG_SIZE // 4)):
+            custom_label = f'({self.random.choice([2, 3, 5])} vnt.) {sku}' if self.random.random() < 0.3 else sku
+            amazon_skus[f'AZ-{idx:04d}-{self.random.choice("ABCDEFGH")}{self.random.choice("KLMNOPRS")}'] = custom_label
+        return amazon_skus
+
+    def __get_postal_code(self, country_code:str) -> str:
+        postal_format = SHIP_COUNTRIES[country_code][1]
+        return ''.join(str(self.random.randint(0, 9)) if char == '9' else self.random.choice('ABCDEFHJKLMNPRSTW') if char == 'A' else char
+                    for char in postal_format)
+
+    def __get_buyer(self) -> dict:
+        countries = self.market['countries']
+        country_code = self.random.choices(list(countries), weights=list(countries.values()))[0]
+        first_name, last_name = self.random.choice(FIRST_NAMES), self.random.choice(LAST_NAMES)
+        return {'first_name': first_name, 'last_name': last_name, 'country': country_code,
+                'street': f'{self.random.choice(STREETS)} {self.random.randint(1, 250)}',
+                'street_2': f'Apt {self.random.randint(1, 80)}' if self.random.random() < 0.25 else '',
+                'city': self.random.choice(CITIES), 'postal_code': self.__get_postal_code(country_code),
+                'phone': f'+{self.random.randint(1, 99)} {self.random.randint(100, 999)}-{self.random.randint(100, 999)}-{self.random.randint(1000, 9999)}'}
+
+    def __get_repeat_buyer(self) -> dict:
+        '''returns buyer, occasionally with name written differently (case, initial) than in earlier order'''
+        buyer = dict(self.random.choice(self.buyers))
+        variation = self.random.random()
+        if variation < 0.05:
+            buyer['first_name'] = f'{buyer["first_name"][0]}.'
+        elif variation < 0.1:
+            buyer['last_name'] = buyer['last_name'].upper()
+        return buyer
+
+    def __get_amount(self, low:float, high:float) -> str:
+        return f'{self.random.uniform(low, high):.2f}'
+
+    def __get_purchase_date(self) -> datetime:
+        return datetime.now().replace(microsecond=0) - timedelta(minutes=self.random.randint(60, 60 * 24 * 6))
+
+    def __get_amazon_sku(self) -> str:
+        '''returns amazon listing sku: shop sku, mapped amazon sku, with inner quantity or multi listing'''
+        roll = self.random.random()
+        if roll < 0.25:
+            return self.random.choice(list(self.amazon_skus))
+        sku = self.random.choice(list(self.catalog))
+        if roll < 0.4:
+            return f'({self.random.choice([2, 3, 4, 10])} vnt.) {sku}'
+        if roll < 0.5:
+            return f'{sku} + {self.random.choice(list(self.catalog))}'
+        return sku
+
+    def __get_etsy_sku(self, items_count:int) -> str:
+        '''returns etsy sku string: '1 vnt. 1040830 + 1 vnt. 1034630,2 vnt. T1147' '''
+        skus = [f'{self.random.choice([1, 1, 1, 2, 3])} vnt. {self.random.choice(list(self.catalog))}' for _ in range(items_count)]
+        if len(skus) > 1 and self.random.random() < 0.5:
+            return ' + '.join([skus[0], ','.join(skus[1:])])
+        return ','.join(skus)
+
+    def __get_amazon_rows(self) -> list:
+        '''returns export rows, one per order item. Orders of 1-3 items share order-id and buyer data'''
+        rows = []
+        while len(rows) < self.orders_count:
+            buyer = self.__get_repeat_buyer()
+            marketplaces = self.market['sales_channels']
+            # buyers abroad shop in main marketplace
+            inner_sales_channel = marketplaces.get(buyer['country'], next(iter(marketplaces.values())))
+            currency = MARKETPLACE_CURRENCIES.get(inner_sales_channel, 'EUR')
+            currency = 'CDN' if currency == 'CAD' and self.random.random() < CDN_SHARE else currency
+            # replacement orders come with empty currency and zero prices
+            replacement = self.random.random() < 0.01
+            purchase_date = self.__get_purchase_date().strftime('%Y-%m-%dT%H:%M:%S+00:00')
+            order_id = f'{self.random.randint(100, 999)}-{self.random.randint(1000000, 9999999)}-{self.random.randint(1000000, 9999999)}'
+            for _ in range(self.random.choices([1, 2, 3], weights=[85, 12, 3])[0]):
+                sku = self.__get_amazon_sku()
+                title = self.catalog[sku.split(' ')[-1]][0] if sku not in self.amazon_skus else f'{self.catalog[self.amazon_skus[sku].split(" ")[-1]][0]} (listing)'
+                row = dict.fromkeys(AMAZON_EXPORT_HEADERS, '')
+                row.update({
+                    'order-id': order_id, 'order-item-id': str(self.random.randint(10 ** 13, 10 ** 14 - 1)),
+                    'purchase-date': purchase_date, 'payments-date': purchase_date,
+                    'buyer-email': f'{buyer["first_name"][0].lower()}{self.random.randint(100, 99999)}@marketplace.amazon.com',
+                    'buyer-name': f'{buyer["first_name"]} {buyer["last_name"]}',
+                    'buyer-phone-number': buyer['phone'] if self.random.random() < 0.6 else '',
+                    'sku': sku, 'product-name': title, 'quantity-purchased': str(self.random.choices([1, 2, 3], weights=[80, 15, 5])[0]),
+                    'currency': '' if replacement else currency,
+                    'item-price': '0.00' if replacement else self.__get_amount(3, 95),
+                    'item-tax': '0.00' if replacement else self.__get_amount(0, 15),
+                    'shipping-price': '0.00' if replacement else self.random.choice(['0.00', '0.00', '2.99', '4.50', '11.00', '16.00']),
+                    'shipping-tax': '0.00',
+                    'ship-service-level': 'Expedited' if self.random.random() < 0.05 else 'Standard',
+                    'recipient-name': f'{buyer["first_name"]} {buyer["last_name"]}',
+                    'ship-address-1': buyer['street'], 'ship-address-2': buyer['street_2'],
+                    'ship-city': buyer['city'], 'ship-postal-code': buyer['postal_code'], 'ship-country': buyer['country'],
+                    'ship-phone-number': buyer['phone'], 'sales-channel': inner_sales_channel,
+                    'is-business-order': 'false', 'is-sold-by-ab': 'false'})
+                rows.append(row)
+        return rows[:self.orders_count]
+
+    def __get_etsy_rows(self) -> list:
+        '''returns export rows, one per order'''
+        rows = []
+        for order_idx in range(self.orders_count):
+            buyer = self.__get_repeat_buyer()
+            currencies = self.market['currencies']
+            currency = self.random.choices(list(currencies), weights=list(currencies.values()))[0]
+            items_count = self.random.choices([1, 2, 3], weights=[75, 20, 5])[0]
+            order_value = float(self.__get_amount(5, 120))
+            discount = round(order_value * 0.1, 2) if self.random.random() < 0.1 else 0.0
+            shipping = float(self.random.choice(['0.00', '0.00', '3.50', '6.00', '12.00', '25.00']))
+            order_total = round(order_value - discount + shipping, 2)
+            card_fees = round(order_total * 0.04, 2)
+            row = dict.fromkeys(ETSY_EXPORT_HEADERS, '')
+            row.update({
+                'Sale Date': self.__get_purchase_date().strftime('%m/%d/%y'), 'Order ID': str(2500000000 + order_idx),
+                'Buyer User ID': f'{buyer["first_name"].lower()}{self.random.randint(1, 999)}',
+                'Full Name': f'{buyer["first_name"]} {buyer["last_name"]}', 'First Name': buyer['first_name'], 'Last Name': buyer['last_name'],
+                'Number of Items': str(max(items_count, self.random.choices([1, 2, 3], weights=[80, 15, 5])[0])),
+                'Payment Method': 'Other', 'Street 1': buyer['street'], 'Street 2': buyer['street_2'], 'Ship City': buyer['city'],
+                'Ship Zipcode': buyer['postal_code'], 'Ship Country': SHIP_COUNTRIES[buyer['country']][0], 'Currency': currency,
+                'Order Value': f'{order_value:.2f}', 'Discount Amount': f'{discount:.2f}', 'Shipping Discount': '0.00',
+                'Shipping': f'{shipping:.2f}', 'Sales Tax': '0.00', 'Order Total': f'{order_total:.2f}', 'Status': 'Completed',
+                'Card Processing Fees': f'{card_fees:.2f}', 'Order Net': f'{order_total - card_fees:.2f}',
+                'Adjusted Order Total': '--', 'Adjusted Card Processing Fees': '--', 'Adjusted Net Order Amount': '--',
+                'Buyer': f'{buyer["first_name"]} {buyer["last_name"]}', 'Order Type': 'online', 'Payment Type': 'online_cc',
+                'SKU': self.__get_etsy_sku(items_count)})
+            rows.append(row)
+        return rows
+
+    def export_orders(self, source_fpath:str) -> str:
+        '''writes orders export in sales channel format, returns source_fpath'''
+        if self.sales_channel == 'Etsy':
+            headers, delimiter, rows = ETSY_EXPORT_HEADERS, ',', self.__get_etsy_rows()
+        else:
+            headers, delimiter, rows = AMAZON_EXPORT_HEADERS, '\t', self.__get_amazon_rows()
+        proxy_keys = ETSY_KEYS if self.sales_channel == 'Etsy' else AMAZON_KEYS
+        assert proxy_keys['sku'] in headers and proxy_keys['order-id'] in headers, 'Export headers do not match proxy keys'
+        with open(source_fpath, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=headers, delimiter=delimiter)
+            writer.writeheader()
+            writer.writerows(rows)
+        return source_fpath
+
+    def export_reference_workbooks(self, helper_dir:str):
+        '''writes reference workbooks and fx rates matching generated orders to helper_dir'''
+        self.__export_weights_wb(os.path.join(helper_dir, WB_NAME))
+        self.__export_pricing_wb(os.path.join(helper_dir, PRICING_WB))
+        self.__export_mapping_wb(os.path.join(helper_dir, READ_EXCEL_CONFIG['SKU_MAPPING']['wb_name']))
+        self.__export_storage_wb(os.path.join(helper_dir, READ_EXCEL_CONFIG['SKU_BRAND']['wb_name']))
+        self.__export_fx_rates(os.path.join(helper_dir, RATES_JSON))
+
+    def __export_weights_wb(self, wb_path:str):
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = 'Weight'
+        ws.append(['SKU', 'Title', 'Weight', 'Package DP', 'Package LP', 'VMD'])
+        for sku, (title, vmdoption, weight) in self.catalog.items():
+            if self.random.random() < MISSING_WEIGHT_SHARE:
+                continue
+            ws.append([sku, title, weight, self.random.choice([5, 10, 15]), self.random.choice([15, 20, 40]), vmdoption])
+        wb.save(wb_path)
+
+    def __export_pricing_wb(self, wb_path:str):
+        '''writes PrTracked, PrUntracked sheets: column A - countries, service segments of columns with vmdoption (row 2)
+        and ascending weight limits (row 3), prices from row 4. Few prices missing or not numeric, as in client workbook'''
+        segments = {'NL': {'VKS': [50, 100], 'MKS': [250, 500, 1000], 'DKS': [2000]},
+                    'LP': {'VKS': [20, 50, 100], 'MKS': [500, 1000], 'DKS': [2000, 5000]},
+                    'DP': {'MKS': [100, 250, 500, 1000], 'DKS': [2000]},
+                    'ETONAS': {'MKS': [500, 1000], 'DKS': [2000, 3000]},
+                    'DPD': {'DKS': [1000, 5000, 10000]},
+                    'UPS': {'DKS': [2000, 10000]}}
+        countries = sorted(SHIP_COUNTRIES)
+        wb = openpyxl.Workbook()
+        wb.remove(wb.active)
+        for ws_name in ['PrTracked', 'PrUntracked']:
+            ws = wb.create_sheet(ws_name)
+            ws.cell(row=1, column=1).value = 'Country'
+            for row, country_code in enumerate(countries, start=4):
+                ws.cell(row=row, column=1).value = country_code
+            col = 2
+            for service in ALLOWED_SERVICE_QUERIES:
+                ws.cell(row=1, column=col).value = service
+                for vmdoption, weight_limits in segments[service].items():
+                    for weight_limit in weight_limits:
+                        ws.cell(row=2, column=col).value = vmdoption
+                        ws.cell(row=3, column=col).value = weight_limit
+                        for row in range(4, len(countries) + 4):
+                            roll = self.random.random()
+                            if roll > 0.05:
+                                ws.cell(row=row, column=col).value = round(self.random.uniform(1, 20) + weight_limit / 500, 2) if roll > 0.07 else 'n/a'
+                        col += 1
+                # empty column separates segments
+                col += 1
+        wb.save(wb_path)
+
+    def __export_mapping_wb(self, wb_path:str):
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = READ_EXCEL_CONFIG['SKU_MAPPING']['ws_name']
+        ws.append(['Amazon SKU', 'Shop4Top Custom Label', 'Item Title'])
+        for amazon_sku, custom_label in self.amazon_skus.items():
+            ws.append([amazon_sku, custom_label, self.catalog[custom_label.split(' ')[-1]][0]])
+        wb.save(wb_path)
+
+    def __export_storage_wb(self, wb_path:str):
+        '''Storage sheet without headers: A - sku, B - brand (used for orders not categorized by title)'''
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = READ_EXCEL_CONFIG['SKU_BRAND']['ws_name']
+        for sku in self.catalog:
+            ws.append([sku, self.random.choice(STORAGE_BRANDS)])
+        wb.save(wb_path)
+
+    def __export_fx_rates(self, json_path:str):
+        '''fx.json dated with latest ECB publication: rates are current, run makes no ECB request'''
+        rates = {currency: round(FX_BASE_RATES[currency] * self.random.uniform(1 - FX_RATE_JITTER, 1 + FX_RATE_JITTER), 4)
+                for currency in SUPPORTED_CURRENCIES if currency != 'CDN'}
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({'last_updated': get_latest_publication_date().isoformat(), 'currencies': rates}, f, indent=4)
+
+
+def create_workspace(workspace_dir:str, sales_channel:str, orders_count:int, seed:int=DEFAULT_SEED) -> str:
+    '''creates client like folder: orders export in workspace_dir, reference workbooks in its Helper Files subfolder.
+    Run parser with ORDERS_PARSER_HELPER_DIR (file_utils.HELPER_DIR_ENV_VAR) pointing to it. Returns orders export path'''
+    helper_dir = os.path.join(workspace_dir, HELPER_FILES_DIR)
+    os.makedirs(helper_dir, exist_ok=True)
+    generator = SyntheticOrdersGenerator(sales_channel, orders_count, seed)
+    generator.export_reference_workbooks(helper_dir)
+    export_ext = 'csv' if sales_channel == 'Etsy' else 'txt'
+    return generator.export_orders(os.path.join(workspace_dir, f'{sales_channel} synthetic {orders_count}.{export_ext}'))
+
+
+if __name__ == '__main__':
+    # usage: python synthetic_data.py <workspace dir> <sales channel> <orders count> [seed]
+    seed = int(sys.argv[4]) if len(sys.argv) > 4 else DEFAULT_SEED
+    print(create_workspace(sys.argv[1], sys.argv[2], int(sys.argv[3]), seed))
@@ -0,0 +1,39 @@
+from copy import deepcopy
+import pytest
+import sys
+import os
+
+# tests import Helper Files modules by bare name, as modules import each other
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_data import SyntheticOrdersGenerator, HELPER_FILES_DIR
+from file_utils import HELPER_DIR_ENV_VAR
+from output_capture import capture_output
+from pipeline import get_cleaned_orders
+from weights import OrderData
+
+
+# GLOBAL VARIABLES
+TEST_ORDERS_COUNT = 60
+
+
+@pytest.fixture
+def helper_dir(tmp_path, monkeypatch) -> str:
+    '''empty Helper Files folder of temporary workspace, parser reads / writes its files there (file_utils.HELPER_DIR_ENV_VAR)'''
+    helper_dir = tmp_path / HELPER_FILES_DIR
+    helper_dir.mkdir()
+    monkeypatch.setenv(HELPER_DIR_ENV_VAR, str(helper_dir))
+    return str(helper_dir)
+
+@pytest.fixture
+def source_fpath(helper_dir) -> str:
+    '''synthetic AmazonEU orders export in workspace, reference workbooks and current fx.json in its Helper Files'''
+    generator = SyntheticOrdersGenerator('AmazonEU', TEST_ORDERS_COUNT)
+    generator.export_reference_workbooks(helper_dir)
+    return generator.export_orders(os.path.join(os.path.dirname(helper_dir), 'orders export.txt'))
+
+@pytest.fixture
+def enriched_orders(source_fpath) -> list:
+    '''synthetic AmazonEU orders after enrichment stage (weights, prices in EUR, shipping service), offline'''
+    with capture_output():
+        return OrderData(deepcopy(get_cleaned_orders(source_fpath, 'AmazonEU')), 'AmazonEU', offline=True).add_orders_data()
@@ -0,0 +1,15 @@
+from complexity_check import ComplexityCheck
+import pytest
+
+
+# GLOBAL VARIABLES
+# small sizes keep test run short. Stages are judged by call count exponent: deterministic, timings of loaded machine are not
+TEST_SIZES = [250, 500, 1000]
+
+
+@pytest.mark.parametrize('sales_channel', ['AmazonEU', 'Etsy'])
+def test_stages_scale_linearly(sales_channel):
+    check = ComplexityCheck(sales_channel, TEST_SIZES, use_timings=False)
+    results = check.run()
+    failed_stages = [stage for stage, result in results.items() if not result['passed']]
+    assert not failed_stages, check.report(results)
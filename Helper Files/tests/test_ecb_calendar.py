@@ -0,0 +1,45 @@
+from ecb_calendar import get_easter_sunday, is_target_business_day, get_latest_publication_date, new_rates_expected
+from datetime import datetime, date, timedelta, timezone
+import pytest
+
+
+def utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_easter_sunday():
+    assert [get_easter_sunday(year) for year in (2022, 2024, 2025, 2038)] == [date(2022, 4, 17), date(2024, 3, 31), date(2025, 4, 20), date(2038, 4, 25)]
+
+@pytest.mark.parametrize('day', [date(2024, 3, 23), date(2024, 3, 24), date(2024, 1, 1), date(2024, 3, 29), date(2024, 4, 1),
+                                date(2024, 5, 1), date(2024, 12, 25), date(2024, 12, 26)])
+def test_weekends_and_target_holidays_are_closed(day):
+    assert not is_target_business_day(day)
+
+@pytest.mark.parametrize('day', [date(2024, 3, 25), date(2024, 3, 28), date(2024, 4, 2), date(2024, 12, 24), date(2024, 12, 31)])
+def test_business_days(day):
+    assert is_target_business_day(day)
+
+def test_latest_publication_date():
+    # Tuesday before / after publication hour
+    assert get_latest_publication_date(utc(2024, 3, 26, 14, 59)) == date(2024, 3, 25)
+    assert get_latest_publication_date(utc(2024, 3, 26, 15, 0)) == date(2024, 3, 26)
+    # Monday morning: Friday rates
+    assert get_latest_publication_date(utc(2024, 3, 25, 9, 0)) == date(2024, 3, 22)
+    # Easter Monday: Thursday before Good Friday
+    assert get_latest_publication_date(utc(2024, 4, 1, 18, 0)) == date(2024, 3, 28)
+    # aware non UTC datetime is converted: 16:30 CEST is 14:30 UTC
+    assert get_latest_publication_date(datetime(2024, 3, 26, 16, 30, tzinfo=timezone(timedelta(hours=2)))) == date(2024, 3, 25)
+
+def test_no_polling_on_weekend_holidays_and_before_publication():
+    friday_rates = date(2024, 3, 22)
+    assert not new_rates_expected(friday_rates, utc(2024, 3, 23, 12, 0))
+    assert not new_rates_expected(friday_rates, utc(2024, 3, 25, 14, 59))
+    assert new_rates_expected(friday_rates, utc(2024, 3, 25, 15, 0))
+    pre_easter_rates = date(2024, 3, 28)
+    assert not new_rates_expected(pre_easter_rates, utc(2024, 3, 29, 18, 0))
+    assert not new_rates_expected(pre_easter_rates, utc(2024, 4, 1, 18, 0))
+    assert not new_rates_expected(pre_easter_rates, utc(2024, 4, 2, 14, 0))
+    assert new_rates_expected(pre_easter_rates, utc(2024, 4, 2, 15, 30))
+    christmas_eve_rates = date(2024, 12, 24)
+    assert not new_rates_expected(christmas_eve_rates, utc(2024, 12, 26, 20, 0))
+    assert new_rates_expected(christmas_eve_rates, utc(2024, 12, 27, 15, 0))
@@ -0,0 +1,36 @@
+from export_scheduler import ExportScheduler
+import export_scheduler
+import logging
+import os
+
+
+def test_xlsx_exports_run_in_worker_processes(enriched_orders, helper_dir, monkeypatch, caplog):
+    '''process pool path, forced on single core machines: xlsx exports in spawned workers, their INFO lines replayed by parent'''
+    monkeypatch.setattr(export_scheduler, 'XLSX_PROCESS_MIN_ORDERS', 1)
+    scheduler = ExportScheduler('AmazonEU')
+    scheduler.use_processes = True
+    export_paths = {carrier: os.path.join(helper_dir, f'{carrier} export.{ext}') for carrier, ext in [('etonas', 'xlsx'), ('nlpost', 'xlsx'), ('dp', 'csv')]}
+    for carrier, export_path in export_paths.items():
+        scheduler.add_carrier_job(carrier, enriched_orders, export_path)
+    assert [in_process for _, in_process, _, _ in scheduler.jobs] == [True, True, False]
+
+    with caplog.at_level(logging.INFO):
+        assert scheduler.run()
+
+    assert all(os.path.exists(export_path) for export_path in export_paths.values())
+    assert f'XLSX {export_paths["etonas"]} created. Orders inside: {len(enriched_orders)}' in caplog.messages
+    assert 'Export job etonas export succeeded' in caplog.text
+    assert '(process)' in caplog.text and '(thread)' in caplog.text
+
+def test_worker_log_level_follows_parent(enriched_orders, helper_dir, monkeypatch, caplog):
+    '''worker logging is configured by pool initializer: library callers at WARNING level get no worker INFO lines, at INFO - get them'''
+    monkeypatch.setattr(export_scheduler, 'XLSX_PROCESS_MIN_ORDERS', 1)
+    export_path = os.path.join(helper_dir, 'etonas export.xlsx')
+    for level, expect_info in [(logging.WARNING, False), (logging.INFO, True)]:
+        scheduler = ExportScheduler('AmazonEU')
+        scheduler.use_processes = True
+        scheduler.add_carrier_job('etonas', enriched_orders, export_path)
+        caplog.clear()
+        with caplog.at_level(level):
+            assert scheduler.run()
+        assert any(message.startswith('XLSX ') for message in caplog.messages) == expect_info
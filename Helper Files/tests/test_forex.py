@@ -0,0 +1,168 @@
+from forex import Forex, parse_ecb_daily_rates, RATES_JSON, SUPPORTED_CURRENCIES, VBA_FOREX_ALERT
+from ecb_standin import ECBStandIn, SAMPLE_LAST_MODIFIED
+from ecb_calendar import get_latest_publication_date
+from output_capture import capture_output
+from file_utils import read_json_to_obj
+from errors import NoFxRatesError
+from datetime import date
+import pytest
+import json
+import time
+import os
+
+
+# GLOBAL VARIABLES
+# saved ECB responses: daily xml, its variations, 90 day history xml, non xml maintenance page
+ECB_PAYLOADS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ecb payloads')
+# rates of day before stand-in payload (2022-09-30): ECB has newer rates by now
+STALE_RATES = {'last_updated': '2022-09-29', 'currencies': {'USD': 0.9706, 'GBP': 0.8976, 'CAD': 1.3357, 'AUD': 1.5035, 'HKD': 7.6190,
+            'SGD': 1.3949, 'SEK': 10.9069, 'PLN': 4.8135, 'MXN': 19.6300}}
+
+
+def write_cached_rates(helper_dir:str, rates:dict) -> str:
+    json_path = os.path.join(helper_dir, RATES_JSON)
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(rates, f)
+    return json_path
+
+
+def test_cached_rates_served_while_refresh_runs_in_background(helper_dir):
+    json_path = write_cached_rates(helper_dir, STALE_RATES)
+    with ECBStandIn(delay=1) as ecb:
+        start_time = time.perf_counter()
+        fx = Forex(ecb_url=ecb.url)
+        assert time.perf_counter() - start_time < 0.5
+        assert fx.rates == STALE_RATES['currencies']
+        assert fx.refresh_thread.is_alive()
+        with capture_output() as captured:
+            fx.finish_refresh(timeout=5)
+    assert not fx.refresh_thread.is_alive()
+    assert captured.alerts == []
+    # fresh rates saved for next run, current run keeps converting at cached ones
+    assert read_json_to_obj(json_path)['last_updated'] == '2022-09-30'
+    assert fx.rates == STALE_RATES['currencies']
+
+def test_blocks_on_download_only_without_cached_rates(helper_dir):
+    with ECBStandIn(delay=0.5) as ecb:
+        start_time = time.perf_counter()
+        fx = Forex(ecb_url=ecb.url)
+        assert time.perf_counter() - start_time >= 0.5
+    assert fx.refresh_thread is None
+    assert fx.rates['USD'] == 0.9748 and fx.rates['GBP'] == 0.883
+    assert read_json_to_obj(os.path.join(helper_dir, RATES_JSON))['last_updated'] == '2022-09-30'
+
+def test_failed_initial_download_raises(helper_dir):
+    with ECBStandIn(status=500) as ecb:
+        with pytest.raises(NoFxRatesError):
+            Forex(ecb_url=ecb.url)
+    assert not os.path.exists(os.path.join(helper_dir, RATES_JSON))
+
+def test_failed_refresh_is_alerted(helper_dir):
+    json_path = write_cached_rates(helper_dir, STALE_RATES)
+    with ECBStandIn(status=500) as ecb:
+        fx = Forex(ecb_url=ecb.url)
+        with capture_output() as captured:
+            fx.finish_refresh()
+    assert captured.alerts == [VBA_FOREX_ALERT]
+    assert fx.rates == STALE_RATES['currencies']
+    assert read_json_to_obj(json_path) == STALE_RATES
+
+def test_timed_out_refresh_is_alerted(helper_dir):
+    write_cached_rates(helper_dir, STALE_RATES)
+    with ECBStandIn(delay=1) as ecb:
+        fx = Forex(ecb_url=ecb.url)
+        with capture_output() as captured:
+            fx.finish_refresh(timeout=0.1)
+        # refresh must not outlive workspace of test
+        fx.refresh_thread.join()
+    assert captured.alerts == [VBA_FOREX_ALERT]
+
+def test_not_modified_response_keeps_cached_rates(helper_dir):
+    '''validators of downloaded xml are saved to fx.json, sent back on next run: 304 keeps cached rates and validators'''
+    json_path = os.path.join(helper_dir, RATES_JSON)
+    with ECBStandIn() as ecb:
+        Forex(ecb_url=ecb.url)
+        cached_rates = read_json_to_obj(json_path)
+        assert cached_rates['etag'] == ecb.etag
+        assert cached_rates['last_modified'] == SAMPLE_LAST_MODIFIED
+
+        fx = Forex(ecb_url=ecb.url)
+        with capture_output() as captured:
+            fx.finish_refresh()
+        _, request_headers = ecb.requests_served[-1]
+    assert request_headers['If-None-Match'] == cached_rates['etag']
+    assert request_headers['If-Modified-Since'] == SAMPLE_LAST_MODIFIED
+    assert ecb.not_modified_served == 1
+    assert captured.alerts == []
+    assert fx.rates == cached_rates['currencies']
+    assert read_json_to_obj(json_path) == cached_rates
+
+def test_not_modified_since_last_modified_validator(helper_dir):
+    json_path = write_cached_rates(helper_dir, {**STALE_RATES, 'etag': '', 'last_modified': SAMPLE_LAST_MODIFIED})
+    with ECBStandIn() as ecb:
+        fx = Forex(ecb_url=ecb.url)
+        fx.finish_refresh()
+        _, request_headers = ecb.requests_served[-1]
+    assert 'If-None-Match' not in request_headers
+    assert ecb.not_modified_served == 1
+    assert read_json_to_obj(json_path)['last_modified'] == SAMPLE_LAST_MODIFIED
+
+def test_no_request_when_cached_rates_are_latest(helper_dir):
+    write_cached_rates(helper_dir, {**STALE_RATES, 'last_updated': get_latest_publication_date().isoformat()})
+    with ECBStandIn() as ecb:
+        fx = Forex(ecb_url=ecb.url)
+    assert fx.refresh_thread is None
+    assert ecb.requests_served == []
+
+def read_payload(fname:str) -> bytes:
+    with open(os.path.join(ECB_PAYLOADS_DIR, fname), 'rb') as f:
+        return f.read()
+
+def test_parse_daily_rates():
+    rates = parse_ecb_daily_rates(read_payload('eurofxref-daily.xml'))
+    assert rates == {'last_updated': '2022-09-30', 'currencies': {'USD': 0.9748, 'GBP': 0.883, 'PLN': 4.8483, 'SEK': 10.9335,
+                    'AUD': 1.5076, 'CAD': 1.3401, 'HKD': 7.6522, 'MXN': 19.6393, 'SGD': 1.3996}}
+
+def test_parse_skips_unsupported_and_logs_missing_currencies(caplog):
+    rates = parse_ecb_daily_rates(read_payload('eurofxref-daily missing currencies.xml'))
+    assert set(rates['currencies']) == {'USD', 'GBP', 'PLN', 'SEK', 'AUD', 'CAD', 'SGD'}
+    assert "['HKD', 'MXN'] missing" in caplog.text
+
+def test_parse_stops_once_supported_currencies_are_collected():
+    # payload cut off after last supported currency: rest of xml is never read
+    rates = parse_ecb_daily_rates(read_payload('eurofxref-daily truncated.xml'))
+    assert rates['last_updated'] == '2022-09-30' and len(rates['currencies']) == len(SUPPORTED_CURRENCIES) - 1
+
+def test_parse_stops_at_next_date():
+    '''latest date of history xml misses MXN: rate of older date is not picked up'''
+    rates = parse_ecb_daily_rates(read_payload('eurofxref-hist-90d latest incomplete.xml'))
+    assert rates['last_updated'] == '2022-09-30'
+    assert rates['currencies']['USD'] == 0.9748 and 'MXN' not in rates['currencies']
+
+@pytest.mark.parametrize('fname', ['maintenance page.xml', 'eurofxref-daily no date.xml'])
+def test_parse_malformed_xml_raises(fname):
+    with pytest.raises(ValueError):
+        parse_ecb_daily_rates(read_payload(fname))
+
+def test_parse_broken_xml_raises():
+    with pytest.raises(ValueError):
+        parse_ecb_daily_rates(read_payload('eurofxref-daily.xml').replace(b"<Cube time=", b"<Cube <time="))
+
+def test_malformed_payload_keeps_cached_rates(helper_dir):
+    write_cached_rates(helper_dir, STALE_RATES)
+    with ECBStandIn(payload=read_payload('maintenance page.xml').decode('utf-8')) as ecb:
+        fx = Forex(ecb_url=ecb.url)
+        with capture_output() as captured:
+            fx.finish_refresh()
+    assert captured.alerts == [VBA_FOREX_ALERT]
+    assert read_json_to_obj(os.path.join(helper_dir, RATES_JSON)) == STALE_RATES
+
+def test_background_refresh_does_not_change_rates_of_current_run(helper_dir):
+    '''orders dated on new publication date convert at same rate before and after refresh, new rate is saved for next run'''
+    write_cached_rates(helper_dir, STALE_RATES)
+    with ECBStandIn() as ecb:
+        fx = Forex(ecb_url=ecb.url)
+        fx.finish_refresh(timeout=5)
+    assert fx.get_rate_on_date('USD', date(2022, 9, 30)) == STALE_RATES['currencies']['USD']
+    next_run_fx = Forex(allow_network=False)
+    assert next_run_fx.get_rate_on_date('USD', date(2022, 9, 30)) == 0.9748
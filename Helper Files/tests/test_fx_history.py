@@ -0,0 +1,71 @@
+from fx_history import FxHistory, FX_HISTORY_DIR
+from forex import Forex, RATES_JSON
+from errors import NoFxRatesError
+from datetime import date
+import logging
+import shutil
+import pytest
+import json
+import os
+
+
+# GLOBAL VARIABLES
+# history of 2022-09-29 and 2022-09-30 (latest date has no MXN rate)
+HISTORY_PAYLOAD = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ecb payloads', 'eurofxref-hist-90d latest incomplete.xml')
+CACHED_RATES = {'last_updated': '2022-09-30', 'currencies': {'USD': 0.9748, 'GBP': 0.883, 'PLN': 4.8483, 'SEK': 10.9335,
+                'AUD': 1.5076, 'CAD': 1.3401, 'HKD': 7.6522, 'SGD': 1.3996}}
+
+
+@pytest.fixture
+def seeded_helper_dir(helper_dir) -> str:
+    os.mkdir(os.path.join(helper_dir, FX_HISTORY_DIR))
+    shutil.copy(HISTORY_PAYLOAD, os.path.join(helper_dir, FX_HISTORY_DIR))
+    return helper_dir
+
+def write_cached_rates(helper_dir:str):
+    with open(os.path.join(helper_dir, RATES_JSON), 'w', encoding='utf-8') as f:
+        json.dump(CACHED_RATES, f)
+
+
+def test_rates_on_and_after_stored_dates(seeded_helper_dir):
+    history = FxHistory(['USD', 'MXN'])
+    assert history.get_rate('USD', date(2022, 9, 29)) == 0.9706
+    assert history.get_rate('USD', date(2022, 9, 30)) == 0.9748
+    # weekend: latest business day before
+    assert history.get_rate('USD', date(2022, 10, 2)) == 0.9748
+    assert history.get_rate('MXN', date(2022, 9, 30)) == 19.5912
+    assert history.get_earliest_rate('USD') == (date(2022, 9, 29), 0.9706)
+
+def test_no_rate_before_stored_dates(seeded_helper_dir):
+    history = FxHistory(['USD'])
+    assert history.get_rate('USD', date(2022, 9, 28)) is None
+    assert history.get_rate('JPY', date(2022, 9, 30)) is None
+    assert history.get_earliest_rate('JPY') == (None, None)
+
+def test_history_saved_and_seeded_once(seeded_helper_dir):
+    FxHistory(['USD'])
+    history = FxHistory(['USD'])
+    assert history.seeded_files == {os.path.basename(HISTORY_PAYLOAD): history.seeded_files[os.path.basename(HISTORY_PAYLOAD)]}
+    assert history.get_rate('USD', date(2022, 9, 29)) == 0.9706
+
+def test_date_before_history_is_not_converted_at_current_rate(seeded_helper_dir, caplog):
+    '''dates preceding history get earliest (nearest) stored rate, not latest cached one, gap is logged once per currency'''
+    write_cached_rates(seeded_helper_dir)
+    fx = Forex(allow_network=False)
+    with caplog.at_level(logging.WARNING):
+        assert fx.get_rate_on_date('USD', date(2022, 9, 1)) == 0.9706
+        assert fx.get_rate_on_date('USD', date(2022, 8, 1)) == 0.9706
+    assert fx.get_rate_on_date('USD', date(2022, 9, 30)) == fx.get_rate_on_date('USD') == 0.9748
+    assert len([message for message in caplog.messages if 'USD rates history starts on 2022-09-29' in message]) == 1
+
+def test_cached_rates_cover_dates_without_history(helper_dir):
+    write_cached_rates(helper_dir)
+    fx = Forex(allow_network=False)
+    assert fx.convert_to_eur(97.48, 'USD', date(2022, 10, 5)) == 100.0
+    assert fx.convert_to_eur(97.48, 'USD', date(2022, 9, 5)) == 100.0
+
+def test_currency_without_any_rates_raises(helper_dir):
+    write_cached_rates(helper_dir)
+    fx = Forex(allow_network=False)
+    with pytest.raises(NoFxRatesError):
+        fx.get_rate_on_date('MXN', date(2022, 9, 30))
@@ -0,0 +1,32 @@
+from metrics import RunMetrics, RUN_METRICS_DIR
+from file_utils import read_json_to_obj
+import metrics
+import time
+import os
+
+
+def test_write_spans_and_counters(helper_dir):
+    run_metrics = RunMetrics()
+    with run_metrics.span('enrichment'):
+        with run_metrics.span('pricing'):
+            run_metrics.count('pricing lookups', 3)
+    run_metrics.add_span('exports/dp export', 0.5, 0.25)
+    written = read_json_to_obj(run_metrics.write('AmazonEU'))
+    assert [span['name'] for span in written['spans']] == ['enrichment/pricing', 'enrichment', 'exports/dp export']
+    assert written['counters'] == {'pricing lookups': 3}
+
+def test_run_files_kept_for_months(helper_dir, monkeypatch):
+    '''files are pruned by age only, however many runs were made'''
+    monkeypatch.setattr(metrics, 'RUN_METRICS_MAX_AGE_DAYS', 60)
+    metrics_dir = os.path.join(helper_dir, RUN_METRICS_DIR)
+    os.makedirs(metrics_dir)
+    for days_ago in range(0, 90, 1):
+        for sales_channel in ['AmazonEU', 'AmazonCOM', 'Etsy']:
+            fpath = os.path.join(metrics_dir, f'{sales_channel} {days_ago} days ago.json')
+            with open(fpath, 'w', encoding='utf-8') as f:
+                f.write('{}')
+            os.utime(fpath, (time.time() - days_ago * 86400 - 3600,) * 2)
+    RunMetrics().write('Etsy')
+    # 60 days of 3 runs a day (days 0..59) and current run
+    assert len(os.listdir(metrics_dir)) == 60 * 3 + 1
+    assert not os.path.exists(os.path.join(metrics_dir, 'Etsy 60 days ago.json'))
@@ -0,0 +1,26 @@
+from pipeline import process_orders, VBA_OK, VBA_NO_NEW_JOB
+from forex import Forex, RATES_JSON, VBA_FOREX_ALERT
+from ecb_standin import ECBStandIn
+from functools import partial
+import pipeline
+import json
+import os
+
+
+def test_failed_fx_refresh_alerted_on_every_exit(source_fpath, helper_dir, monkeypatch):
+    '''background fx refresh is finished on exported and on no new orders runs alike'''
+    json_path = os.path.join(helper_dir, RATES_JSON)
+    with open(json_path, 'r', encoding='utf-8') as f:
+        rates = json.load(f)
+    rates['last_updated'] = '2022-09-29'
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(rates, f)
+
+    with ECBStandIn(status=500) as ecb:
+        monkeypatch.setattr(pipeline, 'Forex', partial(Forex, ecb_url=ecb.url))
+        first_run = process_orders(source_fpath, 'AmazonEU')
+        repeated_run = process_orders(source_fpath, 'AmazonEU')
+    assert first_run.status == VBA_OK
+    assert repeated_run.status == VBA_NO_NEW_JOB
+    assert first_run.get_vba_output()[-2:] == [VBA_FOREX_ALERT, VBA_OK]
+    assert repeated_run.get_vba_output() == [VBA_FOREX_ALERT, VBA_NO_NEW_JOB]
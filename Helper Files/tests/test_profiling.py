@@ -0,0 +1,39 @@
+from profiling import RunProfiler, PROFILES_DIR, get_profile_mode, strip_profile_arg
+import profiling
+import pytest
+import time
+import os
+
+
+def test_profile_mode_from_last_argument(monkeypatch):
+    monkeypatch.delenv(profiling.PROFILE_ENV_VAR, raising=False)
+    assert get_profile_mode(['main.py', 'orders.txt', 'AmazonEU', 'False', 'PROFILE_MEMORY']) == 'memory'
+    assert get_profile_mode(['main.py', 'orders.txt', 'AmazonEU', 'False']) is None
+    assert strip_profile_arg(['main.py', 'orders.txt', 'PROFILE']) == ['main.py', 'orders.txt']
+    monkeypatch.setenv(profiling.PROFILE_ENV_VAR, 'profile')
+    assert get_profile_mode(['main.py']) == 'cpu'
+
+def test_reports_written_on_error(helper_dir):
+    def failing_run():
+        raise ValueError('run failed')
+    with pytest.raises(ValueError):
+        RunProfiler('memory').run(failing_run)
+    assert len(os.listdir(os.path.join(helper_dir, PROFILES_DIR))) == 3
+
+def test_reports_of_old_runs_deleted(helper_dir, monkeypatch):
+    '''reports of same run (shared timestamp prefix) are kept or deleted together'''
+    monkeypatch.setattr(profiling, 'PROFILES_KEEP_COUNT', 2)
+    profiles_dir = os.path.join(helper_dir, PROFILES_DIR)
+    os.makedirs(profiles_dir)
+    old_prefixes = [f'2022.09.{day:02d} 10.00.00' for day in range(1, 4)]
+    for days_ago, prefix in zip(range(3, 0, -1), old_prefixes):
+        for suffix in ['.pstats', ' summary.txt']:
+            fpath = os.path.join(profiles_dir, f'{prefix}{suffix}')
+            with open(fpath, 'w', encoding='utf-8') as f:
+                f.write('')
+            os.utime(fpath, (time.time() - days_ago * 86400,) * 2)
+    profiler = RunProfiler('cpu')
+    assert profiler.run(sum, [1, 2]) == 3
+    kept_prefixes = {fname[:len(profiler.fname_prefix)] for fname in os.listdir(profiles_dir)}
+    assert kept_prefixes == {old_prefixes[-1], profiler.fname_prefix}
+    assert len(os.listdir(profiles_dir)) == 4
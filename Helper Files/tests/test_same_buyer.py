@@ -0,0 +1,37 @@
+from order_record import OrderRecord, RECORD_FIELDS
+from same_buyer import SameBuyerDetector, tokens_compatible, get_name_tokens
+
+
+def make_order(recipient_name:str, address:str, postal_code:str='10115', phone:str='') -> OrderRecord:
+    order = OrderRecord([''] * len(RECORD_FIELDS))
+    order.update({'recipient_name': recipient_name, 'ship_address_1': address, 'ship_postal_code': postal_code,
+                'ship_country': 'DE', 'buyer_phone_number': phone})
+    return order
+
+def get_groups(orders:list) -> list:
+    '''returns sorted lists of recipient names of detected groups'''
+    return sorted(sorted(order.recipient_name for order in group) for group in SameBuyerDetector().get_same_buyer_orders(orders).values())
+
+
+def test_tokens_compatible():
+    assert tokens_compatible(get_name_tokens('J. Doe'), get_name_tokens('John Doe'))
+    assert tokens_compatible(get_name_tokens('Doe, John'), get_name_tokens('john doe'))
+    assert not tokens_compatible(get_name_tokens('Jane Doe'), get_name_tokens('José Doe'))
+    assert not tokens_compatible(get_name_tokens('J. D.'), get_name_tokens('John Doe'))
+
+def test_exact_names_grouped_across_addresses():
+    orders = [make_order('John Doe', 'Main St 1'), make_order('Max Muster', 'Other St 5'), make_order('JOHN DÖE', 'Far Rd 9', '80331')]
+    assert get_groups(orders) == [['JOHN DÖE', 'John Doe']]
+
+def test_fuzzy_names_grouped_by_address_or_phone():
+    orders = [make_order('John Doe', 'Main St 1'), make_order('J. Doe', 'Main St 1'),
+            make_order('Max Muster', 'Other St 5', phone='0170 1234567'), make_order('M Muster', 'Far Rd 9', '80331', phone='0170-1234567 ')]
+    assert get_groups(orders) == [['J. Doe', 'John Doe'], ['M Muster', 'Max Muster']]
+
+def test_exact_name_does_not_bridge_incompatible_buyers():
+    '''each 'J. Doe' shares address with different buyer: 'Jane Doe' and 'José Doe' must not end up in one group'''
+    orders = [make_order('Jane Doe', 'Main St 1'), make_order('José Doe', 'Other St 5'),
+            make_order('J. Doe', 'Main St 1'), make_order('J. Doe', 'Other St 5')]
+    groups = get_groups(orders)
+    assert not any('Jane Doe' in group and 'José Doe' in group for group in groups)
+    assert ['J. Doe', 'J. Doe', 'Jane Doe'] in groups
@@ -1,408 +1,119 @@
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import NamedStyle
+from copy import copy
+from openpyxl.utils import get_column_letter
 import logging
-import sys
 import openpyxl
-from parser_utils import get_origin_country, get_sales_channel_hs_code
-from parser_constants import NLPOST_HEADERS, NLPOST_HEADERS_MAPPING, NLPOST_FIXED_VALUES
-from parser_constants import ETONAS_HEADERS, ETONAS_HEADERS_MAPPING
-from parser_constants import DPDUPS_HEADERS, DPDUPS_HEADERS_MAPPING
 
 
 # GLOBAL VARIABLES
-ETONAS_CHARLIMIT_PER_CELL = 32
-NLPOST_CHARLIMIT_PER_CELL = 90
-VBA_ERROR_ALERT = 'ERROR_CALL_DADDY'
-VBA_ETONAS_CHARTLIMIT_ALERT = 'ETONAS_CHARLIMIT_WARNING'
-VBA_NLPOST_CHARTLIMIT_ALERT = 'NLPOST_CHARLIMIT_WARNING'
-VBA_MISSING_WEIGHT_DATA_ALERT = 'ETONAS/NLPOST MISSING_WEIGHT_WARNING'
-HEADER_SETTINGS = {'etonas': {'headers' : ETONAS_HEADERS, 'mapping': ETONAS_HEADERS_MAPPING},
-                'dpdups' : {'headers' : DPDUPS_HEADERS, 'mapping': DPDUPS_HEADERS_MAPPING},
-                'nlpost': {'headers' : NLPOST_HEADERS, 'mapping': NLPOST_HEADERS_MAPPING, 'fixed': NLPOST_FIXED_VALUES}}
-PACKAGE_DIMENSIONS = {
-    'DKS': {'X': '20', 'Y': '15', 'Z': '10'},
-    'MKS': {'X': '15', 'Y': '10', 'Z': '2'}}
 FILL_HIGHLIGHT = openpyxl.styles.PatternFill(fill_type='solid', fgColor='F8CBAD')
 YELLOW_HIGHLIGHT = openpyxl.styles.PatternFill(fill_type='solid', fgColor='FFFF00')
 
 
-class XlsxExporter():
-    '''generic class for creating workbook based on Etonas/NLPost shippment companies xlsx requirements.
-    Assumes class that inherit this class have appropriate names as part of class name: (Etonas* / NLPost*)
-    
-    Args:
-    -input_orders: list of orders (dicts) as accepted by class
-    -export_path: workbook path to be saved at
-    -sales_channel: str option AmazonEU / AmazonCOM / Etsy
-    -proxy_keys: dict to handle both Amazon and Etsy sales channels'''
-
-    def __init__(self, input_orders:list, export_path:str, sales_channel:str, proxy_keys:dict):
-        self.input_orders = input_orders
-        self.export_path = export_path
-        self.sales_channel = sales_channel
-        self.proxy_keys = proxy_keys
-        self.__get_mode()
-        self.header_settings = HEADER_SETTINGS[self.mode]
-        self.row_offset = 1 if self.mode == 'nlpost' else 0
-
-    def __get_mode(self):
-        '''sets self.mode variable to differentiate Etonas / NLPost workbook generation'''
-        if self.__class__.__name__.startswith('Etonas'):
-            self.mode = 'etonas'
-        elif self.__class__.__name__.startswith('NLPost'):
-            self.mode = 'nlpost'
-        elif self.__class__.__name__.startswith('DPDUPS'):
-            self.mode = 'dpdups'
-        logging.debug(f'Using XlsxExporter in {self.mode} mode. Parsing {len(self.input_orders)} orders, exporting to path: {self.export_path}')
-
-
-    def refactor_data_for_export(self):
-        '''reduces input data to that needed in output xlsx'''
-        try:
-            export_ready_data = []
-            for order in self.input_orders:
-                reduced_order = self._refactor_order(order)
-                export_ready_data.append(reduced_order)
-            return export_ready_data
-        except Exception as e:
-            print(VBA_ERROR_ALERT)
-            logging.warning(f'Error while iterating collected row dicts and trying to reduce in XlsxExporter mode: {self.mode}. Error: {e}')
-
-    def _refactor_order(self, order:dict) -> dict:
-        '''refactors order based on self.mode via prepare_etonas_order_contents or prepare_nlpost_order_contents methods'''
-        if self.mode == 'etonas':
-            reduced_order = self.prepare_etonas_order_contents(order)
-        elif self.mode == 'nlpost':
-            reduced_order = self.prepare_nlpost_order_contents(order)
-        elif self.mode == 'dpdups':
-            reduced_order = self.prepare_dpdups_order_contents(order)
-        return reduced_order
-
-    def prepare_etonas_order_contents(self, order:dict) -> dict:
-        '''implemented in inheriting class'''
-        logging.warning(f'You should not be using generic class to create xlsx output. Warning from: prepare_etonas_order_contents method')
-        return order
-    
-    def prepare_nlpost_order_contents(self, order:dict) -> dict:
-        '''implemented in inheriting class'''
-        logging.warning(f'You should not be using generic class to create xlsx output. Warning from: prepare_nlpost_order_contents method')
-        return order
-
-    def prepare_dpdups_order_contents(self, order:dict) -> dict:
-        '''implemented in inheriting class'''
-        logging.warning(f'You should not be using generic class to create xlsx output. Warning from: prepare_nlpost_order_contents method')
-        return order
-
-    def _get_fname_lname(self, order:dict):
-        '''returns first and last name based on sales channel'''
-        try:
-            if self.sales_channel == 'Etsy':
-                f_name = order[self.proxy_keys['buyer-fname']]
-                l_name = order[self.proxy_keys['buyer-lname']]
-                return f_name, l_name
-            else:
-                f_name, l_name = order[self.proxy_keys['recipient-name']].split(' ', 1)
-                return f_name, l_name
-        except KeyError as e:
-            logging.critical(f'No recipient-name key for etonas func: _get_fname_lname. Err: {e} Order: {order}')
-            print(VBA_ERROR_ALERT)
-            sys.exit()
-        except ValueError as e:
-            logging.debug(f'Failed to unpack f_name, l_name for sales ch: {self.sales_channel} etonas xlsx. Err: {e}. Returning proxy recipient-name order val: {order[self.proxy_keys["recipient-name"]]} and empty l_name')
-            return order[self.proxy_keys['recipient-name']], ''
+class XlsxStyleLayer():
+    '''style intents of write-only sheet resolved to shared named styles. Each fill is registered in workbook
+    as named style once, styled cells get copy of its style array - no per cell style lookups or fill assignments.
 
-    def _get_weight_in_kg(self, order:dict):
-        '''returns order weight in kg if possible, empty str if not'''
-        try:
-            return round(order['weight'] / 1000, 3)
-        except:
-            print(VBA_MISSING_WEIGHT_DATA_ALERT)
-            return ''
+    Row style intent: (row fill or None, {header: cell fill}), cell fill takes precedence over row fill.
 
-    def _write_headers(self, ws:object, headers:list):
-        for col, header in enumerate(headers, 1):
-            ws.cell(1 + self.row_offset, col).value = header    
-
-    @staticmethod
-    def range_generator(orders:list, headers:list):
-        for row, _ in enumerate(orders):
-            for col, _ in enumerate(headers):
-                yield row, col
-    
-    def _write_orders(self, ws:object, headers:list, orders:list):
-        for row, col in self.range_generator(orders, headers):
-            working_dict = orders[row]
-            key_pointer = headers[col]
-            # offsets due to excel vs python numbering  + headers in row 1 + self.row_offset (first empty row for nlpost)
-            ws.cell(row + 2 + self.row_offset, col + 1).value = working_dict[key_pointer]
-
-    def adjust_col_widths(self, ws:object):
-        '''iterates cols, cells within col, adjusts column width based on max char cell within col + extra spacing'''
-        for col in ws.columns:
-            max_length = 0
-            col_letter = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(cell.value)
-                except:
-                    pass
-            adjusted_width = (max_length + 2) * 1.1
-            ws.column_dimensions[col_letter].width = adjusted_width
-
-    def export(self):
-        export_data = self.refactor_data_for_export()
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        headers = self.header_settings['headers']
-        self._write_headers(ws, headers)
-        self._write_orders(ws, headers, export_data)
-        self.adjust_col_widths(ws)
-        wb.save(self.export_path)
-        wb.close()
-
-
-
-class NLPostExporter(XlsxExporter):
-    '''Creates Excel orders workbook based on NLPost xlsx requirements. Uses generic parent XlsxExporter class. 
-    class name must include word 'NLPost' (not actually, but kepping it clean).
-    
-    only overwritten method: prepare_nlpost_order_contents
-    
     Args:
-    -input_orders: list of orders (dicts) as accepted by class
-    -export_path: workbook path to be saved at
-    -sales_channel: str option AmazonEU / AmazonCOM / Etsy
-    -proxy_keys: dict to handle both Amazon and Etsy sales channels'''
-
-
-    def prepare_nlpost_order_contents(self, order:dict) -> dict:
-        '''returns ready-to-write order data dict based on NLPost file headers'''
-        export = {}
-        # add 'highlight' key
-        export['highlight'] = self.__highlight_order_row(order['weight'], order['vmdoption'])
-        for header in NLPOST_HEADERS:
-            if header in NLPOST_FIXED_VALUES.keys():
-                export[header] = NLPOST_FIXED_VALUES[header]
-            elif header in NLPOST_HEADERS_MAPPING.keys():
-                # Etsy has no phone, email, returning empty string, to prevent KeyError
-                target_key = self.proxy_keys.get(NLPOST_HEADERS_MAPPING[header], '')
-                raw_target_value = order.get(target_key, '')
-
-                if header == 'Receiver phone':
-                    # strip special chars from phone number
-                    export[header] = self.__strip_special_nlpost_chars(raw_target_value)
-                elif header == 'Description':
-                    export[header] = self.__make_batteries_alkaline(raw_target_value)
-                else:
-                    export[header] = raw_target_value
-
-            elif header == 'Receiver street':
-                # combine two (three for amazon) address fields
-                address1 = order[self.proxy_keys['ship-address-1']]
-                address2 = order[self.proxy_keys['ship-address-2']]
-                address = f'{address1} {address2} {order[self.proxy_keys["ship-address-3"]]}' if self.sales_channel != 'Etsy' else f'{address1} {address2}'
-                export[header] = address
-
-                if len(address) > NLPOST_CHARLIMIT_PER_CELL:
-                    logging.warning(f'Order with key {header} and value {address} triggered VBA warning for charlimit set by NLPost')
-                    print(VBA_NLPOST_CHARTLIMIT_ALERT)
-            elif header in ['X', 'Y', 'Z']:
-                parcel_dimension = self.__get_package_dimension(order['vmdoption'], header)
-                export[header] = parcel_dimension
-            elif header == 'Service name':
-                export[header] = self.__get_nlpost_service_name(order)
-            elif header == 'Weight':
-                export[header] = self._get_weight_in_kg(order)    
-            elif header == 'HS code':
-                product_name_proxy_key = self.proxy_keys.get('title', '')
-                export[header] = get_sales_channel_hs_code(order, product_name_proxy_key)
-            elif header == 'Unit price':
-                export[header] = order['total-engineered']
-            else:
-                export[header] = ''
-        return export
-
-    def __highlight_order_row(self, weight, vmdoption:str) -> bool:
-        '''returns True if order row should be highlighted when writing to xlsx'''
-        if weight != '':
-            if weight > 2000:
-                return True
-            elif vmdoption in ['VKS', 'MKS', 'DKS']:
-                if vmdoption == 'VKS' and weight > 50:
-                    return True
-                elif vmdoption == 'MKS' and weight > 500:
-                    return True
-        return False
-
-    def __get_package_dimension(self, vmdoption:str, header:str) -> str:
-        '''returns package dimension in cm, formatted for NLPost'''
-        if vmdoption not in ['VKS', 'MKS', 'DKS']:
-            print(VBA_MISSING_WEIGHT_DATA_ALERT)
-            return ''
-        package_category = 'DKS' if vmdoption == 'DKS' else 'MKS'
-        return PACKAGE_DIMENSIONS[package_category][header]
-
-    def __strip_special_nlpost_chars(self, text:str) -> str:
-        '''removes characters from 'text' arg not allowed in nlpost system'''
-        return text.replace('(', '').replace(')', '').replace('+', '').replace(';', '').replace(':', '').replace(' ', '').replace('-', '')
-
-    def __get_nlpost_service_name(self, order:dict) -> str:
-        '''returns value for NLPost column 'Service name' based on order details'''
-        if order['vmdoption'] == '':
-            return 'No Data'
-
-        if order['tracked']:
-            return 'PEC1'
-        else:
-            # PEC0 for all Untracked orders
-            return 'PEC0'
-
-    def __make_batteries_alkaline(self, contents:str) -> str:
-        '''replaces batteries with alkaline batteries string if applicable'''
-        return contents.replace('BATTERIES', 'ALKALINE BATTERIES')
-    
-    def _write_orders(self, ws:object, headers:list, orders:list):
-        for row, col in self.range_generator(orders, headers):
-            working_dict = orders[row]
-            key_pointer = headers[col]
-            # offsets due to excel vs python numbering  + headers in row 1 + self.row_offset (first empty row for nlpost)
-            ws.cell(row + 2 + self.row_offset, col + 1).value = working_dict[key_pointer]
-            # highlight based on highlight key in refactored order dict
-            if working_dict['highlight']:
-                for c in range(1, len(headers) + 1):
-                    ws.cell(row + 2 + self.row_offset, c).fill = FILL_HIGHLIGHT
+    -wb: write-only workbook
+    -ws: write-only sheet of wb
+    -headers: list of column headers'''
+
+    def __init__(self, wb:object, ws:object, headers:list):
+        self.wb = wb
+        self.ws = ws
+        self.headers = headers
+        self.style_arrays = {}
+        self.row_fill_styles = {}
+
+    def get_style_array(self, fill:object):
+        '''returns style array of named style holding fill, registering named style on first use'''
+        if fill not in self.style_arrays:
+            named_style = NamedStyle(name=f'parser_fill_{len(self.style_arrays)}', fill=fill)
+            self.wb.add_named_style(named_style)
+            self.style_arrays[fill] = named_style.as_tuple()
+        return self.style_arrays[fill]
+
+    def get_row_style_arrays(self, row_styles:tuple) -> list:
+        '''returns style arrays (or None) in headers order for row style intent, [] for unstyled row.
+        Rows with row fill only share one cached list'''
+        row_fill, cell_fills = row_styles
+        if not row_fill and not cell_fills:
+            return []
+        if not cell_fills:
+            if row_fill not in self.row_fill_styles:
+                self.row_fill_styles[row_fill] = [self.get_style_array(row_fill)] * len(self.headers)
+            return self.row_fill_styles[row_fill]
+        fills = [cell_fills.get(header, row_fill) for header in self.headers]
+        return [self.get_style_array(fill) if fill else None for fill in fills]
 
 
+class XlsxExporter():
+    '''generic xlsx writer for carrier workbooks (Etonas / NLPost / DPDUPS). Rows are prepared by carrier template
+    in export_engine.py, this class only writes them. Rows are streamed through write-only workbook: memory stays flat,
+    export time is linear in cells. Highlights are resolved to shared named styles by XlsxStyleLayer.
 
-class EtonasExporter(XlsxExporter):
-    '''Creates Excel orders workbook based on Etonas xlsx requirements. Uses generic parent XlsxExporter class. 
-    class name must include word 'Etonas'.
-    
-    only overwritten method: prepare_etonas_order_contents
-    
     Args:
-    -input_orders: list of orders (dicts) as accepted by class
+    -rows: list of export ready row dicts, keys are headers
+    -styles: list of per row style intents: (row fill or None, {header: cell fill})
     -export_path: workbook path to be saved at
-    -sales_channel: str option AmazonEU / AmazonCOM / Etsy
-    -proxy_keys: dict to handle both Amazon and Etsy sales channels'''
-
-
-    def prepare_etonas_order_contents(self, order:dict) -> dict:
-        '''returns ready-to-write order data dict based on Etonas file headers'''
-        export = {}
-        first_name, last_name = self._get_fname_lname(order)
-        product_name_proxy_key = self.proxy_keys.get('title', '')
-        order_weight_kg = self._get_weight_in_kg(order)
-
-        # adding key for highlighting cell
-        export['highlight'] = True if order['tracked'] else False
+    -headers: list of column headers
+    -row_offset: number of empty rows above headers row (1 for nlpost)'''
 
-        # Change GB to UK for Etonas
-        if order[self.proxy_keys['ship-country']] == 'GB':
-            order[self.proxy_keys['ship-country']] = 'UK'
-        
-        for header in ETONAS_HEADERS:
-            if header in ETONAS_HEADERS_MAPPING.keys():
-                # Etsy has no phone, email, returning empty string, to prevent KeyError
-                target_key = self.proxy_keys.get(ETONAS_HEADERS_MAPPING[header], '')
-                export[header] = order.get(target_key, '')
-
-            elif header == 'Address line 3':
-                # etsy has no address3 field
-                export[header] = order.get('ship-address-3', '')        
-            
-            elif header == 'First name':
-                export[header] = first_name
-            
-            elif header == 'Last name':
-                export[header] = last_name
-            
-            elif header == 'HS code':
-                export[header] = get_sales_channel_hs_code(order, product_name_proxy_key)
-            
-            elif header == 'Origin Country':
-                if product_name_proxy_key == '':
-                    export[header] = 'CN'
-                else:
-                    export[header] = get_origin_country(order[product_name_proxy_key])
-            
-            elif header == 'Unit price':
-                export[header] = order['total-engineered']
-            
-            elif header == 'Weight':
-                export[header] = order_weight_kg
-            
-            elif header == 'Unit weight':
-                if isinstance(order_weight_kg, float):
-                    export[header] = round(order_weight_kg / int(order[self.proxy_keys['quantity-purchased']]), 3)
-                else:
-                    export[header] = ''
-            
-            elif header == 'Service provider':
-                if order[self.proxy_keys['ship-country']] in ['UK', 'GB']:
-                    export[header] = 'Evri'
-                else:
-                    export[header] = 'Postnl'
-            
-            elif header == 'Service type':
-                if order['tracked']:
-                    export[header] = 'track'
-                else:
-                    # untracked, non-UK (Postnl) -> 'non' 2022.07.27 update
-                    if not order[self.proxy_keys['ship-country']] in ['UK', 'GB']:
-                        export[header] = 'non'
-                    else:
-                        export[header] = ''
-            
+    def __init__(self, rows:list, styles:list, export_path:str, headers:list, row_offset:int=0):
+        self.rows = rows
+        self.styles = styles
+        self.export_path = export_path
+        self.headers = headers
+        self.row_offset = row_offset
+        self.style_layer = None
+        logging.debug(f'Using XlsxExporter to write {len(self.rows)} rows to path: {self.export_path}')
+
+    def get_col_widths(self) -> list:
+        '''returns column widths based on max char count of str values within column (headers incl.) + extra spacing.
+        Computed from prepared rows, non-str values (numbers, bools) do not affect width'''
+        max_lengths = [len(header) if isinstance(header, str) else 0 for header in self.headers]
+        for row in self.rows:
+            for col, header in enumerate(self.headers):
+                value = row[header]
+                if isinstance(value, str) and len(value) > max_lengths[col]:
+                    max_lengths[col] = len(value)
+        return [(max_length + 2) * 1.1 for max_length in max_lengths]
+
+    def _get_row_cells(self, row:dict, row_styles:tuple) -> list:
+        '''returns row values in headers order, styled cells wrapped as WriteOnlyCell'''
+        values = [row[header] for header in self.headers]
+        col_styles = self.style_layer.get_row_style_arrays(row_styles)
+        if not col_styles:
+            return values
+        cells = []
+        for value, style_array in zip(values, col_styles):
+            if style_array:
+                cell = WriteOnlyCell(self.style_layer.ws, value=value)
+                cell._style = copy(style_array)
+                cells.append(cell)
             else:
-                export[header] = ''
-
-            # warn in VBA if char limit per cell is exceeded in Etonas address lines 1/2/3
-            if 'address' in header.lower() and len(export[header]) > ETONAS_CHARLIMIT_PER_CELL:
-                logging.warning(f'Order with key {header} and value {export[header]} triggered VBA warning for charlimit set by Etonas')
-                print(VBA_ETONAS_CHARTLIMIT_ALERT)
-        return export
-
-    def _write_orders(self, ws:object, headers:list, orders:list):
-        for row, col in self.range_generator(orders, headers):
-            working_dict = orders[row]
-            key_pointer = headers[col]
-            # offsets due to excel vs python numbering  + headers in row 1 + self.row_offset (first empty row for nlpost)
-            ws.cell(row + 2 + self.row_offset, col + 1).value = working_dict[key_pointer]
-            # highlight based on highlight key in refactored order dict
-            if working_dict['highlight'] and key_pointer == 'Service type':
-                ws.cell(row + 2 + self.row_offset, col + 1).fill = YELLOW_HIGHLIGHT
-
-
-class DPDUPSExporter(XlsxExporter):
-    '''Creates Excel orders workbook for DPD / UPS orders. Uses generic parent XlsxExporter class. 
-    class name must include word 'DPDUPS'.
-    
-    only overwritten method: prepare_dpdups_order_contents
-    
-    Args:
-    -input_orders: list of orders (dicts) as accepted by class
-    -export_path: workbook path to be saved at
-    -sales_channel: str option AmazonEU / AmazonCOM / Etsy
-    -proxy_keys: dict to handle both Amazon and Etsy sales channels'''
-    
- 
-    def prepare_dpdups_order_contents(self, order:dict) -> dict:
-        '''returns ready-to-write order data dict based on DPDUPS file headers'''
-        export = {}        
-        for header in DPDUPS_HEADERS:
-            if header in DPDUPS_HEADERS_MAPPING.keys():
-                target_key = self.proxy_keys.get(DPDUPS_HEADERS_MAPPING[header], '')
-                export[header] = order.get(target_key, '')
-
-            elif header == 'Service Picked':
-                export[header] = order['shipping_service']
-            elif header == 'Tracked':
-                export[header] = order['tracked']
-            elif header == 'Sales Channel':
-                export[header] = self.sales_channel
+                cells.append(value)
+        return cells
 
-        return export
+    def export(self):
+        '''streams rows to write-only workbook. Column widths are set before first row is written'''
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet()
+        self.style_layer = XlsxStyleLayer(wb, ws, self.headers)
+        for col, width in enumerate(self.get_col_widths(), 1):
+            ws.column_dimensions[get_column_letter(col)].width = width
+        for _ in range(self.row_offset):
+            ws.append([])
+        ws.append(self.headers)
+        for row, row_styles in zip(self.rows, self.styles):
+            ws.append(self._get_row_cells(row, row_styles))
+        wb.save(self.export_path)
+        wb.close()
 
 
 if __name__ == "__main__":
-    pass
\ No newline at end of file
+    pass